@@ -154,3 +154,32 @@ CSRF_COOKIE_SECURE = True
 
 
 AUTH_USER_MODEL = 'usuarios.Usuario'
+
+# Importação em lote: processos usados no parse dos arquivos (0 = um por CPU)
+UPLOAD_MAX_WORKERS = config('UPLOAD_MAX_WORKERS', default=0, cast=int)
+
+# Importações de balancete/MEC em segundo plano (worker: manage.py import_worker).
+# False = processa no próprio request (útil em desenvolvimento, sem worker rodando).
+IMPORT_JOBS_ASYNC = config('IMPORT_JOBS_ASYNC', default=True, cast=bool)
+
+# Cache do Django (demonstrações). Padrão: memória local por processo.
+# Para compartilhar entre web e worker: CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# e CACHE_LOCATION=/caminho/do/diretorio (ou Redis/Memcached).
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='cinnamon'),
+    }
+}
+
+# Plano de contas (MapeamentoContas/grupinhos/grupões) em memória: recarregado quando a
+# versão no banco muda (sinais, em qualquer processo) ou, no máximo, a cada N segundos.
+PLANO_CONTAS_CACHE_TTL = config('PLANO_CONTAS_CACHE_TTL', default=300, cast=int)
+
+# DRE/DPF/DMPL/DFC calculadas guardadas no cache por (fundo, datas, versão dos dados);
+# importações e mudanças de mapeamento trocam a versão, guardada no banco (df.VersaoDados),
+# então nenhum processo serve dados antigos, mesmo com o cache local. 0 = sem cache.
+DEMONSTRACOES_CACHE_TTL = config('DEMONSTRACOES_CACHE_TTL', default=3600, cast=int)
+
+# Carga do balancete: "staging" (tabela temporária + merge, MySQL/SQLite) ou "orm" (bulk_create)
+BALANCETE_BULK_LOAD = config('BALANCETE_BULK_LOAD', default='staging')
@@ -0,0 +1,157 @@
+# core/benchmarks/parsers.py
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import gc
+import json
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from core.benchmarks.synthetic import generate
+from core.upload.balancete_parser import parse_excel
+from core.upload.mec_parser import parse_excel_mec
+
+PARSERS: Dict[str, Callable] = {
+    "balancete": parse_excel,
+    "mec": parse_excel_mec,
+}
+FORMATOS = ("csv", "xlsx")
+TAMANHOS = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+
+@dataclass(frozen=True)
+class BenchResult:
+    parser: str
+    formato: str
+    linhas: int
+    arquivo_mb: float
+    segundos: float          # melhor tempo entre as repetições
+    linhas_por_s: float
+    pico_mb: float           # pico de alocação Python/NumPy (tracemalloc) durante o parse
+    linhas_lidas: int        # linhas que o parser entregou (sanidade)
+
+    @property
+    def chave(self) -> Tuple[str, str, int]:
+        return (self.parser, self.formato, self.linhas)
+
+
+def _parse(parser: Callable, path: Path) -> int:
+    with open(path, "rb") as f:
+        return len(parser(f))
+
+
+def measure(parser_nome: str, path: Path, linhas: int, repeticoes: int = 3) -> BenchResult:
+    """
+    Tempo: melhor de `repeticoes` execuções sem tracemalloc (que distorce o tempo).
+    Memória: uma execução extra com tracemalloc, medindo o pico.
+    """
+    parser = PARSERS[parser_nome]
+    tempos: List[float] = []
+    lidas = 0
+    for _ in range(max(repeticoes, 1)):
+        gc.collect()
+        inicio = time.perf_counter()
+        lidas = _parse(parser, path)
+        tempos.append(time.perf_counter() - inicio)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        _parse(parser, path)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    melhor = min(tempos)
+    return BenchResult(
+        parser=parser_nome,
+        formato=path.suffix.lstrip("."),
+        linhas=linhas,
+        arquivo_mb=round(path.stat().st_size / 2**20, 3),
+        segundos=round(melhor, 4),
+        linhas_por_s=round(linhas / melhor, 1) if melhor else 0.0,
+        pico_mb=round(pico / 2**20, 2),
+        linhas_lidas=lidas,
+    )
+
+
+def run(
+    *,
+    parsers: Sequence[str],
+    formatos: Sequence[str],
+    tamanhos: Sequence[int],
+    pasta: Path,
+    repeticoes: int = 3,
+    seed: int = 0,
+    progresso: Optional[Callable[[str], None]] = None,
+) -> List[BenchResult]:
+    resultados: List[BenchResult] = []
+    for parser_nome in parsers:
+        for formato in formatos:
+            for n in tamanhos:
+                if progresso:
+                    progresso(f"{parser_nome} {formato} {n} linhas...")
+                path = generate(parser_nome, formato, n, pasta, seed=seed)
+                resultados.append(measure(parser_nome, path, n, repeticoes))
+    return resultados
+
+
+# =========================
+# Baseline (JSON)
+# =========================
+def environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "processador": platform.processor() or platform.machine(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "openpyxl": openpyxl.__version__,
+    }
+
+
+def save(resultados: Sequence[BenchResult], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "ambiente": environment(),
+        "resultados": [asdict(r) for r in resultados],
+    }
+    path.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+def load(path: Path) -> Dict[Tuple[str, str, int], BenchResult]:
+    payload = json.loads(path.read_text(encoding="utf-8"))
+    resultados = (BenchResult(**r) for r in payload.get("resultados", []))
+    return {r.chave: r for r in resultados}
+
+
+@dataclass(frozen=True)
+class Comparacao:
+    atual: BenchResult
+    base: Optional[BenchResult]
+
+    @property
+    def delta_tempo(self) -> Optional[float]:
+        """Variação relativa do tempo (+0.10 = 10% mais lento que a baseline)."""
+        if not self.base or not self.base.segundos:
+            return None
+        return self.atual.segundos / self.base.segundos - 1
+
+    @property
+    def delta_memoria(self) -> Optional[float]:
+        if not self.base or not self.base.pico_mb:
+            return None
+        return self.atual.pico_mb / self.base.pico_mb - 1
+
+
+def compare(resultados: Sequence[BenchResult], baseline: Dict[Tuple[str, str, int], BenchResult]) -> List[Comparacao]:
+    return [Comparacao(atual=r, base=baseline.get(r.chave)) for r in resultados]
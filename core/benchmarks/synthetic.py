@@ -0,0 +1,139 @@
+# core/benchmarks/synthetic.py
+from __future__ import annotations
+
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Iterator, List, Sequence
+import csv
+import random
+
+from openpyxl import Workbook
+
+# =========================
+# Cabeçalhos "bagunçados" (como chegam das administradoras)
+# =========================
+# Todos precisam ser resolvidos pelos esquemas de balancete_parser / mec_parser.
+BALANCETE_HEADERS = (
+    ("Código Conta", "Descrição", "Saldo Anterior", "Débito", "Crédito", "Saldo Atual"),
+    ("  CONTA ", "DESCRICAO", "SALDOANTEIOR", "DEBITO", "CREDITO", "saldo-atual"),
+    ("cod_conta", "Descrição da Conta", "Valor Anterior", "Déb.", "Créd.", "Saldo Final"),
+)
+MEC_HEADERS = (
+    ("Data Posição", "Valor Aplicação", "Valor Resgate", "Valor Total Estorno",
+     "Valor Patrimônio", "Quantidade Cotas", "Valor Cota"),
+    ("DATA", "APLICACAO", "RESGATE", "ESTORNO", "PL", "QTD_COTAS", "COTA"),
+    ("dt-posicao", "vl aplicacao", "vl resgate", "vl estorno", "Patrimonio Liq", "Qtd Cotas", "Valor  Cota"),
+)
+
+# Título/linhas soltas antes do cabeçalho no XLSX (o parser precisa achar o cabeçalho)
+_PREAMBULO = (
+    ("Relatório gerado pelo sistema da administradora",),
+    ("Fundo de Investimento Sintético - CNPJ 11.222.333/0001-44",),
+    (),
+)
+
+_DIAS_MEC = 365 * 150  # datas do MEC voltam ao início depois disso (limite do datetime64[ns])
+_LINHA_EM_BRANCO = 0.01
+
+
+def fmt_brl(valor: float) -> str:
+    """1234567.891 -> '1.234.567,89' (formato PT-BR, com milhar)."""
+    texto = f"{abs(valor):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    return f"-{texto}" if valor < 0 else texto
+
+
+# =========================
+# Linhas sintéticas
+# =========================
+def balancete_rows(n: int, seed: int = 0) -> Iterator[List]:
+    """Linhas de balancete (conta, descrição, anterior, débito, crédito, atual) com valores numéricos."""
+    rnd = random.Random(seed)
+    for i in range(n):
+        if rnd.random() < _LINHA_EM_BRANCO:
+            yield ["", "", None, None, None, None]
+            continue
+        conta = f"{rnd.randint(1, 9)}.{rnd.randint(1, 9)}.{rnd.randint(1, 9)}.{rnd.randint(10, 99)}.00.{i % 1000:03d}-{i % 10}"
+        anterior = rnd.uniform(-5e6, 5e6)
+        debito = rnd.uniform(0, 1e6)
+        credito = rnd.uniform(0, 1e6)
+        yield [conta, f"Conta sintética {i}", anterior, debito, credito, anterior + debito - credito]
+
+
+def mec_rows(n: int, seed: int = 0) -> Iterator[List]:
+    """Linhas de MEC (data, aplicação, resgate, estorno, PL, qtd cotas, cota)."""
+    rnd = random.Random(seed)
+    inicio = date(1990, 1, 1)
+    pl = 1e8
+    for i in range(n):
+        if rnd.random() < _LINHA_EM_BRANCO:
+            yield [None, None, None, None, None, None, None]
+            continue
+        aplicacao = rnd.uniform(0, 1e6)
+        resgate = rnd.uniform(0, 1e6)
+        pl = max(pl + aplicacao - resgate, 1e6)
+        cota = rnd.uniform(1, 1000)
+        yield [inicio + timedelta(days=i % _DIAS_MEC), aplicacao, resgate, 0.0, pl, pl / cota, cota]
+
+
+# =========================
+# Escrita dos arquivos
+# =========================
+def _texto_csv(valor) -> str:
+    if valor is None:
+        return ""
+    if isinstance(valor, float):
+        return fmt_brl(valor)
+    if isinstance(valor, date):
+        return valor.strftime("%d/%m/%Y")
+    return str(valor)
+
+
+def write_csv(path: Path, header: Sequence[str], rows: Iterator[List]) -> Path:
+    """CSV como exportado pelos sistemas locais: Latin1, ';' e números PT-BR."""
+    with open(path, "w", encoding="latin1", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow([_texto_csv(v) for v in row])
+    return path
+
+
+def write_xlsx(path: Path, header: Sequence[str], rows: Iterator[List], seed: int = 0) -> Path:
+    """
+    XLSX com preâmbulo antes do cabeçalho; a maior parte dos valores vai
+    tipada (float/data), mas ~10% vão como texto PT-BR, como em planilhas
+    montadas à mão.
+    """
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Planilha1")
+    for linha in _PREAMBULO:
+        ws.append(list(linha))
+    ws.append(list(header))
+    for row in rows:
+        if rnd.random() < 0.1:
+            row = [fmt_brl(v) if isinstance(v, float) else v for v in row]
+        ws.append(row)
+    wb.save(path)
+    return path
+
+
+def generate(tipo: str, formato: str, n: int, pasta: Path, seed: int = 0) -> Path:
+    """
+    Gera (ou reaproveita, se já existir) o arquivo sintético de `n` linhas.
+    tipo: "balancete" | "mec"; formato: "csv" | "xlsx".
+    """
+    pasta.mkdir(parents=True, exist_ok=True)
+    path = pasta / f"{tipo}_{n}_s{seed}.{formato}"
+    if path.exists():
+        return path
+
+    headers, rows = (BALANCETE_HEADERS, balancete_rows) if tipo == "balancete" else (MEC_HEADERS, mec_rows)
+    header = headers[seed % len(headers)]
+    tmp = path.with_suffix(f".tmp.{formato}")
+    if formato == "csv":
+        write_csv(tmp, header, rows(n, seed))
+    else:
+        write_xlsx(tmp, header, rows(n, seed), seed)
+    tmp.replace(path)
+    return path
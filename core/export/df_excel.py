@@ -435,7 +435,7 @@ def criar_aba_dmpl(
     ws.append(["Emissão de cotas", "", ""])
     ws.cell(row=ws.max_row, column=1).font = bold
     ws.append([f"Total de {dados_dmpl['aplicacoes_qtd']} cotas",
-               dados_dmpl["aplicacoes_valor"], "-"])
+               dados_dmpl["aplicacoes_valor"], dados_dmpl["aplicacoes_valor_ant"]])
     ws.append([])
 
     # =====================
@@ -444,7 +444,7 @@ def criar_aba_dmpl(
     ws.append(["Resgate de cotas", "", ""])
     ws.cell(row=ws.max_row, column=1).font = bold
     ws.append([f"Total de {dados_dmpl['resgates_qtd']} cotas",
-               dados_dmpl["resgates_valor"], "-"])
+               dados_dmpl["resgates_valor"], dados_dmpl["resgates_valor_ant"]])
     ws.append([])
 
     # =====================
@@ -453,7 +453,7 @@ def criar_aba_dmpl(
     ws.append([
         "Patrimônio líquido antes do resultado do período",
         dados_dmpl["pl_antes_resultado_periodo"],
-        dados_dmpl["valor_primeiro_ant"]
+        dados_dmpl["pl_antes_resultado_periodo_ant"]
     ])
     ws.append([])
 
@@ -0,0 +1,94 @@
+from pathlib import Path
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import parsers as bench
+
+
+def _lista(valor: str, permitidos) -> list:
+    itens = [v.strip().lower() for v in valor.split(",") if v.strip()]
+    invalidos = [v for v in itens if v not in permitidos]
+    if invalidos:
+        raise CommandError(f"Valores inválidos: {', '.join(invalidos)} (use {', '.join(permitidos)})")
+    return itens
+
+
+def _pct(delta) -> str:
+    return "—" if delta is None else f"{delta * 100:+.1f}%"
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark dos parsers de upload (parse_excel / parse_excel_mec) com arquivos "
+        "sintéticos de balancete e MEC (CSV e XLSX, números PT-BR e cabeçalhos bagunçados). "
+        "Mede tempo, linhas/s e pico de memória e compara com uma baseline em JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--parsers", default="balancete,mec", help="balancete,mec")
+        parser.add_argument("--formats", default="csv,xlsx", help="csv,xlsx")
+        parser.add_argument("--sizes", default="1k,10k,100k,1m", help="1k,10k,100k,1m")
+        parser.add_argument("--repeat", type=int, default=3, help="Repetições por caso (vale o melhor tempo).")
+        parser.add_argument("--seed", type=int, default=0, help="Semente dos dados (também escolhe o cabeçalho).")
+        parser.add_argument(
+            "--workdir",
+            default=str(Path(tempfile.gettempdir()) / "cinnamon_bench"),
+            help="Pasta dos arquivos gerados (reaproveitados entre execuções).",
+        )
+        parser.add_argument("--save", metavar="JSON", help="Grava os resultados como nova baseline.")
+        parser.add_argument("--baseline", metavar="JSON", help="Compara com uma baseline gravada antes.")
+        parser.add_argument(
+            "--max-regression",
+            type=float,
+            default=None,
+            help="Falha se algum caso ficar mais lento que a baseline além dessa fração (ex.: 0.2 = 20%%).",
+        )
+
+    def handle(self, *args, **opts):
+        parsers = _lista(opts["parsers"], tuple(bench.PARSERS))
+        formatos = _lista(opts["formats"], bench.FORMATOS)
+        tamanhos = [bench.TAMANHOS[t] for t in _lista(opts["sizes"], tuple(bench.TAMANHOS))]
+
+        baseline = {}
+        if opts["baseline"]:
+            path = Path(opts["baseline"])
+            if not path.exists():
+                raise CommandError(f"Baseline não encontrada: {path}")
+            baseline = bench.load(path)
+
+        resultados = bench.run(
+            parsers=parsers,
+            formatos=formatos,
+            tamanhos=tamanhos,
+            pasta=Path(opts["workdir"]),
+            repeticoes=opts["repeat"],
+            seed=opts["seed"],
+            progresso=lambda msg: self.stderr.write(msg),
+        )
+
+        comparacoes = bench.compare(resultados, baseline)
+        self.stdout.write(
+            f"{'parser':<10} {'fmt':<5} {'linhas':>9} {'MB':>8} {'seg':>9} {'linhas/s':>12} {'pico MB':>9}"
+            + (f" {'Δ tempo':>9} {'Δ mem':>9}" if baseline else "")
+        )
+        for c in comparacoes:
+            r = c.atual
+            linha = (
+                f"{r.parser:<10} {r.formato:<5} {r.linhas:>9} {r.arquivo_mb:>8.2f} {r.segundos:>9.3f} "
+                f"{r.linhas_por_s:>12,.0f} {r.pico_mb:>9.1f}"
+            )
+            if baseline:
+                linha += f" {_pct(c.delta_tempo):>9} {_pct(c.delta_memoria):>9}"
+            self.stdout.write(linha)
+
+        if opts["save"]:
+            bench.save(resultados, Path(opts["save"]))
+            self.stdout.write(self.style.SUCCESS(f"Baseline gravada em {opts['save']}"))
+
+        limite = opts["max_regression"]
+        if baseline and limite is not None:
+            piores = [c for c in comparacoes if c.delta_tempo is not None and c.delta_tempo > limite]
+            if piores:
+                casos = ", ".join(f"{c.atual.parser}/{c.atual.formato}/{c.atual.linhas} ({_pct(c.delta_tempo)})" for c in piores)
+                raise CommandError(f"Regressão de desempenho acima de {limite:.0%}: {casos}")
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.processing.import_jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker das importações em segundo plano: consulta a fila de ImportJob no banco "
+        "e processa os jobs pendentes (balancete/MEC) fora do request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Processa a fila atual e sai.")
+        parser.add_argument("--interval", type=float, default=2.0, help="Segundos entre consultas à fila vazia.")
+
+    def handle(self, *args, **opts):
+        if opts["once"]:
+            executados = run_pending_jobs()
+            self.stdout.write(f"{executados} job(s) processado(s).")
+            return
+
+        self.stdout.write(self.style.SUCCESS("Worker de importação iniciado (Ctrl+C para sair)."))
+        try:
+            while True:
+                if not run_pending_jobs():
+                    time.sleep(opts["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Worker encerrado.")
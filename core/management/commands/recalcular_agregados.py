@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from df.agregados import recalcular_todos_agregados
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói o BalanceteAgregado (soma do balancete por grupinho, lida pela DRE/DPF) "
+        "a partir de BalanceteItem. Use depois de alterar mapeamentos em massa "
+        "(update/bulk_create não disparam o recálculo automático)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fundo", type=int, action="append", dest="fundos", help="Só este fundo (pode repetir).")
+
+    def handle(self, *args, **opts):
+        total = recalcular_todos_agregados(opts["fundos"])
+        self.stdout.write(self.style.SUCCESS(f"{total} linha(s) agregada(s) gravada(s)."))
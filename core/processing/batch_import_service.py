@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+from functools import partial
+from typing import Dict, Iterable, List, Optional
+
+from core.processing.import_service import ImportReport, import_balancete_batches, import_mec_batches
+from core.upload.batch_upload import (
+    TIPO_BALANCETE,
+    ParsedFile,
+    iter_upload_files,
+    normalize_cnpj,
+    parse_uploads,
+)
+from df.models import Fundo
+
+
+@dataclass(frozen=True)
+class FileImportResult:
+    """Resumo da importação de um arquivo (ou de um grupo CNPJ/data de planilha consolidada)."""
+    arquivo: str
+    tipo: Optional[str]
+    cnpj: Optional[str]
+    fundo: Optional[Fundo]
+    data_referencia: Optional[date]
+    report: Optional[ImportReport]
+    erro: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.erro is None and not (self.report and self.report.errors)
+
+
+def _fundos_por_cnpj(fundos: Iterable[Fundo]) -> Dict[str, List[Fundo]]:
+    mapa: Dict[str, List[Fundo]] = {}
+    for fundo in fundos:
+        cnpj = normalize_cnpj(fundo.cnpj)
+        if cnpj:
+            mapa.setdefault(cnpj, []).append(fundo)
+    return mapa
+
+
+def _resultado(parsed: ParsedFile, *, fundo=None, report=None, erro=None) -> FileImportResult:
+    return FileImportResult(
+        arquivo=parsed.arquivo,
+        tipo=parsed.tipo,
+        cnpj=parsed.cnpj,
+        fundo=fundo,
+        data_referencia=parsed.data_referencia,
+        report=report,
+        erro=erro,
+    )
+
+
+def _importar(parsed: ParsedFile, fundo: Fundo, usuario=None, substituir: bool = False) -> ImportReport:
+    # Registro em ImportBatch: reenvio idêntico do mesmo arquivo não regrava nada
+    registro = {
+        "arquivo": parsed.arquivo_hash,
+        "usuario": usuario,
+        "duracao_leitura": parsed.duracao_leitura,
+    }
+    if parsed.tipo == TIPO_BALANCETE:
+        return import_balancete_batches(
+            fundo_id=fundo.id,
+            data_referencia=parsed.data_referencia,
+            batches=[parsed.batch],
+            substituir=substituir,
+            **registro,
+        )
+    return import_mec_batches(fundo_id=fundo.id, batches=[parsed.batch], **registro)
+
+
+def import_upload_lote(
+    *,
+    fundos: Iterable[Fundo],
+    arquivo,
+    nome: Optional[str] = None,
+    usuario=None,
+    max_workers: Optional[int] = None,
+    substituir: bool = False,
+) -> List[FileImportResult]:
+    """
+    Importação em lote (fechamento do mês): `arquivo` é um ZIP com vários
+    balancetes/MECs ou uma planilha consolidada com colunas de CNPJ e data.
+
+    - o parse roda em paralelo em processos (ver batch_upload.parse_uploads),
+      com os membros do ZIP lidos sob demanda
+    - cada lote é roteado ao Fundo pelo CNPJ, só entre os `fundos` permitidos
+    - cada arquivo é gravado na sua própria transação: um arquivo com erro
+      não desfaz os demais
+    - cada arquivo é registrado em ImportBatch; arquivo idêntico ao último
+      importado para o mesmo fundo/data não é regravado
+    - substituir=True: cada balancete substitui o snapshot de fundo/data
+      (ver import_service.import_balancete)
+    - `nome`: nome original do envio, quando `arquivo` vem do storage (job)
+    """
+    fundos_por_cnpj = _fundos_por_cnpj(fundos)
+    resultados: List[FileImportResult] = []
+
+    for parsed in parse_uploads(iter_upload_files(arquivo, nome), max_workers=max_workers):
+        resultado = partial(_resultado, parsed)
+
+        if parsed.erro:
+            resultados.append(resultado(erro=parsed.erro))
+            continue
+        if not parsed.cnpj:
+            resultados.append(resultado(erro="CNPJ do fundo não encontrado no nome do arquivo."))
+            continue
+
+        candidatos = fundos_por_cnpj.get(parsed.cnpj, [])
+        if not candidatos:
+            resultados.append(resultado(erro=f"Nenhum fundo cadastrado com o CNPJ {parsed.cnpj}."))
+            continue
+        if len(candidatos) > 1:
+            resultados.append(resultado(erro=f"Mais de um fundo com o CNPJ {parsed.cnpj}; selecione a empresa."))
+            continue
+
+        fundo = candidatos[0]
+        if parsed.tipo == TIPO_BALANCETE and not parsed.data_referencia:
+            resultados.append(resultado(fundo=fundo, erro="Data de referência não encontrada no nome do arquivo."))
+            continue
+
+        try:
+            resultados.append(resultado(fundo=fundo, report=_importar(parsed, fundo, usuario, substituir)))
+        except Exception as e:
+            resultados.append(resultado(fundo=fundo, erro=f"Erro ao importar: {e}"))
+
+    return resultados
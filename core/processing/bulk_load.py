@@ -0,0 +1,201 @@
+# core/processing/bulk_load.py
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+from typing import Dict, List, Optional, Set
+
+from django.conf import settings
+from django.db import connections, router
+from django.utils import timezone
+
+from df.models import BalanceteItem
+
+# Linhas por INSERT ... ON DUPLICATE KEY UPDATE / ON CONFLICT (caminho ORM)
+BULK_BATCH_SIZE = 2000
+
+STAGING_TABLE = "tmp_carga_balancete"
+
+
+def upsert_conflict_kwargs(model, unique_fields: List[str], update_fields: List[str]) -> Dict:
+    """
+    Argumentos de bulk_create(update_conflicts=True) para o banco em uso: o
+    MySQL (ON DUPLICATE KEY UPDATE) não aceita unique_fields; SQLite/Postgres
+    (ON CONFLICT) exigem.
+    """
+    kwargs = {"update_conflicts": True, "update_fields": update_fields}
+    if connections[router.db_for_write(model)].features.supports_update_conflicts_with_target:
+        kwargs["unique_fields"] = unique_fields
+    return kwargs
+
+
+# =========================
+# Carga de saldos do balancete (fundo + data fixos)
+# =========================
+class SaldoLoader:
+    """
+    Recebe os saldos já validados ({id da conta: saldo}) lote a lote e grava
+    em BalanceteItem para (fundo, data). Conta repetida entre lotes: vale o
+    último saldo. `finish()` precisa ser chamado dentro da mesma transação.
+
+    Com `substituir=True` o arquivo é tratado como snapshot completo: as
+    linhas de (fundo, data) são apagadas (um DELETE pelo índice
+    idx_bal_fundo_data_referencia) antes da carga. Se nenhum saldo válido
+    chegar, nada é apagado: um arquivo errado não zera o balancete.
+
+    Esta classe base é o caminho genérico (bulk_create com upsert a cada lote).
+    """
+
+    def __init__(self, *, fundo_id: int, data_referencia: date, using: str, substituir: bool = False):
+        self.fundo_id = fundo_id
+        self.data_referencia = data_referencia
+        self.using = using
+        self.substituir = substituir
+        self.contas: Set[int] = set()   # contas carregadas (para calcular as removidas)
+        self.apagou = False
+
+    def _apagar_snapshot(self) -> None:
+        if self.substituir and not self.apagou:
+            BalanceteItem.objects.using(self.using).filter(
+                fundo_id=self.fundo_id, data_referencia=self.data_referencia,
+            ).delete()
+            self.apagou = True
+
+    def add(self, saldos: Dict[int, Decimal]) -> None:
+        if not saldos:
+            return
+        self.contas.update(saldos)
+        self._apagar_snapshot()
+        BalanceteItem.objects.using(self.using).bulk_create(
+            [
+                BalanceteItem(
+                    fundo_id=self.fundo_id,
+                    data_referencia=self.data_referencia,
+                    conta_corrente_id=conta_id,
+                    saldo_final=saldo,
+                )
+                for conta_id, saldo in saldos.items()
+            ],
+            batch_size=BULK_BATCH_SIZE,
+            **upsert_conflict_kwargs(
+                BalanceteItem,
+                unique_fields=["fundo", "data_referencia", "conta_corrente"],
+                update_fields=["saldo_final"],
+            ),
+        )
+
+    def finish(self) -> None:
+        pass
+
+
+class StagingSaldoLoader(SaldoLoader):
+    """
+    Carrega os saldos numa tabela temporária (executemany, sem instanciar
+    models) e faz um único merge set-based em df_balanceteitem no finish().
+    As subclasses só fornecem o SQL do banco.
+    """
+
+    create_sql = ""
+    drop_sql = ""
+    insert_sql = ""   # (conta_corrente_id, saldo_final); conta repetida substitui
+    merge_sql = ""    # params: fundo_id, data_referencia, data_importacao
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.connection = connections[self.using]
+        self._criada = False
+
+    def _table_names(self) -> Dict[str, str]:
+        qn = self.connection.ops.quote_name
+        return {"staging": qn(STAGING_TABLE), "destino": qn(BalanceteItem._meta.db_table)}
+
+    def _sql(self, template: str) -> str:
+        return template.format(**self._table_names())
+
+    def add(self, saldos: Dict[int, Decimal]) -> None:
+        if not saldos:
+            return
+        self.contas.update(saldos)
+        with self.connection.cursor() as cursor:
+            if not self._criada:
+                # sobra de uma carga interrompida na mesma conexão
+                cursor.execute(self._sql(self.drop_sql))
+                cursor.execute(self._sql(self.create_sql))
+                self._criada = True
+            cursor.executemany(self._sql(self.insert_sql), list(saldos.items()))
+
+    def finish(self) -> None:
+        if not self._criada:
+            return
+        self._apagar_snapshot()
+        ops = self.connection.ops
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                self._sql(self.merge_sql),
+                [
+                    self.fundo_id,
+                    ops.adapt_datefield_value(self.data_referencia),
+                    ops.adapt_datetimefield_value(timezone.now()),
+                ],
+            )
+            cursor.execute(self._sql(self.drop_sql))
+        self._criada = False
+
+
+class MySQLSaldoLoader(StagingSaldoLoader):
+    # mysqlclient reescreve o executemany de INSERT ... VALUES em INSERTs multi-linha
+    create_sql = (
+        "CREATE TEMPORARY TABLE {staging} ("
+        "conta_corrente_id BIGINT NOT NULL PRIMARY KEY, "
+        "saldo_final DECIMAL(20, 2) NOT NULL)"
+    )
+    drop_sql = "DROP TEMPORARY TABLE IF EXISTS {staging}"
+    insert_sql = (
+        "INSERT INTO {staging} (conta_corrente_id, saldo_final) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE saldo_final = VALUES(saldo_final)"
+    )
+    merge_sql = (
+        "INSERT INTO {destino} (fundo_id, data_referencia, conta_corrente_id, saldo_final, data_importacao) "
+        "SELECT %s, %s, s.conta_corrente_id, s.saldo_final, %s FROM {staging} AS s "
+        "ON DUPLICATE KEY UPDATE saldo_final = s.saldo_final"
+    )
+
+
+class SQLiteSaldoLoader(StagingSaldoLoader):
+    create_sql = (
+        "CREATE TEMP TABLE {staging} ("
+        "conta_corrente_id INTEGER NOT NULL PRIMARY KEY, "
+        "saldo_final DECIMAL NOT NULL)"
+    )
+    drop_sql = "DROP TABLE IF EXISTS temp.{staging}"
+    insert_sql = "INSERT OR REPLACE INTO {staging} (conta_corrente_id, saldo_final) VALUES (%s, %s)"
+    # "WHERE true": sem ele o SQLite confunde o ON CONFLICT com um JOIN do SELECT
+    merge_sql = (
+        "INSERT INTO {destino} (fundo_id, data_referencia, conta_corrente_id, saldo_final, data_importacao) "
+        "SELECT %s, %s, conta_corrente_id, saldo_final, %s FROM {staging} WHERE true "
+        "ON CONFLICT (fundo_id, data_referencia, conta_corrente_id) DO UPDATE SET saldo_final = excluded.saldo_final"
+    )
+
+
+_LOADERS = {
+    "mysql": MySQLSaldoLoader,
+    "sqlite": SQLiteSaldoLoader,
+}
+
+
+def saldo_loader(
+    *,
+    fundo_id: int,
+    data_referencia: date,
+    substituir: bool = False,
+    estrategia: Optional[str] = None,
+) -> SaldoLoader:
+    """
+    Escolhe a carga pelo banco: tabela temporária + merge no MySQL/SQLite,
+    bulk_create nos demais. BALANCETE_BULK_LOAD="orm" força o caminho ORM
+    (ex.: usuário do banco sem permissão de CREATE TEMPORARY TABLES).
+    """
+    using = router.db_for_write(BalanceteItem)
+    estrategia = estrategia or getattr(settings, "BALANCETE_BULK_LOAD", "staging")
+    cls = _LOADERS.get(connections[using].vendor, SaldoLoader) if estrategia == "staging" else SaldoLoader
+    return cls(fundo_id=fundo_id, data_referencia=data_referencia, using=using, substituir=substituir)
@@ -0,0 +1,120 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List
+from datetime import date
+from df.models import BalanceteAgregado
+from df.plano_contas import get_plano_contas
+from core.processing.dmpl_service import DMPL_CAMPOS_VALOR, gerar_dados_dmpl_fundos
+from core.processing.dpf_service import SECOES_DPF, TIPO_DRE, int_mil, somar_colunas
+
+
+def _coluna(por_fundo: List[int]) -> Dict:
+    return {"fundos": por_fundo, "consolidado": sum(por_fundo)}
+
+
+def gerar_consolidado(
+    fundo_ids: Iterable[int],
+    data_atual: date,
+    data_anterior: date | None,
+    zerar_anterior: bool = False,
+    dividir_por_mil: bool = True,
+) -> Dict:
+    """
+    DPF, DRE e DMPL de vários fundos (ex.: todos de uma empresa) nas mesmas
+    duas datas, com uma coluna por fundo e o consolidado.
+
+    Balancete: uma consulta a BalanceteAgregado com fundo_id__in (somas por
+    grupinho); DMPL: uma consulta (gerar_dados_dmpl_fundos). O custo cresce
+    com o número de grupos, não com fundos × páginas.
+
+    Cada valor é arredondado por fundo e grupinho antes de somar, como em
+    gerar_dados_dpf/gerar_dados_dre: a coluna de cada fundo bate com a
+    página do fundo e o consolidado é a soma das colunas. Listas "fundos"
+    seguem a ordem de `fundo_ids`.
+    """
+    fundo_ids = list(dict.fromkeys(fundo_ids))
+    if not fundo_ids:
+        raise ValueError("Informe ao menos um fundo.")
+    coluna_do_fundo = {fid: i for i, fid in enumerate(fundo_ids)}
+    n = len(fundo_ids)
+
+    plano = get_plano_contas()
+    grupinhos = plano.grupinhos_dos_tipos([tipo for tipo, _, _ in SECOES_DPF] + [TIPO_DRE])
+    datas = [data_atual] if zerar_anterior else [data_atual, data_anterior]
+
+    # valores[(grupinho_id, data)] = [valor do fundo 0, fundo 1, ...]
+    valores: Dict[tuple, List[int]] = {}
+    qs = (
+        BalanceteAgregado.objects
+        .filter(fundo_id__in=fundo_ids, data_referencia__in=datas)
+        .values_list("fundo_id", "data_referencia", "grupo_pequeno_id", "saldo_final")
+    )
+    for fundo_id, data_ref, gpequeno, total in qs:
+        if gpequeno in grupinhos:
+            valores.setdefault((gpequeno, data_ref), [0] * n)[coluna_do_fundo[fundo_id]] = int_mil(total, dividir_por_mil)
+
+    zeros = [0] * n
+
+    def _periodos(grupinho_id: int) -> tuple:
+        atual = valores.get((grupinho_id, data_atual), zeros)
+        anterior = zeros if zerar_anterior else valores.get((grupinho_id, data_anterior), zeros)
+        return atual, anterior
+
+    def _montar(tipo: int) -> tuple:
+        grupos = []
+        total_atual, total_ant = list(zeros), list(zeros)
+        for grupao in plano.grupoes_do_tipo(tipo):
+            subgrupos = []
+            soma_atual, soma_ant = list(zeros), list(zeros)
+            for grupinho in plano.grupinhos_do_grupao(grupao.id):
+                atual, anterior = _periodos(grupinho.id)
+                if not any(atual) and not any(anterior):
+                    continue  # ignora subgrupo zerado em todos os fundos
+                subgrupos.append({"nome": grupinho.nome, "ATUAL": _coluna(atual), "ANTERIOR": _coluna(anterior)})
+                soma_atual, soma_ant = somar_colunas(soma_atual, atual), somar_colunas(soma_ant, anterior)
+            if any(soma_atual) or any(soma_ant):
+                grupos.append({
+                    "nome": grupao.nome,
+                    "ATUAL": _coluna(soma_atual),
+                    "ANTERIOR": _coluna(soma_ant),
+                    "subgrupos": subgrupos,
+                })
+                total_atual, total_ant = somar_colunas(total_atual, soma_atual), somar_colunas(total_ant, soma_ant)
+        return grupos, total_atual, total_ant
+
+    dpf: Dict[str, Dict] = {}
+    totais: Dict[str, tuple] = {}
+    for tipo, secao, label_total in SECOES_DPF:
+        grupos, total_atual, total_ant = _montar(tipo)
+        totais[secao] = (total_atual, total_ant)
+        dpf[secao] = {"grupos": grupos, label_total: {"ATUAL": _coluna(total_atual), "ANTERIOR": _coluna(total_ant)}}
+
+    dre_grupos, resultado_atual, resultado_ant = _montar(TIPO_DRE)
+
+    # DMPL: por fundo completa; consolidado só dos campos em R$ mil
+    dmpl_por_fundo = gerar_dados_dmpl_fundos(fundo_ids, data_atual, data_anterior, zerar_anterior)
+    dmpl = {
+        "fundos": [dmpl_por_fundo[fid] for fid in fundo_ids],
+        "consolidado": {
+            campo: sum(dmpl_por_fundo[fid][campo] for fid in fundo_ids) for campo in DMPL_CAMPOS_VALOR
+        },
+    }
+
+    def _fechamento(i: int) -> List[int]:
+        return [
+            a - (p + pl)
+            for a, p, pl in zip(totais["ATIVO"][i], totais["PASSIVO"][i], totais["PL"][i])
+        ]
+
+    return {
+        "fundo_ids": fundo_ids,
+        "data_atual": data_atual.isoformat(),
+        "data_anterior": "ZERADO" if zerar_anterior else data_anterior.isoformat(),
+        "dividir_por_mil": dividir_por_mil,
+        "DPF": dpf,
+        "DRE": {
+            "grupos": dre_grupos,
+            "RESULTADO": {"ATUAL": _coluna(resultado_atual), "ANTERIOR": _coluna(resultado_ant)},
+        },
+        "DMPL": dmpl,
+        "FECHAMENTO": {"ATUAL": _coluna(_fechamento(0)), "ANTERIOR": _coluna(_fechamento(1))},
+    }
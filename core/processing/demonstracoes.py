@@ -0,0 +1,287 @@
+# core/processing/demonstracoes.py
+from __future__ import annotations
+
+import logging
+from copy import deepcopy
+from dataclasses import dataclass, field
+from datetime import date
+from functools import cached_property, lru_cache
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.processing.dmpl_service import gerar_dados_dmpl
+from core.processing.dpf_service import SECOES_DPF, TIPO_DRE, gerar_dados_dpf
+from core.processing.dre_service import gerar_dados_dre
+from df.plano_contas import PlanoContas, get_plano_contas
+from df.versoes import CHAVE_PLANO_CONTAS, chave_fundo, ler_versoes
+
+logger = logging.getLogger(__name__)
+
+
+# =========================
+# Percentuais sobre o PL (DPF)
+# =========================
+def _pct(v, base):
+    try:
+        v = float(v or 0)
+        b = float(base or 0)
+        return round((v / b) * 100, 2) if b != 0 else 0.0
+    except Exception:
+        return 0.0
+
+
+def annotate_percents(dpf: dict, pl_atual_val: float, pl_ant_val: float) -> dict:
+    """
+    Adiciona PERC_ATUAL/PERC_ANTERIOR em:
+      - cada TOTAL_* (com base em ATUAL/ANTERIOR)
+      - cada grupo (com base em SOMA/SOMA_ANTERIOR)
+      - cada subgrupo (com base em ATUAL/ANTERIOR)
+    Sempre usando como base o PL ajustado (pl_atual_val / pl_ant_val).
+    """
+    for sec_name, sec in dpf.items():  # ATIVO, PASSIVO, PL
+        if not isinstance(sec, dict):
+            continue
+
+        for grupo_label, bloco in sec.items():
+            if not isinstance(bloco, dict):
+                continue
+
+            # Totais da seção (ex.: TOTAL_ATIVO, TOTAL_PASSIVO, TOTAL_PL)
+            if grupo_label.startswith("TOTAL_"):
+                atual_tot = bloco.get("ATUAL", 0)
+                ant_tot = bloco.get("ANTERIOR", 0)
+                bloco["PERC_ATUAL"] = _pct(atual_tot, pl_atual_val)
+                bloco["PERC_ANTERIOR"] = _pct(ant_tot, pl_ant_val)
+                continue
+
+            # Grupos normais
+            soma_atual = bloco.get("SOMA", 0)
+            soma_ant = bloco.get("SOMA_ANTERIOR", 0)
+            bloco["PERC_ATUAL"] = _pct(soma_atual, pl_atual_val)
+            bloco["PERC_ANTERIOR"] = _pct(soma_ant, pl_ant_val)
+
+            # Subgrupos
+            for sub_label, valores in bloco.items():
+                if sub_label in ("SOMA", "SOMA_ANTERIOR"):
+                    continue
+                if isinstance(valores, dict) and ("ATUAL" in valores or "ANTERIOR" in valores):
+                    atual_v = valores.get("ATUAL", 0)
+                    ant_v = valores.get("ANTERIOR", 0)
+                    valores["PERC_ATUAL"] = _pct(atual_v, pl_atual_val)
+                    valores["PERC_ANTERIOR"] = _pct(ant_v, pl_ant_val)
+
+    return dpf
+
+
+# =========================
+# Árvore DRE/DPF indexada por código
+# =========================
+@lru_cache(maxsize=None)
+def _avisar_codigo_inexistente(codigo: str, tipos: Tuple[int, ...]) -> None:
+    # uma vez por processo: o DFC consulta os mesmos códigos a cada montagem
+    logger.warning("Código de grupo inexistente no plano de contas: %s (tipos %s)", codigo, tipos)
+
+
+@dataclass(frozen=True)
+class ArvoreDemonstracoes:
+    """
+    Valores (ATUAL, ANTERIOR) da DRE e da DPF indexados por (tipo, código
+    estável) — GrupoGrande/GrupoPequeno.codigo, único dentro de cada
+    demonstração: grupão → (SOMA, SOMA_ANTERIOR), grupinho → (ATUAL,
+    ANTERIOR). Montada uma vez a partir das tabelas já calculadas; cada
+    consulta é um acesso a dict. Renomear um grupo não muda o código, então
+    quem consulta (DFC) não depende dos nomes exibidos.
+    """
+
+    grupoes: Dict[Tuple[int, str], Tuple[int, int]]
+    grupinhos: Dict[Tuple[int, str], Tuple[int, int]]
+    plano: PlanoContas = field(repr=False, compare=False)
+
+    @classmethod
+    def montar(cls, plano: PlanoContas, dre_tabela: Dict, dpf_tabela: Dict) -> "ArvoreDemonstracoes":
+        tabelas = {tipo: dpf_tabela.get(secao, {}) for tipo, secao, _ in SECOES_DPF}
+        tabelas[TIPO_DRE] = dre_tabela
+        grupoes: Dict[Tuple[int, str], Tuple[int, int]] = {}
+        grupinhos: Dict[Tuple[int, str], Tuple[int, int]] = {}
+        for tipo, tabela in tabelas.items():
+            for grupao in plano.grupoes_do_tipo(tipo):
+                bloco = tabela.get(grupao.nome)
+                if not bloco:
+                    continue  # grupão zerado nas duas datas
+                grupoes[(tipo, grupao.codigo)] = (bloco.get("SOMA", 0), bloco.get("SOMA_ANTERIOR", 0))
+                for grupinho in plano.grupinhos_do_grupao(grupao.id):
+                    linha = bloco.get(grupinho.nome)
+                    if linha:
+                        grupinhos[(tipo, grupinho.codigo)] = (linha.get("ATUAL", 0), linha.get("ANTERIOR", 0))
+        return cls(grupoes=grupoes, grupinhos=grupinhos, plano=plano)
+
+    def grupao(self, codigo: str, tipos: Tuple[int, ...]) -> Tuple[int, int]:
+        """(atual, anterior) do grupão no primeiro dos `tipos` em que existe; (0, 0) se não teve saldo."""
+        return self._valor(self.grupoes, self.plano.grupao_por_codigo, codigo, tipos)
+
+    def grupinho(self, codigo: str, tipos: Tuple[int, ...]) -> Tuple[int, int]:
+        """(atual, anterior) do grupinho no primeiro dos `tipos` em que existe; (0, 0) se não teve saldo."""
+        return self._valor(self.grupinhos, self.plano.grupinho_por_codigo, codigo, tipos)
+
+    @staticmethod
+    def _valor(valores, no_plano, codigo: str, tipos: Tuple[int, ...]) -> Tuple[int, int]:
+        for tipo in tipos:
+            encontrado = valores.get((tipo, codigo))
+            if encontrado is not None:
+                return encontrado
+        if not any(no_plano(tipo, codigo) for tipo in tipos):
+            # sem esse aviso, um código apagado/alterado no admin viraria uma linha zerada sem explicação
+            _avisar_codigo_inexistente(codigo, tuple(tipos))
+        return 0, 0
+
+
+# =========================
+# Contexto de cálculo (uma vez por fundo + datas)
+# =========================
+@dataclass(frozen=True)
+class DemonstracoesContexto:
+    """
+    Calcula cada demonstração (DRE, DPF, DMPL, DFC) no máximo uma vez para
+    (fundo, data_atual, data_anterior, zerar_anterior). A view e o DFC (que
+    depende das outras três) leem daqui, em vez de cada um refazer as
+    consultas. Os resultados são compartilhados: não altere os dicts
+    retornados (use dpf_percentuais para a DPF com %).
+    """
+
+    fundo_id: int
+    data_atual: date
+    data_anterior: Optional[date]
+    zerar_anterior: bool = False
+
+    def _kwargs(self) -> Dict:
+        return {
+            "fundo_id": self.fundo_id,
+            "data_atual": self.data_atual,
+            "data_anterior": self.data_anterior,
+            "zerar_anterior": self.zerar_anterior,
+        }
+
+    @cached_property
+    def dre(self) -> Tuple[Dict, int, int]:
+        """(dre_tabela, resultado_exercicio, resultado_exercicio_anterior)"""
+        return gerar_dados_dre(**self._kwargs())
+
+    @cached_property
+    def dpf(self) -> Tuple[Dict, Dict]:
+        """(dpf_tabela, metricas)"""
+        return gerar_dados_dpf(**self._kwargs())
+
+    @cached_property
+    def dmpl(self) -> Dict:
+        return gerar_dados_dmpl(**self._kwargs())
+
+    @cached_property
+    def dfc(self) -> Tuple[Dict, int, int]:
+        """(dfc_tabela, variacao_caixa_atual, variacao_caixa_anterior)"""
+        from core.processing.dfc_service import gerar_tabela_dfc
+
+        return gerar_tabela_dfc(**self._kwargs(), contexto=self)
+
+    # ----- derivados -----
+    @cached_property
+    def arvore(self) -> ArvoreDemonstracoes:
+        """DRE + DPF indexadas por código de grupo (consultas do DFC)."""
+        return ArvoreDemonstracoes.montar(get_plano_contas(), self.dre[0], self.dpf[0])
+
+    @cached_property
+    def pl_ajustado(self) -> Tuple[int, int]:
+        """PL da DPF somado ao resultado do exercício (atual, anterior)."""
+        dpf_tabela, _ = self.dpf
+        _, resultado, resultado_anterior = self.dre
+        return (
+            (dpf_tabela["PL"]["TOTAL_PL"]["ATUAL"] or 0) + (resultado or 0),
+            (dpf_tabela["PL"]["TOTAL_PL"]["ANTERIOR"] or 0) + (resultado_anterior or 0),
+        )
+
+    @cached_property
+    def total_pl_passivo(self) -> Tuple[int, int]:
+        dpf_tabela, _ = self.dpf
+        pl_atual, pl_anterior = self.pl_ajustado
+        return (
+            pl_atual + (dpf_tabela["PASSIVO"]["TOTAL_PASSIVO"]["ATUAL"] or 0),
+            pl_anterior + (dpf_tabela["PASSIVO"]["TOTAL_PASSIVO"]["ANTERIOR"] or 0),
+        )
+
+    @cached_property
+    def dpf_percentuais(self) -> Dict:
+        """DPF com PERC_ATUAL/PERC_ANTERIOR sobre o PL ajustado (cópia; a DPF base não muda)."""
+        return annotate_percents(deepcopy(self.dpf[0]), *self.pl_ajustado)
+
+
+# =========================
+# Cache das demonstrações completas
+# =========================
+# Propriedades calculadas de DemonstracoesContexto guardadas no cache; as
+# derivadas (PL ajustado, percentuais) são baratas e recalculadas na hora.
+PACOTE_DEMONSTRACOES = ("dre", "dpf", "dmpl", "dfc")
+# Entra na chave: aumente quando mudar o formato dos dicts (ex.: chave nova na
+# DMPL), para não servir pacotes antigos de um cache persistente.
+FORMATO_PACOTE = 2
+
+
+def versao_dados(fundo_id: int) -> str:
+    """
+    Versão dos dados que alimentam as demonstrações do fundo, lida do banco
+    numa consulta (df.VersaoDados): vale para alterações feitas em qualquer
+    processo (outro worker do gunicorn, import_worker), mesmo com o cache
+    local por processo.
+    - carimbo do fundo (df.agregados.marcar_fundo_alterado): importações,
+      checkpoints parciais e edições no admin;
+    - versão do plano de contas (mapeamento conta → grupinho → grupão).
+    """
+    chaves = (chave_fundo(fundo_id), CHAVE_PLANO_CONTAS)
+    versoes = ler_versoes(chaves)
+    return ".".join(str(versoes[chave]) for chave in chaves)
+
+
+def _chave_pacote(ctx: DemonstracoesContexto) -> str:
+    return "df:demonstracoes:v{}:{}:{}:{}:{}:{}".format(
+        FORMATO_PACOTE,
+        ctx.fundo_id,
+        ctx.data_atual.isoformat(),
+        ctx.data_anterior.isoformat() if ctx.data_anterior else "-",
+        int(ctx.zerar_anterior),
+        versao_dados(ctx.fundo_id),
+    )
+
+
+def demonstracoes_em_cache(
+    *,
+    fundo_id: int,
+    data_atual: date,
+    data_anterior: Optional[date],
+    zerar_anterior: bool = False,
+) -> DemonstracoesContexto:
+    """
+    DemonstracoesContexto com DRE, DPF, DMPL e DFC vindos do cache do Django
+    quando já calculados para a mesma versão dos dados. Como a versão entra
+    na chave, uma importação ou mudança de mapeamento não apaga nada: só
+    passa a apontar para outra chave (as antigas expiram pelo timeout).
+    DEMONSTRACOES_CACHE_TTL=0 desliga o cache.
+    """
+    ctx = DemonstracoesContexto(
+        fundo_id=fundo_id,
+        data_atual=data_atual,
+        data_anterior=data_anterior,
+        zerar_anterior=zerar_anterior,
+    )
+    ttl = getattr(settings, "DEMONSTRACOES_CACHE_TTL", 3600)
+    if not ttl:
+        return ctx
+
+    chave = _chave_pacote(ctx)
+    pacote = cache.get(chave)
+    if pacote is None:
+        pacote = {nome: getattr(ctx, nome) for nome in PACOTE_DEMONSTRACOES}
+        cache.set(chave, pacote, ttl)
+    else:
+        # preenche as cached_property (escrevem direto em __dict__, mesmo com frozen=True)
+        ctx.__dict__.update(pacote)
+    return ctx
@@ -1,9 +1,38 @@
 from datetime import date
 import re
 
-from core.processing.dre_service import gerar_dados_dre
-from core.processing.dpf_service import gerar_dados_dpf
-from core.processing.dmpl_service import gerar_dados_dmpl
+from core.processing.demonstracoes import DemonstracoesContexto
+from core.processing.dpf_service import SECOES_DPF, TIPO_DRE
+
+# Códigos estáveis (GrupoGrande/GrupoPequeno.codigo) das linhas usadas pelo DFC;
+# gerados dos nomes originais (migrações 0015/0016) e mantidos se o grupo for renomeado.
+# São únicos por demonstração: DRE_* são procurados só na DRE, os demais só na DPF.
+# Grupinhos
+DRE_RESULTADO_RECEBIVEIS = "resultado_com_recebiveis"
+DRE_PROVISAO_CREDITO = "provisao_para_operacoes_de_credito"
+DPF_TAXA_ADMINISTRACAO = "taxa_de_administracao"
+DPF_TAXA_GESTAO = "taxa_de_gestao"
+# Grupões
+GRUPAO_DC = "direitos_creditorios_sem_aquisicao_substancial_dos_riscos_e_beneficios"
+GRUPAO_OUTROS_RECEBER = "outros_valores"
+GRUPAO_OUTROS_PAGAR = "passivo_circulante"
+GRUPAO_DISP = "disponibilidades"
+GRUPAO_APL = "aplicacoes_interfinanceiras_de_liquidez"
+
+TIPOS_DPF = tuple(tipo for tipo, _, _ in SECOES_DPF)
+
+# Código -> demonstrações (tipos) onde o DFC o procura; no admin, o código
+# desses grupos fica somente leitura (ver df.admin)
+CODIGOS_GRUPINHOS = {
+    DRE_RESULTADO_RECEBIVEIS: (TIPO_DRE,),
+    DRE_PROVISAO_CREDITO: (TIPO_DRE,),
+    DPF_TAXA_ADMINISTRACAO: TIPOS_DPF,
+    DPF_TAXA_GESTAO: TIPOS_DPF,
+}
+CODIGOS_GRUPOES = {
+    codigo: TIPOS_DPF
+    for codigo in (GRUPAO_DC, GRUPAO_OUTROS_RECEBER, GRUPAO_OUTROS_PAGAR, GRUPAO_DISP, GRUPAO_APL)
+}
 
 
 def slugify_key(key: str) -> str:
@@ -17,25 +46,30 @@ def slugify_key(key: str) -> str:
     return key.strip("_")
 
 
-def gerar_tabela_dfc(fundo_id: int, data_atual: date, data_anterior: date | None, zerar_anterior: bool = False):
+def gerar_tabela_dfc(
+    fundo_id: int,
+    data_atual: date,
+    data_anterior: date | None,
+    zerar_anterior: bool = False,
+    contexto: DemonstracoesContexto | None = None,
+):
     """
     Retorna um dicionário hierárquico (dict_tabela) no mesmo formato do DFC original,
     porém comparando duas datas específicas de balancete.
 
     Se zerar_anterior=True, considera que o saldo anterior é zerado (início do fundo),
     e todos os campos 'ANTERIOR' do relatório são retornados como 0.
+
+    `contexto` reaproveita DRE/DPF/DMPL já calculados para as mesmas datas
+    (ver demonstracoes.DemonstracoesContexto); sem ele, são calculados aqui.
     """
 
     # === Importa dados dos demais relatórios ===
-    dre_tabela, resultado_exercicio, resultado_exercicio_anterior = gerar_dados_dre(
-        fundo_id, data_atual, data_anterior, zerar_anterior=zerar_anterior
-    )
-    dpf_tabela, _ = gerar_dados_dpf(
-        fundo_id, data_atual, data_anterior, zerar_anterior=zerar_anterior
-    )
-    dados_dmpl = gerar_dados_dmpl(
-        fundo_id, data_atual, data_anterior, zerar_anterior=zerar_anterior
-    )
+    if contexto is None:
+        contexto = DemonstracoesContexto(fundo_id, data_atual, data_anterior, zerar_anterior)
+    _, resultado_exercicio, resultado_exercicio_anterior = contexto.dre
+    dados_dmpl = contexto.dmpl
+    arvore = contexto.arvore
 
     def _int(v):
         try:
@@ -43,39 +77,25 @@ def gerar_tabela_dfc(fundo_id: int, data_atual: date, data_anterior: date | None
         except Exception:
             return 0
 
-    # === Helpers ===
-    def pegar_valor_dre(nome):
-        for grupo, linhas in dre_tabela.items():
-            for label, dados in linhas.items():
-                if label.strip().lower() == nome.strip().lower():
-                    return _int(dados.get("ATUAL", 0)), (0 if zerar_anterior else _int(dados.get("ANTERIOR", 0)))
-        return 0, 0
-
-    def pegar_valor_dpf(nome):
-        for sec, grupos in dpf_tabela.items():
-            for grupo_label, grupo in grupos.items():
-                if isinstance(grupo, dict):
-                    for sub_label, valores in grupo.items():
-                        if isinstance(valores, dict) and sub_label.strip().lower() == nome.strip().lower():
-                            atual = _int(valores.get("ATUAL", 0))
-                            anterior = 0 if zerar_anterior else _int(valores.get("ANTERIOR", 0))
-                            return atual, anterior
-        return 0, 0
-
-    def pegar_grupao(nome):
-        for sec, grupos in dpf_tabela.items():
-            for grupo_label, grupo in grupos.items():
-                if grupo_label.strip().lower() == nome.strip().lower():
-                    atual = _int(grupo.get("SOMA", 0))
-                    anterior = 0 if zerar_anterior else _int(grupo.get("SOMA_ANTERIOR", grupo.get("ANTERIOR", 0)))
-                    return atual, anterior
-        return 0, 0
+    # === Helpers: (atual, anterior) pelo código, na demonstração certa ===
+    def _periodos(valores):
+        atual, anterior = valores
+        return _int(atual), (0 if zerar_anterior else _int(anterior))
+
+    def pegar_valor_dre(codigo):
+        return _periodos(arvore.grupinho(codigo, CODIGOS_GRUPINHOS[codigo]))
+
+    def pegar_valor_dpf(codigo):
+        return _periodos(arvore.grupinho(codigo, CODIGOS_GRUPINHOS[codigo]))
+
+    def pegar_grupao(codigo):
+        return _periodos(arvore.grupao(codigo, CODIGOS_GRUPOES[codigo]))
 
     # === BLOCO 1: Resultado Líquido do Período ===
-    rendimento_atual, rendimento_ant = pegar_valor_dre("Resultado com recebíveis")
-    provisao_atual, provisao_ant = pegar_valor_dre("(-) Provisão para operações de crédito")
-    taxa_adm_atual, taxa_adm_ant = pegar_valor_dpf("Taxa de Administração")
-    taxa_gestao_atual, taxa_gestao_ant = pegar_valor_dpf("Taxa de Gestão")
+    rendimento_atual, rendimento_ant = pegar_valor_dre(DRE_RESULTADO_RECEBIVEIS)
+    provisao_atual, provisao_ant = pegar_valor_dre(DRE_PROVISAO_CREDITO)
+    taxa_adm_atual, taxa_adm_ant = pegar_valor_dpf(DPF_TAXA_ADMINISTRACAO)
+    taxa_gestao_atual, taxa_gestao_ant = pegar_valor_dpf(DPF_TAXA_GESTAO)
 
     rendimento_atual *= -1
     rendimento_ant *= -1
@@ -90,10 +110,6 @@ def gerar_tabela_dfc(fundo_id: int, data_atual: date, data_anterior: date | None
     )
 
     # === BLOCO 2: Variações Operacionais ===
-    GRUPAO_DC = "Direitos Creditórios sem aquisição substancial dos riscos e benefícios"
-    GRUPAO_OUTROS_RECEBER = "Outros Valores"
-    GRUPAO_OUTROS_PAGAR = "Passivo Circulante"
-
     dc_atual, dc_ant = pegar_grupao(GRUPAO_DC)
     outros_receber_atual, outros_receber_ant = pegar_grupao(GRUPAO_OUTROS_RECEBER)
     outros_pagar_atual, outros_pagar_ant = pegar_grupao(GRUPAO_OUTROS_PAGAR)
@@ -128,8 +144,6 @@ def gerar_tabela_dfc(fundo_id: int, data_atual: date, data_anterior: date | None
     variacao_caixa_ant = 0 if zerar_anterior else caixa_operacional_ant + caixa_financiamento_ant
 
     # --- Grupões DPF para caixa inicial/final
-    GRUPAO_DISP = "Disponibilidades"
-    GRUPAO_APL = "Aplicações interfinanceiras de liquidez"
     disp_atual, disp_ant = pegar_grupao(GRUPAO_DISP)
     apl_atual, apl_ant = pegar_grupao(GRUPAO_APL)
 
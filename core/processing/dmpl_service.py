@@ -1,7 +1,92 @@
 from datetime import date
 from decimal import Decimal
+from typing import Dict, Iterable
 from df.models import MecItem
-from django.db import models
+from django.db import connections, router
+
+
+# Uma consulta só sobre o MEC do(s) fundo(s) até data_atual (índice fundo + data_posicao):
+# - janelas numeram as posições de cada fundo (primeira, última até data_anterior,
+#   última até data_atual);
+# - agregação condicional soma as movimentações dos dois períodos:
+#     atual    = (data_anterior, data_atual]  (tudo até data_atual se zerar_anterior)
+#     anterior = (primeira posição do fundo, data_anterior]
+# Cotas = valor / cota com escala larga; o "* 1.0" evita a divisão inteira do
+# SQLite (CAST AS DECIMAL vira INTEGER quando o valor não tem centavos).
+DMPL_SQL = """
+SELECT
+    fundo_id,
+    SUM(CASE WHEN no_periodo = 1 THEN aplicacao ELSE 0 END),
+    SUM(CASE WHEN no_periodo = 1 THEN resgate ELSE 0 END),
+    SUM(CASE WHEN no_periodo = 1 AND cota > 0 THEN CAST(aplicacao AS DECIMAL(38, 18)) * 1.0 / cota ELSE 0 END),
+    SUM(CASE WHEN no_periodo = 1 AND cota > 0 THEN CAST(resgate AS DECIMAL(38, 18)) * 1.0 / cota ELSE 0 END),
+    SUM(CASE WHEN ate_anterior = 1 AND ordem_asc > 1 THEN aplicacao ELSE 0 END),
+    SUM(CASE WHEN ate_anterior = 1 AND ordem_asc > 1 THEN resgate ELSE 0 END),
+    SUM(CASE WHEN ate_anterior = 1 AND ordem_asc > 1 AND cota > 0 THEN CAST(aplicacao AS DECIMAL(38, 18)) * 1.0 / cota ELSE 0 END),
+    SUM(CASE WHEN ate_anterior = 1 AND ordem_asc > 1 AND cota > 0 THEN CAST(resgate AS DECIMAL(38, 18)) * 1.0 / cota ELSE 0 END),
+    MAX(CASE WHEN ate_anterior = 1 AND ordem_asc = 1 THEN qtd_cotas END),
+    MAX(CASE WHEN ate_anterior = 1 AND ordem_asc = 1 THEN cota END),
+    MAX(CASE WHEN ate_anterior = 1 AND ordem_anterior = 1 THEN qtd_cotas END),
+    MAX(CASE WHEN ate_anterior = 1 AND ordem_anterior = 1 THEN cota END),
+    MAX(CASE WHEN ordem_desc = 1 THEN qtd_cotas END),
+    MAX(CASE WHEN ordem_desc = 1 THEN cota END)
+FROM (
+    SELECT
+        fundo_id, aplicacao, resgate, qtd_cotas, cota,
+        CASE WHEN %s = 1 OR data_posicao > %s THEN 1 ELSE 0 END AS no_periodo,
+        CASE WHEN data_posicao <= %s THEN 1 ELSE 0 END AS ate_anterior,
+        ROW_NUMBER() OVER (PARTITION BY fundo_id ORDER BY data_posicao) AS ordem_asc,
+        ROW_NUMBER() OVER (PARTITION BY fundo_id ORDER BY data_posicao DESC) AS ordem_desc,
+        ROW_NUMBER() OVER (
+            PARTITION BY fundo_id, CASE WHEN data_posicao <= %s THEN 1 ELSE 0 END
+            ORDER BY data_posicao DESC
+        ) AS ordem_anterior
+    FROM {tabela}
+    WHERE fundo_id IN ({fundos}) AND data_posicao <= %s
+) AS mec
+GROUP BY fundo_id
+"""
+
+# fundo sem MEC no intervalo: nenhuma linha no GROUP BY, DMPL zerada
+_SEM_MEC = (None,) * 14
+
+# Campos em R$ mil que podem ser somados entre fundos (quantidades e cotas não)
+DMPL_CAMPOS_VALOR = (
+    "aplicacoes_valor", "resgates_valor", "aplicacoes_valor_ant", "resgates_valor_ant",
+    "valor_ultimo", "valor_primeiro", "valor_primeiro_ant",
+    "pl_antes_resultado_periodo", "pl_antes_resultado_periodo_ant",
+)
+
+
+def _dec(v, casas: int = 2) -> Decimal:
+    """Valor vindo do cursor (Decimal no MySQL, float no SQLite) → Decimal."""
+    if v is None:
+        return Decimal("0")
+    if isinstance(v, Decimal):
+        return v
+    return Decimal(str(round(v, casas)))
+
+
+def _posicoes_e_movimentos(fundo_ids: list, data_atual: date, data_anterior: date | None, zerar_anterior: bool):
+    using = router.db_for_read(MecItem)
+    connection = connections[using]
+    ops = connection.ops
+    anterior = None if zerar_anterior else ops.adapt_datefield_value(data_anterior)
+    sql = DMPL_SQL.format(
+        tabela=ops.quote_name(MecItem._meta.db_table),
+        fundos=", ".join(["%s"] * len(fundo_ids)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql,
+            [
+                1 if zerar_anterior else 0, anterior,
+                anterior,
+                anterior,
+                *fundo_ids, ops.adapt_datefield_value(data_atual),
+            ],
+        )
+        return {linha[0]: linha[1:] for linha in cursor.fetchall()}
 
 
 def gerar_dados_dmpl(fundo_id: int, data_atual: date, data_anterior: date | None, zerar_anterior: bool = False):
@@ -9,95 +94,88 @@ def gerar_dados_dmpl(fundo_id: int, data_atual: date, data_anterior: date | None
     Gera a DMPL comparando duas datas específicas (data_anterior → data_atual).
     Se zerar_anterior=True, considera que não existe posição anterior (início do fundo)
     e retorna todos os valores anteriores como zero.
-    """
-
-    # --- Consulta do período atual ---
-    if zerar_anterior:
-        qs_periodo = MecItem.objects.filter(
-            fundo_id=fundo_id,
-            data_posicao__lte=data_atual,
-        )
-    else:
-        qs_periodo = MecItem.objects.filter(
-            fundo_id=fundo_id,
-            data_posicao__gt=data_anterior,
-            data_posicao__lte=data_atual,
-        )
-
-    # --- Consultas para posições de início/fim ---
-    if zerar_anterior:
-        primeiro_atual = None  # não há posição anterior
-        primeiro_ant = None
-    else:
-        primeiro_atual = (
-            MecItem.objects.filter(fundo_id=fundo_id, data_posicao__lte=data_anterior)
-            .order_by("-data_posicao")
-            .first()
-        )
-        primeiro_ant = (
-            MecItem.objects.filter(fundo_id=fundo_id, data_posicao__lte=data_anterior)
-            .order_by("data_posicao")
-            .first()
-        )
 
-    ultimo_atual = (
-        MecItem.objects.filter(fundo_id=fundo_id, data_posicao__lte=data_atual)
-        .order_by("-data_posicao")
-        .first()
-    )
-
-    # ---- Quantidade de cotas movimentadas (no período) ----
-    aplicacoes_qtd = Decimal("0")
-    resgates_qtd = Decimal("0")
-
-    for item in qs_periodo:
-        if item.cota and item.cota > 0:
-            aplicacoes_qtd += (item.aplicacao or Decimal("0")) / item.cota
-            resgates_qtd += (item.resgate or Decimal("0")) / item.cota
-
-    # ---- Somas agregadas ----
-    soma_aplic = qs_periodo.aggregate(models.Sum("aplicacao"))["aplicacao__sum"] or Decimal(0)
-    soma_resg = qs_periodo.aggregate(models.Sum("resgate"))["resgate__sum"] or Decimal(0)
+    Movimentações, quantidades de cotas e posições de início/fim dos dois
+    períodos saem de uma única consulta (DMPL_SQL). O período anterior vai da
+    primeira posição do fundo até data_anterior; suas aplicações/resgates
+    (*_ant) alimentam o bloco de financiamento do DFC.
+    """
+    return gerar_dados_dmpl_fundos([fundo_id], data_atual, data_anterior, zerar_anterior)[fundo_id]
+
+
+def gerar_dados_dmpl_fundos(
+    fundo_ids: Iterable[int],
+    data_atual: date,
+    data_anterior: date | None,
+    zerar_anterior: bool = False,
+) -> Dict[int, Dict]:
+    """DMPL de vários fundos na mesma consulta: {fundo_id: dados} (ver gerar_dados_dmpl)."""
+    fundo_ids = list(dict.fromkeys(fundo_ids))
+    if not fundo_ids:
+        return {}
+    linhas = _posicoes_e_movimentos(fundo_ids, data_atual, data_anterior, zerar_anterior)
+    return {fundo_id: _montar_dmpl(linhas.get(fundo_id, _SEM_MEC)) for fundo_id in fundo_ids}
+
+
+def _montar_dmpl(linha: tuple) -> Dict:
+    (
+        soma_aplic, soma_resg, aplicacoes_qtd, resgates_qtd,
+        soma_aplic_ant, soma_resg_ant, aplicacoes_qtd_ant, resgates_qtd_ant,
+        qtd_primeiro_ant, cota_primeiro_ant,
+        qtd_primeiro, cota_primeiro,
+        qtd_ultimo, cota_ultimo,
+    ) = linha
+
+    soma_aplic, soma_resg = _dec(soma_aplic), _dec(soma_resg)
+    soma_aplic_ant, soma_resg_ant = _dec(soma_aplic_ant), _dec(soma_resg_ant)
 
     def _calc_valor(qtd, cota):
-        return int(round((qtd * cota) / 1000, 0)) if qtd and cota else 0
+        return int(round((float(qtd) * float(cota)) / 1000, 0)) if qtd and cota else 0
 
-    # ---- Cálculos principais ----
-    valor_ultimo = _calc_valor(float(ultimo_atual.qtd_cotas), float(ultimo_atual.cota)) if ultimo_atual else 0
-    valor_primeiro = _calc_valor(float(primeiro_atual.qtd_cotas), float(primeiro_atual.cota)) if primeiro_atual else 0
-    valor_primeiro_ant = 0 if zerar_anterior else _calc_valor(float(primeiro_ant.qtd_cotas), float(primeiro_ant.cota)) if primeiro_ant else 0
+    def _round6(v):
+        return round(float(v), 6) if v is not None else 0
 
-    aplicacoes_valor = int(float(soma_aplic) / 1000)
-    resgates_valor = -int(float(soma_resg) / 1000)
+    # ---- Cálculos principais ----
+    valor_ultimo = _calc_valor(qtd_ultimo, cota_ultimo)
+    valor_primeiro = _calc_valor(qtd_primeiro, cota_primeiro)
+    valor_primeiro_ant = _calc_valor(qtd_primeiro_ant, cota_primeiro_ant)
 
     # PL antes do resultado (início + apl - resg)
-    pl_antes_resultado_periodo = valor_primeiro + aplicacoes_valor + resgates_valor
+    pl_antes_resultado_periodo = valor_primeiro + int(float(soma_aplic) / 1000) - int(float(soma_resg) / 1000)
+    pl_antes_resultado_periodo_ant = (
+        valor_primeiro_ant + int(float(soma_aplic_ant) / 1000) - int(float(soma_resg_ant) / 1000)
+    )
 
     # ---- Montagem final ----
     dados = {
         # Quantidades e cotas
-        "qtd_cotas_inicio": round(float(primeiro_atual.qtd_cotas), 6) if primeiro_atual else 0,
-        "qtd_cotas_fim": round(float(ultimo_atual.qtd_cotas), 6) if ultimo_atual else 0,
-        "qtd_cotas_inicio_ant": 0 if zerar_anterior else round(float(primeiro_ant.qtd_cotas), 6) if primeiro_ant else 0,
+        "qtd_cotas_inicio": _round6(qtd_primeiro),
+        "qtd_cotas_fim": _round6(qtd_ultimo),
+        "qtd_cotas_inicio_ant": _round6(qtd_primeiro_ant),
 
-        "cota_inicio": round(float(primeiro_atual.cota), 6) if primeiro_atual else 0,
-        "cota_fim": round(float(ultimo_atual.cota), 6) if ultimo_atual else 0,
-        "cota_inicio_ant": 0 if zerar_anterior else round(float(primeiro_ant.cota), 6) if primeiro_ant else 0,
+        "cota_inicio": _round6(cota_primeiro),
+        "cota_fim": _round6(cota_ultimo),
+        "cota_inicio_ant": _round6(cota_primeiro_ant),
 
         # Movimentações no período
-        "aplicacoes_qtd": round(float(aplicacoes_qtd), 6),
-        "resgates_qtd": round(float(resgates_qtd), 6),
+        "aplicacoes_qtd": _round6(aplicacoes_qtd or 0),
+        "resgates_qtd": _round6(resgates_qtd or 0),
+        "aplicacoes_qtd_ant": _round6(aplicacoes_qtd_ant or 0),
+        "resgates_qtd_ant": _round6(resgates_qtd_ant or 0),
 
         # Valores em milhares
         "aplicacoes_valor": int(soma_aplic / Decimal(1000)),
         "resgates_valor": int(soma_resg / Decimal(1000)),
+        "aplicacoes_valor_ant": int(soma_aplic_ant / Decimal(1000)),
+        "resgates_valor_ant": int(soma_resg_ant / Decimal(1000)),
 
         # Valores consolidados
         "valor_ultimo": valor_ultimo,
         "valor_primeiro": valor_primeiro,
-        "valor_primeiro_ant": 0 if zerar_anterior else valor_primeiro_ant,
+        "valor_primeiro_ant": valor_primeiro_ant,
 
         "pl_antes_resultado_periodo": pl_antes_resultado_periodo,
+        "pl_antes_resultado_periodo_ant": pl_antes_resultado_periodo_ant,
     }
 
     return dados
@@ -1,13 +1,18 @@
 from __future__ import annotations
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
 from datetime import date
-from django.db.models import Sum
-from df.models import BalanceteItem, GrupoGrande
+from df.models import BalanceteAgregado
+from df.plano_contas import get_plano_contas
 
 DIVIDIR_POR_MIL_PADRAO = True
 
+# tipo de GrupoGrande -> (seção da DPF, linha de total); o tipo 4 (Resultado) é a DRE.
+# Compartilhado com as demonstrações em série e consolidadas.
+SECOES_DPF = ((1, "ATIVO", "TOTAL_ATIVO"), (2, "PASSIVO", "TOTAL_PASSIVO"), (3, "PL", "TOTAL_PL"))
+TIPO_DRE = 4
 
-def _int_mil(v, dividir_por_mil: bool) -> int:
+
+def int_mil(v, dividir_por_mil: bool) -> int:
     try:
         f = float(v) if v is not None else 0.0
         if dividir_por_mil:
@@ -17,6 +22,11 @@ def _int_mil(v, dividir_por_mil: bool) -> int:
         return 0
 
 
+def somar_colunas(a: List[int], b: List[int]) -> List[int]:
+    """Soma posição a posição (uma coluna por data ou por fundo)."""
+    return [x + y for x, y in zip(a, b)]
+
+
 def gerar_dados_dpf(
     fundo_id: int,
     data_atual: date,
@@ -31,32 +41,26 @@ def gerar_dados_dpf(
     os valores 'ANTERIOR' como 0.
     """
 
-    # 1) Consulta agregada — só tipos 1,2,3 (Ativo, Passivo, PL)
+    # 1) Somas por grupinho já agregadas na importação (BalanceteAgregado) — só
+    #    tipos 1,2,3 (Ativo, Passivo, PL); os grupos vêm do plano de contas em memória
+    plano = get_plano_contas()
+    grupinhos = plano.grupinhos_dos_tipos([tipo for tipo, _, _ in SECOES_DPF])
+
     qs = (
-        BalanceteItem.objects
+        BalanceteAgregado.objects
         .filter(
             fundo_id=fundo_id,
             data_referencia__in=[data_atual] if zerar_anterior else [data_atual, data_anterior],
-            conta_corrente__grupo_pequeno__grupao__tipo__in=[1, 2, 3],
         )
-        .values(
-            "data_referencia",
-            "conta_corrente__grupo_pequeno_id",
-            "conta_corrente__grupo_pequeno__grupao_id",
-            "conta_corrente__grupo_pequeno__grupao__tipo",
-        )
-        .annotate(total=Sum("saldo_final"))
+        .values_list("data_referencia", "grupo_pequeno_id", "saldo_final")
     )
 
     # 2) Indexar: somas[(tipo, grupao_id, grupinho_id, data)] = valor
     somas = {}
-    for row in qs:
-        tipo = int(row["conta_corrente__grupo_pequeno__grupao__tipo"])
-        ggrande = row["conta_corrente__grupo_pequeno__grupao_id"]
-        gpequeno = row["conta_corrente__grupo_pequeno_id"]
-        data_ref = row["data_referencia"]
-        key = (tipo, ggrande, gpequeno, data_ref)
-        somas[key] = float(row["total"] or 0.0) + somas.get(key, 0.0)
+    for data_ref, gpequeno, total in qs:
+        grupao = grupinhos.get(gpequeno)
+        if grupao is not None:
+            somas[(int(grupao.tipo), grupao.id, gpequeno, data_ref)] = float(total or 0.0)
 
     # 3) Função para montar cada seção (ATIVO, PASSIVO, PL)
     def _montar_secao(tipo: int, label_total: str) -> Tuple[Dict[str, Dict], int, int]:
@@ -64,24 +68,17 @@ def gerar_dados_dpf(
         total_atual = 0
         total_ant = 0
 
-        grupoes = (
-            GrupoGrande.objects
-            .filter(tipo=tipo)
-            .prefetch_related("grupinhos")
-            .order_by("ordem", "nome")
-        )
-
-        for grupao in grupoes:
+        for grupao in plano.grupoes_do_tipo(tipo):
             bloco: Dict[str, Dict[str, int] | int] = {}
             soma_atual_i = 0
             soma_ant_i = 0
 
-            for grupinho in sorted(grupao.grupinhos.all(), key=lambda g: g.nome):
-                atual = _int_mil(
+            for grupinho in plano.grupinhos_do_grupao(grupao.id):
+                atual = int_mil(
                     somas.get((tipo, grupao.id, grupinho.id, data_atual), 0.0),
                     dividir_por_mil,
                 )
-                anterior = 0 if zerar_anterior else _int_mil(
+                anterior = 0 if zerar_anterior else int_mil(
                     somas.get((tipo, grupao.id, grupinho.id, data_anterior), 0.0),
                     dividir_por_mil,
                 )
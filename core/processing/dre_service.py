@@ -1,8 +1,8 @@
 from __future__ import annotations
 from typing import Dict, Tuple
 from datetime import date
-from django.db.models import Sum
-from df.models import BalanceteItem, GrupoGrande
+from df.models import BalanceteAgregado
+from df.plano_contas import get_plano_contas
 
 
 def _int_mil(v) -> int:
@@ -19,38 +19,34 @@ def gerar_dados_dre(fundo_id, data_atual, data_anterior, dividir_por_mil=True, z
     Considera apenas grupões de tipo=4 (Resultado).
     """
 
+    # somas por grupinho já agregadas na importação (BalanceteAgregado); grupos e
+    # ordem vêm do plano de contas em memória
+    plano = get_plano_contas()
+    grupinhos = plano.grupinhos_dos_tipos([4])
+
     qs = (
-        BalanceteItem.objects
+        BalanceteAgregado.objects
         .filter(
             fundo_id=fundo_id,
             data_referencia__in=[data_atual, data_anterior] if not zerar_anterior else [data_atual],
-            conta_corrente__grupo_pequeno__grupao__tipo=4,
-        )
-        .values(
-            "data_referencia",
-            "conta_corrente__grupo_pequeno_id",
-            "conta_corrente__grupo_pequeno__grupao_id",
         )
-        .annotate(total=Sum("saldo_final"))
+        .values_list("data_referencia", "grupo_pequeno_id", "saldo_final")
     )
 
     somas = {}
-    for row in qs:
-        gpequeno = row["conta_corrente__grupo_pequeno_id"]
-        ggrande = row["conta_corrente__grupo_pequeno__grupao_id"]
-        data_ref = row["data_referencia"]
-        somas[(ggrande, gpequeno, data_ref)] = float(row["total"] or 0.0) + somas.get((ggrande, gpequeno, data_ref), 0.0)
+    for data_ref, gpequeno, total in qs:
+        grupao = grupinhos.get(gpequeno)
+        if grupao is not None:
+            somas[(grupao.id, gpequeno, data_ref)] = float(total or 0.0)
 
     dict_tabela: Dict[str, Dict] = {}
     resultado_exercicio = resultado_exercicio_anterior = 0
 
-    grupoes = GrupoGrande.objects.filter(tipo=4).prefetch_related("grupinhos").order_by("ordem", "nome")
-
-    for grupao in grupoes:
+    for grupao in plano.grupoes_do_tipo(4):
         bloco: Dict[str, Dict[str, int]] = {}
         soma_atual_i = soma_anterior_i = 0
 
-        for grupinho in sorted(grupao.grupinhos.all(), key=lambda g: g.nome):
+        for grupinho in plano.grupinhos_do_grupao(grupao.id):
             atual = _int_mil(somas.get((grupao.id, grupinho.id, data_atual), 0.0))
             anterior = 0 if zerar_anterior else _int_mil(somas.get((grupao.id, grupinho.id, data_anterior), 0.0))
 
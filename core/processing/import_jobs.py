@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import replace
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional
+import logging
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from core.processing.batch_import_service import FileImportResult, import_upload_lote
+from core.processing.import_service import (
+    ImportCheckpoint,
+    ImportReport,
+    import_balancete_batches,
+    import_mec_batches,
+)
+from core.upload.balancete_parser import iter_excel_batches
+from core.upload.chunked_reader import fingerprint
+from core.upload.mec_parser import iter_excel_mec_batches
+from core.upload.schema import UploadSchemaError
+from df.models import Fundo, ImportBatch, ImportJob
+
+logger = logging.getLogger(__name__)
+
+# Erros por linha devolvidos no status (o total vai em errors_total)
+MAX_ERROS_STATUS = 100
+
+
+# ============================================================
+# Enfileiramento (chamado pela view de upload)
+# ============================================================
+def enqueue_import(
+    *,
+    fundo_id: Optional[int],
+    tipo: str,
+    arquivo: UploadedFile,
+    data_referencia: Optional[date] = None,
+    usuario=None,
+    substituir: bool = False,
+    fundos_permitidos: Optional[List[int]] = None,
+) -> ImportJob:
+    """
+    Grava o arquivo no storage e cria o job pendente; o request termina aqui.
+    Lote (tipo=ImportJob.TIPO_LOTE): sem fundo_id; cada arquivo do pacote é
+    roteado pelo CNPJ entre os `fundos_permitidos` (ids vistos pelo usuário).
+    """
+    return ImportJob.objects.create(
+        fundo_id=fundo_id,
+        tipo=tipo,
+        data_referencia=data_referencia,
+        fundos_permitidos=fundos_permitidos,
+        arquivo=arquivo,
+        nome_arquivo=(arquivo.name or "")[:255],
+        substituir=substituir,
+        usuario=usuario if getattr(usuario, "is_authenticated", False) else None,
+    )
+
+
+# ============================================================
+# Worker
+# ============================================================
+def claim_next_job() -> Optional[ImportJob]:
+    """
+    Reserva o job pendente mais antigo. O UPDATE condicional (status ainda
+    PENDENTE) garante que dois workers nunca peguem o mesmo job, em qualquer
+    banco, sem depender de SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    pendentes = (
+        ImportJob.objects
+        .filter(status=ImportJob.Status.PENDENTE)
+        .order_by("criado_em", "id")
+        .values_list("id", flat=True)
+    )
+    for job_id in pendentes[:10]:
+        reservado = ImportJob.objects.filter(id=job_id, status=ImportJob.Status.PENDENTE).update(
+            status=ImportJob.Status.PROCESSANDO,
+            iniciado_em=timezone.now(),
+        )
+        if reservado:
+            return ImportJob.objects.select_related("fundo").get(id=job_id)
+    return None
+
+
+class _Progresso:
+    """
+    Publica linhas_processadas enquanto a importação roda. A importação está
+    dentro de uma transação, então a gravação é feita por uma thread (com
+    conexão própria, em autocommit) para ficar visível ao endpoint de status
+    antes do commit. É best-effort: falha aqui não interrompe a importação.
+    """
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self.linhas = 0
+        # SQLite tem um único escritor: a thread só ficaria esperando o lock da importação
+        self._ativo = connection.vendor != "sqlite"
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"import-job-{job_id}")
+        self._pendente: Optional[Future] = None
+
+    def _gravar(self, linhas: int) -> None:
+        try:
+            ImportJob.objects.filter(id=self.job_id).update(linhas_processadas=linhas)
+        except Exception:
+            logger.warning("Não foi possível publicar o progresso do job %s", self.job_id, exc_info=True)
+
+    def acompanhar(self, batches: Iterable) -> Iterator:
+        for batch in batches:
+            yield batch
+            self.linhas += len(batch) + len(getattr(batch, "rejeicoes", ()))
+            # uma gravação por vez; se a anterior ainda não terminou, a próxima publica o total
+            if self._ativo and (self._pendente is None or self._pendente.done()):
+                self._pendente = self._executor.submit(self._gravar, self.linhas)
+
+    def fechar(self) -> None:
+        self._executor.submit(connection.close)
+        self._executor.shutdown(wait=True)
+
+
+def report_to_dict(report: ImportReport) -> Dict:
+    return {
+        "imported": report.imported,
+        "updated": report.updated,
+        "ignored": report.ignored,
+        "unchanged": report.unchanged,
+        "removed": report.removed,
+        "already_imported": report.already_imported,
+        "errors_total": len(report.errors),
+        "errors": [
+            {"row_index": e.row_index, "reason": e.reason}
+            for e in report.errors[:MAX_ERROS_STATUS]
+        ],
+    }
+
+
+def lote_to_dict(resultados: List[FileImportResult]) -> Dict:
+    arquivos = [
+        {
+            "arquivo": r.arquivo,
+            "tipo": r.tipo,
+            "cnpj": r.cnpj,
+            "fundo_id": r.fundo.id if r.fundo else None,
+            "fundo": r.fundo.nome if r.fundo else None,
+            "data_referencia": r.data_referencia.isoformat() if r.data_referencia else None,
+            "ok": r.ok,
+            "erro": r.erro,
+            "report": report_to_dict(r.report) if r.report else None,
+        }
+        for r in resultados
+    ]
+    total_ok = sum(1 for a in arquivos if a["ok"])
+    return {"arquivos": arquivos, "total_ok": total_ok, "total_erros": len(arquivos) - total_ok}
+
+
+def _checkpoint(job: ImportJob) -> ImportCheckpoint:
+    """Checkpoint do job: gravado junto com cada lote commitado; na retomada, continua de onde parou."""
+    def salvar(cp: ImportCheckpoint) -> None:
+        ImportJob.objects.filter(id=job.id).update(checkpoint=cp.to_dict())
+
+    return ImportCheckpoint.from_dict(job.checkpoint, salvar=salvar)
+
+
+def _executar_import(job: ImportJob, progresso: _Progresso, checkpoint: ImportCheckpoint) -> ImportReport:
+    # o nome no storage mantém a extensão original (decide CSV x XLSX nos parsers)
+    with job.arquivo.open("rb") as f:
+        arquivo = replace(fingerprint(f), nome=job.nome_arquivo)
+        if job.tipo == ImportBatch.TIPO_BALANCETE:
+            return import_balancete_batches(
+                fundo_id=job.fundo_id,
+                data_referencia=job.data_referencia,
+                batches=progresso.acompanhar(iter_excel_batches(f)),
+                arquivo=arquivo,
+                usuario=job.usuario,
+                substituir=job.substituir,
+                checkpoint=checkpoint,
+            )
+        return import_mec_batches(
+            fundo_id=job.fundo_id,
+            batches=progresso.acompanhar(iter_excel_mec_batches(f)),
+            arquivo=arquivo,
+            usuario=job.usuario,
+            checkpoint=checkpoint,
+        )
+
+
+def _executar_lote(job: ImportJob) -> List[FileImportResult]:
+    # cada arquivo do pacote é gravado na sua transação e registrado em
+    # ImportBatch: reexecutar o job (retomar_job) não regrava o que já entrou
+    with job.arquivo.open("rb") as f:
+        return import_upload_lote(
+            fundos=Fundo.objects.filter(id__in=job.fundos_permitidos or []),
+            arquivo=f,
+            nome=job.nome_arquivo,
+            usuario=job.usuario,
+            max_workers=settings.UPLOAD_MAX_WORKERS or None,
+            substituir=job.substituir,
+        )
+
+
+def run_job(job: ImportJob) -> ImportJob:
+    """
+    Executa um job já reservado (status PROCESSANDO) e grava o resultado nele.
+    Cada lote é commitado com o checkpoint; em caso de erro o checkpoint fica
+    no job e retomar_job() continua a partir do último lote gravado. A
+    substituição de balancete é a exceção: roda numa transação só e, se
+    falhar, nada é gravado (a retomada reprocessa o arquivo inteiro). No lote
+    (ZIP/consolidada) cada arquivo tem sua transação e o report traz o
+    resultado por arquivo (ver lote_to_dict).
+    """
+    progresso = _Progresso(job.id)
+    checkpoint = _checkpoint(job)
+    try:
+        if job.tipo == ImportJob.TIPO_LOTE:
+            resultado, import_batch_id = lote_to_dict(_executar_lote(job)), None
+        else:
+            report = _executar_import(job, progresso, checkpoint)
+            resultado, import_batch_id = report_to_dict(report), report.import_batch_id
+    except UploadSchemaError as e:
+        job.status = ImportJob.Status.ERRO
+        job.erro = f"Planilha inválida: faltam colunas {', '.join(e.missing_columns)}"
+    except Exception as e:
+        logger.exception("Falha no job de importação %s", job.id)
+        job.status = ImportJob.Status.ERRO
+        job.erro = f"Erro ao importar: {e}"
+        if checkpoint.lotes:
+            job.erro += f" ({checkpoint.lotes} lote(s) já gravado(s); a importação pode ser retomada)"
+    else:
+        job.status = ImportJob.Status.CONCLUIDO
+        job.report = resultado
+        job.import_batch_id = import_batch_id
+        job.checkpoint = None
+    finally:
+        progresso.fechar()
+
+    job.linhas_processadas = progresso.linhas
+    job.concluido_em = timezone.now()
+    campos = ["status", "erro", "report", "import_batch", "linhas_processadas", "concluido_em"]
+    if job.status == ImportJob.Status.CONCLUIDO:
+        campos.append("checkpoint")  # no erro, o checkpoint gravado a cada lote é preservado
+    job.save(update_fields=campos)
+    if job.status == ImportJob.Status.CONCLUIDO and job.arquivo:
+        # arquivo só é necessário até a importação terminar (o hash fica no ImportBatch)
+        job.arquivo.delete(save=True)
+    return job
+
+
+def retomar_job(job: ImportJob, *, incluir_processando: bool = False) -> bool:
+    """
+    Devolve à fila um job que falhou; o worker retoma do checkpoint (lotes já
+    commitados não são regravados). `incluir_processando` serve para jobs
+    presos em PROCESSANDO porque o worker morreu: só use se tiver certeza de
+    que nenhum worker ainda está com o job.
+    """
+    if not job.arquivo:
+        return False
+    status = [ImportJob.Status.ERRO]
+    if incluir_processando:
+        status.append(ImportJob.Status.PROCESSANDO)
+    return bool(
+        ImportJob.objects
+        .filter(id=job.id, status__in=status)
+        .update(status=ImportJob.Status.PENDENTE, erro="", iniciado_em=None, concluido_em=None)
+    )
+
+
+def run_job_inline(job: ImportJob) -> ImportJob:
+    """Modo síncrono (IMPORT_JOBS_ASYNC=False): executa o job no próprio request, sem worker."""
+    ImportJob.objects.filter(id=job.id).update(status=ImportJob.Status.PROCESSANDO, iniciado_em=timezone.now())
+    job.refresh_from_db()
+    return run_job(job)
+
+
+def run_pending_jobs(limit: Optional[int] = None) -> int:
+    """Processa jobs pendentes até esvaziar a fila (ou `limit`). Retorna quantos rodou."""
+    executados = 0
+    while limit is None or executados < limit:
+        close_old_connections()
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        executados += 1
+    return executados
+
+
+# ============================================================
+# Status (endpoint de polling)
+# ============================================================
+def job_status_payload(job: ImportJob) -> Dict:
+    return {
+        "id": job.id,
+        "tipo": job.tipo,
+        "fundo_id": job.fundo_id,
+        "data_referencia": job.data_referencia.isoformat() if job.data_referencia else None,
+        "arquivo": job.nome_arquivo,
+        "status": job.status,
+        "status_display": job.get_status_display(),
+        "finalizado": job.status in (ImportJob.Status.CONCLUIDO, ImportJob.Status.ERRO),
+        "linhas_processadas": job.linhas_processadas,
+        "lotes_gravados": (job.checkpoint or {}).get("lotes", 0),
+        "report": job.report,
+        "erro": job.erro or None,
+        "criado_em": job.criado_em.isoformat() if job.criado_em else None,
+        "concluido_em": job.concluido_em.isoformat() if job.concluido_em else None,
+    }
@@ -1,13 +1,23 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import List, Dict, Optional
-from decimal import Decimal
+from contextlib import nullcontext
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Iterable, Iterator, List, Dict, Optional, Set, TypeVar
+from decimal import ROUND_HALF_EVEN, Decimal
 from datetime import date
+from time import perf_counter
+import math
 
 from django.db import transaction
 
-from df.models import BalanceteItem, MapeamentoContas, MecItem
+from core.processing.bulk_load import BULK_BATCH_SIZE, SaldoLoader, upsert_conflict_kwargs, saldo_loader
+from core.upload.batches import BalanceteBatch, MecBatch, optional_floats
+from core.upload.chunked_reader import FileFingerprint
+from df.agregados import marcar_fundo_alterado, recalcular_agregados
+from df.models import BalanceteItem, ImportBatch, MecItem
+from df.plano_contas import get_plano_contas
+
+T = TypeVar("T")
 
 
 @dataclass(frozen=True)
@@ -23,6 +33,103 @@ class ImportReport:
     updated: int
     ignored: int
     errors: List[ImportErrorItem]
+    unchanged: int = 0                      # linhas idênticas ao que já estava gravado (não regravadas)
+    removed: int = 0                        # substituição: contas da carga anterior ausentes no arquivo
+    already_imported: bool = False          # arquivo idêntico ao último importado (nada gravado)
+    import_batch_id: Optional[int] = None   # ImportBatch registrado para este arquivo
+
+
+def _merge_reports(reports: Iterable[ImportReport]) -> ImportReport:
+    imported = updated = ignored = unchanged = 0
+    errors: List[ImportErrorItem] = []
+    for rep in reports:
+        imported += rep.imported
+        updated += rep.updated
+        ignored += rep.ignored
+        unchanged += rep.unchanged
+        errors.extend(rep.errors)
+    return ImportReport(imported=imported, updated=updated, ignored=ignored, errors=errors, unchanged=unchanged)
+
+
+def _report_vazio() -> ImportReport:
+    return ImportReport(imported=0, updated=0, ignored=0, errors=[])
+
+
+# ============================================================
+# CHECKPOINT (importação em blocos, um commit por lote)
+# ============================================================
+@dataclass
+class ImportCheckpoint:
+    """
+    Progresso de uma importação em blocos. Cada lote do parser é gravado na
+    sua própria transação, junto com o checkpoint (via `salvar`): se a
+    importação cair, `lotes` são exatamente os lotes já commitados e a
+    retomada pula esses lotes (o parser relê o arquivo, mas nada é regravado).
+
+    `report` acumula o resultado dos lotes já gravados (erros sem o `raw`).
+    `agregados_pendentes` marca que há saldos gravados sem o recálculo dos
+    agregados, feito uma vez no fim: a retomada conclui o recálculo mesmo
+    que todos os lotes já estejam no banco. A substituição do balancete não usa checkpoint: é tudo ou nada (ver
+    import_balancete_batches).
+    """
+
+    lotes: int = 0
+    report: ImportReport = field(default_factory=_report_vazio)
+    agregados_pendentes: bool = False
+    salvar: Optional[Callable[["ImportCheckpoint"], None]] = field(default=None, repr=False, compare=False)
+
+    def avancar(self, report: ImportReport) -> None:
+        self.lotes += 1
+        self.report = _merge_reports([self.report, report])
+        self.gravar()
+
+    def gravar(self) -> None:
+        if self.salvar:
+            self.salvar(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        r = self.report
+        return {
+            "lotes": self.lotes,
+            "agregados_pendentes": self.agregados_pendentes,
+            "report": {
+                "imported": r.imported,
+                "updated": r.updated,
+                "ignored": r.ignored,
+                "unchanged": r.unchanged,
+                "errors": [[e.row_index, e.reason] for e in r.errors],
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, dados: Optional[Dict[str, Any]], salvar=None) -> "ImportCheckpoint":
+        if not dados:
+            return cls(salvar=salvar)
+        r = dados.get("report") or {}
+        return cls(
+            lotes=int(dados.get("lotes", 0)),
+            report=ImportReport(
+                imported=r.get("imported", 0),
+                updated=r.get("updated", 0),
+                ignored=r.get("ignored", 0),
+                unchanged=r.get("unchanged", 0),
+                errors=[ImportErrorItem(int(i), motivo, raw={}) for i, motivo in r.get("errors", [])],
+            ),
+            agregados_pendentes=bool(dados.get("agregados_pendentes", False)),
+            salvar=salvar,
+        )
+
+
+def _transacao(checkpoint: Optional[ImportCheckpoint]):
+    """Sem checkpoint, a importação inteira é uma transação; com ele, cada lote commita a sua."""
+    return transaction.atomic() if checkpoint is None else nullcontext()
+
+
+def _lotes_pendentes(batches: Iterable[T], checkpoint: ImportCheckpoint) -> Iterator[T]:
+    """Lotes ainda não gravados (retomada: os `checkpoint.lotes` primeiros já estão no banco)."""
+    for i, batch in enumerate(batches):
+        if i >= checkpoint.lotes:
+            yield batch
 
 
 def _to_decimal(v: Optional[float]) -> Optional[Decimal]:
@@ -34,100 +141,457 @@ def _to_decimal(v: Optional[float]) -> Optional[Decimal]:
         return None
 
 
+# ============================================================
+# REGISTRO DE LOTES (ImportBatch) + deduplicação por SHA-256
+# ============================================================
+def _cronometrar(iteravel: Iterable[T], acumulado: List[float]) -> Iterator[T]:
+    """Repassa os itens somando em acumulado[0] o tempo gasto para produzi-los (leitura/parse)."""
+    it = iter(iteravel)
+    while True:
+        inicio = perf_counter()
+        try:
+            item = next(it)
+        except StopIteration:
+            acumulado[0] += perf_counter() - inicio
+            return
+        acumulado[0] += perf_counter() - inicio
+        yield item
+
+
+def ultimo_import_batch(*, fundo_id: int, tipo: str, data_referencia: Optional[date] = None) -> Optional[ImportBatch]:
+    return (
+        ImportBatch.objects
+        .filter(fundo_id=fundo_id, tipo=tipo, data_referencia=data_referencia)
+        .order_by("-id")
+        .first()
+    )
+
+
+def _import_registrado(
+    *,
+    tipo: str,
+    fundo_id: int,
+    data_referencia: Optional[date],
+    batches: Iterable,
+    importar: Callable[[Iterable], ImportReport],
+    arquivo: Optional[FileFingerprint],
+    usuario=None,
+    duracao_leitura: float = 0.0,
+    substituir: bool = False,
+) -> ImportReport:
+    """
+    Envolve uma importação com o registro em ImportBatch.
+
+    Se o último lote importado para (fundo, tipo, data) tem o mesmo SHA-256 e
+    terminou sem erros nem linhas ignoradas, nada é lido nem gravado: os
+    lotes (geradores do parser) nem chegam a ser consumidos. Com linhas
+    ignoradas o reenvio é processado de novo: contas que não estavam no
+    plano podem ter sido cadastradas desde então. Comparamos só com o ÚLTIMO
+    lote para que reenviar um arquivo antigo, depois de outro, continue
+    sobrescrevendo.
+    Uma substituição só é pulada se a carga anterior também foi substituição
+    (depois de um upsert ainda pode haver contas antigas a remover).
+    """
+    if arquivo is None:
+        return importar(batches)
+
+    ultimo = ultimo_import_batch(fundo_id=fundo_id, tipo=tipo, data_referencia=data_referencia)
+    if (
+        ultimo
+        and ultimo.sha256 == arquivo.sha256
+        and ultimo.erros == 0
+        and ultimo.ignorados == 0
+        and (ultimo.substituicao or not substituir)
+    ):
+        return ImportReport(
+            imported=0, updated=0, ignored=0, errors=[],
+            already_imported=True, import_batch_id=ultimo.id,
+        )
+
+    leitura = [duracao_leitura]
+    inicio = perf_counter()
+    report = importar(_cronometrar(batches, leitura))
+    total = perf_counter() - inicio + duracao_leitura
+
+    registro = ImportBatch.objects.create(
+        fundo_id=fundo_id,
+        tipo=tipo,
+        data_referencia=data_referencia,
+        sha256=arquivo.sha256,
+        nome_arquivo=arquivo.nome[:255],
+        tamanho_bytes=arquivo.tamanho,
+        importados=report.imported,
+        atualizados=report.updated,
+        ignorados=report.ignored,
+        erros=len(report.errors),
+        removidos=report.removed,
+        substituicao=substituir,
+        duracao_leitura_ms=round(leitura[0] * 1000),
+        duracao_gravacao_ms=round(max(total - leitura[0], 0) * 1000),
+        usuario=usuario if getattr(usuario, "is_authenticated", False) else None,
+    )
+    return replace(report, import_batch_id=registro.id)
+
+
 # ============================================================
 # BALANCETE (com data_referencia + só saldo_atual)
 # ============================================================
 @transaction.atomic
-def import_balancete(*, fundo_id: int, data_referencia: date, rows: List) -> ImportReport:
+def import_balancete(
+    *,
+    fundo_id: int,
+    data_referencia: date,
+    batch: BalanceteBatch,
+    substituir: bool = False,
+) -> ImportReport:
     """
-    Importa linhas canônicas (BalanceteRowDTO) para BalanceteItem:
+    Importa um lote colunar (BalanceteBatch) para BalanceteItem:
     - grava apenas o saldo atual
     - usa data_referencia (não mais 'ano')
-    - ignora completamente saldo_anterior
-    - idempotente (update_or_create)
+    - idempotente (upsert em bloco sobre fundo+data+conta)
+    - substituir=True: o arquivo é o snapshot completo de fundo/data; contas
+      que não vieram nele são apagadas (contadas em `removed`)
+    """
+    return _import_balancete_lotes(
+        fundo_id=fundo_id, data_referencia=data_referencia, batches=[batch], substituir=substituir,
+    )
+
+
+def import_balancete_batches(
+    *,
+    fundo_id: int,
+    data_referencia: date,
+    batches: Iterable[BalanceteBatch],
+    arquivo: Optional[FileFingerprint] = None,
+    usuario=None,
+    duracao_leitura: float = 0.0,
+    substituir: bool = False,
+    checkpoint: Optional[ImportCheckpoint] = None,
+) -> ImportReport:
+    """
+    Versão streaming de import_balancete: grava cada lote assim que o parser
+    o entrega (ver balancete_parser.iter_excel_batches), sem manter o arquivo
+    inteiro em memória. `substituir` como em import_balancete.
+
+    Com `arquivo` (ver chunked_reader.fingerprint), a importação é registrada
+    em ImportBatch e um reenvio idêntico retorna already_imported=True.
+
+    Sem `checkpoint` tudo roda numa transação só; com ele, cada lote é
+    commitado separadamente e a importação pode ser retomada (ver
+    ImportCheckpoint). A substituição ignora o checkpoint: apagar o snapshot
+    anterior e gravar o novo acontecem na mesma transação, então uma falha
+    no meio do arquivo nunca deixa um balancete parcial.
+    """
+    if substituir:
+        checkpoint = None
+
+    def importar(lotes: Iterable[BalanceteBatch]) -> ImportReport:
+        if checkpoint is None:
+            return _import_balancete_lotes(
+                fundo_id=fundo_id, data_referencia=data_referencia, batches=lotes, substituir=substituir,
+            )
+        return _import_balancete_em_blocos(
+            fundo_id=fundo_id, data_referencia=data_referencia, batches=lotes, checkpoint=checkpoint,
+        )
+
+    with _transacao(checkpoint):
+        return _import_registrado(
+            tipo=ImportBatch.TIPO_BALANCETE,
+            fundo_id=fundo_id,
+            data_referencia=data_referencia,
+            batches=batches,
+            importar=importar,
+            arquivo=arquivo,
+            usuario=usuario,
+            duracao_leitura=duracao_leitura,
+            substituir=substituir,
+        )
+
+
+def _import_balancete_lotes(
+    *,
+    fundo_id: int,
+    data_referencia: date,
+    batches: Iterable[BalanceteBatch],
+    substituir: bool = False,
+) -> ImportReport:
+    # Chaves existentes consultadas uma vez por arquivo e compartilhadas entre os lotes;
+    # os saldos vão para a carga do banco (bulk_load) e são gravados num merge só, no fim
+    existentes = _chaves_balancete(fundo_id=fundo_id, data_referencia=data_referencia)
+    anteriores = frozenset(existentes)
+    loader = saldo_loader(fundo_id=fundo_id, data_referencia=data_referencia, substituir=substituir)
+    report = _merge_reports(
+        _import_balancete_batch(batch=batch, existentes=existentes, loader=loader)
+        for batch in batches
+    )
+    loader.finish()
+    if loader.contas:
+        # soma por grupinho (BalanceteAgregado), lida pela DRE/DPF
+        recalcular_agregados(fundo_id=fundo_id, datas=[data_referencia])
+    if substituir and loader.contas:
+        report = replace(report, removed=len(anteriores - loader.contas))
+    return report
+
+
+def _import_balancete_em_blocos(
+    *,
+    fundo_id: int,
+    data_referencia: date,
+    batches: Iterable[BalanceteBatch],
+    checkpoint: ImportCheckpoint,
+) -> ImportReport:
+    """
+    Como _import_balancete_lotes (só upsert), mas com um savepoint/commit
+    por lote: um erro de banco derruba só o lote corrente, e o que já foi
+    gravado fica registrado no checkpoint.
+
+    Os agregados são recalculados uma vez, depois do último lote (recalcular
+    a cada lote relê o fundo/data inteiro: custo quadrático no número de
+    lotes). A pendência vai no checkpoint, commitada com o lote, então uma
+    retomada termina o recálculo mesmo que a queda tenha sido logo antes dele.
+    """
+    existentes = _chaves_balancete(fundo_id=fundo_id, data_referencia=data_referencia)
+
+    for batch in _lotes_pendentes(batches, checkpoint):
+        with transaction.atomic():
+            loader = saldo_loader(fundo_id=fundo_id, data_referencia=data_referencia)
+            report = _import_balancete_batch(batch=batch, existentes=existentes, loader=loader)
+            loader.finish()
+            if loader.contas:
+                checkpoint.agregados_pendentes = True
+            checkpoint.avancar(report)
+
+    if checkpoint.agregados_pendentes:
+        with transaction.atomic():
+            # soma por grupinho (BalanceteAgregado), lida pela DRE/DPF
+            recalcular_agregados(fundo_id=fundo_id, datas=[data_referencia])
+            checkpoint.agregados_pendentes = False
+            checkpoint.gravar()
+
+    return checkpoint.report
+
+
+# DecimalField(max_digits=20, decimal_places=2): parte inteira com até 18 dígitos
+_SALDO_LIMITE = 10 ** 18
+
+
+def _chaves_balancete(*, fundo_id: int, data_referencia: date) -> Set[int]:
+    """Contas (ids de MapeamentoContas) já gravadas para o fundo na data: uma única consulta."""
+    return set(
+        BalanceteItem.objects
+        .filter(fundo_id=fundo_id, data_referencia=data_referencia)
+        .values_list("conta_corrente_id", flat=True)
+    )
+
+
+def _import_balancete_batch(
+    *,
+    batch: BalanceteBatch,
+    existentes: Set[int],
+    loader: SaldoLoader,
+) -> ImportReport:
     """
-    if not rows:
+    Valida o lote e entrega os saldos ao `loader` (fundo/data já fixados nele),
+    que faz a carga no banco (ver bulk_load.saldo_loader).
+
+    `existentes` (ids de conta já gravados para fundo/data) é usado para
+    contar inseridos x atualizados sem consultar linha a linha; é atualizado
+    in-place, então é compartilhado entre os lotes de um mesmo arquivo.
+    """
+    if not len(batch):
         return ImportReport(imported=0, updated=0, ignored=0, errors=[])
 
-    # Cache de contas conhecidas
-    contas = {r.conta for r in rows if getattr(r, "conta", None)}
-    mapa_by_conta: Dict[str, MapeamentoContas] = {
-        m.conta: m for m in MapeamentoContas.objects.filter(conta__in=list(contas))
-    }
+    contas = batch.contas.tolist()
+    saldos = optional_floats(batch.saldo_atual)
+
+    # Contas conhecidas: plano de contas em memória (sem consulta por lote)
+    mapa_by_conta: Dict[str, int] = get_plano_contas().conta_ids
 
     imported = updated = ignored = 0
     errors: List[ImportErrorItem] = []
+    # conta_id -> saldo; conta repetida no arquivo: vale a última linha (como no update_or_create)
+    saldo_por_conta: Dict[int, Decimal] = {}
 
-    for idx, r in enumerate(rows):
-        conta = r.conta
-        if not conta:
+    for pos, (conta, saldo_atual) in enumerate(zip(contas, saldos)):
+        conta_id = mapa_by_conta.get(conta)
+        if conta_id is None:
             ignored += 1
             continue
 
-        conta_map = mapa_by_conta.get(conta)
-        if conta_map is None:
+        if saldo_atual is None:
             ignored += 1
             continue
 
-        if r.saldo_atual is None:
-            ignored += 1
+        if not math.isfinite(saldo_atual) or abs(saldo_atual) >= _SALDO_LIMITE:
+            # raw só é materializado para as linhas que viram erro
+            errors.append(ImportErrorItem(int(batch.linhas[pos]), f"Saldo fora do limite: {saldo_atual}", raw=batch.raw(pos)))
             continue
 
-        try:
-            defaults = {
-                "saldo_final": _to_decimal(r.saldo_atual),
-                "data_referencia": data_referencia,
-            }
-            _, created = BalanceteItem.objects.update_or_create(
-                fundo_id=fundo_id,
-                conta_corrente_id=conta_map.id,
-                data_referencia=data_referencia,
-                defaults=defaults,
-            )
-            if created:
-                imported += 1
-            else:
-                updated += 1
+        if conta_id in existentes:
+            updated += 1
+        else:
+            imported += 1
+            existentes.add(conta_id)
+        saldo_por_conta[conta_id] = _to_decimal(saldo_atual)
 
-        except Exception as e:
-            errors.append(ImportErrorItem(idx, str(e), raw=r.raw))
+    loader.add(saldo_por_conta)
 
     return ImportReport(imported=imported, updated=updated, ignored=ignored, errors=errors)
 
 
+# ============================================================
+# MEC (diferencial: só grava posições novas ou alteradas)
+# ============================================================
+MEC_CAMPOS = ("aplicacao", "resgate", "estorno", "pl", "qtd_cotas", "cota")
+
+
+def _mec_formatos() -> Dict[str, tuple]:
+    # campo -> (quantum das casas decimais, limite da parte inteira), conforme o model
+    formatos = {}
+    for campo in MEC_CAMPOS:
+        field = MecItem._meta.get_field(campo)
+        formatos[campo] = (Decimal(1).scaleb(-field.decimal_places), 10 ** (field.max_digits - field.decimal_places))
+    return formatos
+
+
+_MEC_FORMATOS = _mec_formatos()
+
+
+def _mec_decimal(campo: str, valor: Optional[float]) -> Decimal:
+    """
+    Valor do MEC já no formato gravado no banco (mesmas casas decimais), para
+    que a comparação com o que está salvo seja exata. Vazio vira 0 (default
+    do model); negativo/fora do limite levanta ValueError (violaria as
+    constraints e derrubaria o INSERT em bloco inteiro).
+    """
+    quantum, limite = _MEC_FORMATOS[campo]
+    if valor is None:
+        return Decimal(0).quantize(quantum)
+    if not math.isfinite(valor) or abs(valor) >= limite:
+        raise ValueError(f"{campo} fora do limite: {valor}")
+    if valor < 0:
+        raise ValueError(f"{campo} negativo: {valor}")
+    return Decimal(str(valor)).quantize(quantum, rounding=ROUND_HALF_EVEN)
+
+
 @transaction.atomic
-def import_mec(*, fundo_id: int, rows: List) -> ImportReport:
+def import_mec(*, fundo_id: int, batch: MecBatch) -> ImportReport:
     """
-    Importa linhas canônicas (MecRowDTO) para MecItem:
-    - idempotente (update_or_create por fundo+data_posicao)
+    Importa um lote colunar (MecBatch) para MecItem:
+    - idempotente (upsert por fundo+data_posicao)
+    - só grava datas novas ou com valores diferentes do que já está salvo
     """
-    if not rows:
-        return ImportReport(imported=0, updated=0, ignored=0, errors=[])
+    return _import_mec_diff(fundo_id=fundo_id, batch=batch)
 
-    imported = updated = ignored = 0
-    errors: List[ImportErrorItem] = []
 
-    for idx, r in enumerate(rows):
-        if not getattr(r, "data_posicao", None):
-            ignored += 1
-            continue
+def import_mec_batches(
+    *,
+    fundo_id: int,
+    batches: Iterable[MecBatch],
+    arquivo: Optional[FileFingerprint] = None,
+    usuario=None,
+    duracao_leitura: float = 0.0,
+    checkpoint: Optional[ImportCheckpoint] = None,
+) -> ImportReport:
+    """
+    Versão streaming de import_mec: recebe os lotes de
+    mec_parser.iter_excel_mec_batches. O MEC é um histórico diário (poucos
+    milhares de linhas), então os lotes são juntados e comparados de uma vez
+    com a série gravada. `arquivo` ativa o registro/deduplicação em
+    ImportBatch (como em import_balancete_batches).
 
-        defaults = {
-            "aplicacao": _to_decimal(r.aplicacao),
-            "resgate": _to_decimal(r.resgate),
-            "estorno": _to_decimal(r.estorno),
-            "pl": _to_decimal(r.pl),
-            "qtd_cotas": _to_decimal(r.qtd_cotas),
-            "cota": _to_decimal(r.cota),
-        }
-        _, created = MecItem.objects.update_or_create(
+    Com `checkpoint`, cada lote é comparado e commitado separadamente (data
+    repetida em lotes diferentes conta como atualizada, não como ignorada).
+    """
+    def importar(lotes: Iterable[MecBatch]) -> ImportReport:
+        if checkpoint is None:
+            return _import_mec_diff(fundo_id=fundo_id, batch=MecBatch.concat(list(lotes)))
+        return _import_mec_em_blocos(fundo_id=fundo_id, batches=lotes, checkpoint=checkpoint)
+
+    with _transacao(checkpoint):
+        return _import_registrado(
+            tipo=ImportBatch.TIPO_MEC,
             fundo_id=fundo_id,
-            data_posicao=r.data_posicao,
-            defaults=defaults,
+            data_referencia=None,
+            batches=batches,
+            importar=importar,
+            arquivo=arquivo,
+            usuario=usuario,
+            duracao_leitura=duracao_leitura,
         )
-        if created:
+
+
+def _import_mec_em_blocos(*, fundo_id: int, batches: Iterable[MecBatch], checkpoint: ImportCheckpoint) -> ImportReport:
+    for batch in _lotes_pendentes(batches, checkpoint):
+        with transaction.atomic():
+            checkpoint.avancar(_import_mec_diff(fundo_id=fundo_id, batch=batch))
+    return checkpoint.report
+
+
+def _import_mec_diff(*, fundo_id: int, batch: MecBatch) -> ImportReport:
+    """
+    Diferencial do MEC contra o banco:
+    1. converte as linhas do arquivo; data repetida -> vale a ÚLTIMA linha
+       do arquivo (as anteriores contam como ignoradas)
+    2. carrega, em uma consulta, a série gravada no intervalo de datas do arquivo
+    3. grava em bloco (upsert) apenas as datas novas ou com algum valor diferente
+    """
+    # Linhas rejeitadas pelo parser (data/valor ininterpretável) entram como erro
+    errors: List[ImportErrorItem] = [
+        ImportErrorItem(r.row_index, r.reason, raw=r.raw) for r in batch.rejeicoes
+    ]
+    if not len(batch):
+        return ImportReport(imported=0, updated=0, ignored=0, errors=errors)
+
+    ignored = 0
+    posicoes: Dict[date, tuple] = {}
+
+    colunas = zip(batch.datas.tolist(), *(optional_floats(getattr(batch, campo)) for campo in MEC_CAMPOS))
+    for pos, (data_posicao, *valores) in enumerate(colunas):
+        if not data_posicao:
+            ignored += 1
+            continue
+        try:
+            convertidos = tuple(_mec_decimal(campo, v) for campo, v in zip(MEC_CAMPOS, valores))
+        except ValueError as e:
+            # raw só é materializado para as linhas que viram erro
+            errors.append(ImportErrorItem(int(batch.linhas[pos]), str(e), raw=batch.raw(pos)))
+            continue
+        if data_posicao in posicoes:
+            ignored += 1
+        posicoes[data_posicao] = convertidos
+
+    if not posicoes:
+        return ImportReport(imported=0, updated=0, ignored=ignored, errors=errors)
+
+    gravados: Dict[date, tuple] = {
+        data_posicao: tuple(valores)
+        for data_posicao, *valores in MecItem.objects
+        .filter(fundo_id=fundo_id, data_posicao__range=(min(posicoes), max(posicoes)))
+        .values_list("data_posicao", *MEC_CAMPOS)
+    }
+
+    imported = updated = unchanged = 0
+    gravar: List[MecItem] = []
+    for data_posicao, valores in posicoes.items():
+        atual = gravados.get(data_posicao)
+        if atual is None:
             imported += 1
-        else:
+        elif atual != valores:
             updated += 1
+        else:
+            unchanged += 1
+            continue
+        gravar.append(MecItem(fundo_id=fundo_id, data_posicao=data_posicao, **dict(zip(MEC_CAMPOS, valores))))
+
+    if gravar:
+        MecItem.objects.bulk_create(
+            gravar,
+            batch_size=BULK_BATCH_SIZE,
+            **upsert_conflict_kwargs(MecItem, unique_fields=["fundo", "data_posicao"], update_fields=list(MEC_CAMPOS)),
+        )
+        marcar_fundo_alterado(fundo_id)
 
-    return ImportReport(imported=imported, updated=updated, ignored=ignored, errors=errors)
\ No newline at end of file
+    return ImportReport(
+        imported=imported, updated=updated, ignored=ignored, errors=errors, unchanged=unchanged,
+    )
@@ -0,0 +1,86 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List
+from datetime import date
+from df.models import BalanceteAgregado
+from df.plano_contas import get_plano_contas
+from core.processing.dpf_service import SECOES_DPF, TIPO_DRE, int_mil, somar_colunas
+
+# Limite de datas por chamada (3 anos de meses cabem com folga)
+SERIE_MAX_DATAS = 120
+
+
+def gerar_serie(fundo_id: int, datas: Iterable[date], dividir_por_mil: bool = True) -> Dict:
+    """
+    Evolução da DPF e da DRE de um fundo em N datas de balancete, para
+    gráficos e planilhas. Todas as datas saem de uma única consulta a
+    BalanceteAgregado (somas por grupinho); grupos e ordem vêm do plano de
+    contas em memória. Cada valor é arredondado por grupinho antes de somar,
+    como em gerar_dados_dpf/gerar_dados_dre, então cada coluna bate com as
+    demonstrações de duas datas.
+
+    Retorna listas de valores alinhadas a "datas" (ordem crescente):
+      {"datas": [...], "sem_balancete": [...],
+       "DPF": {"ATIVO": {"grupos": [{"nome", "valores", "subgrupos": [...]}], "total": [...]}, ...},
+       "DRE": {"grupos": [...], "resultado": [...]},
+       "fechamento": [...]}
+    """
+    datas = sorted(set(datas))
+    if not datas:
+        raise ValueError("Informe ao menos uma data.")
+    if len(datas) > SERIE_MAX_DATAS:
+        raise ValueError(f"No máximo {SERIE_MAX_DATAS} datas por consulta.")
+
+    plano = get_plano_contas()
+    grupinhos = plano.grupinhos_dos_tipos([tipo for tipo, _, _ in SECOES_DPF] + [TIPO_DRE])
+    posicao = {d: i for i, d in enumerate(datas)}
+    n = len(datas)
+
+    # valores[grupinho_id] = [valor na data 0, data 1, ...]
+    valores: Dict[int, List[int]] = {}
+    com_balancete = set()
+    qs = (
+        BalanceteAgregado.objects
+        .filter(fundo_id=fundo_id, data_referencia__in=datas)
+        .values_list("data_referencia", "grupo_pequeno_id", "saldo_final")
+    )
+    for data_ref, gpequeno, total in qs:
+        com_balancete.add(data_ref)
+        if gpequeno in grupinhos:
+            valores.setdefault(gpequeno, [0] * n)[posicao[data_ref]] = int_mil(total, dividir_por_mil)
+
+    def _montar(tipo: int) -> tuple:
+        grupos = []
+        total = [0] * n
+        for grupao in plano.grupoes_do_tipo(tipo):
+            subgrupos = []
+            soma = [0] * n
+            for grupinho in plano.grupinhos_do_grupao(grupao.id):
+                serie = valores.get(grupinho.id)
+                if serie is None or not any(serie):
+                    continue  # ignora subgrupo zerado em todas as datas
+                subgrupos.append({"nome": grupinho.nome, "valores": serie})
+                soma = somar_colunas(soma, serie)
+            if any(soma):
+                grupos.append({"nome": grupao.nome, "valores": soma, "subgrupos": subgrupos})
+                total = somar_colunas(total, soma)
+        return grupos, total
+
+    dpf: Dict[str, Dict] = {}
+    for tipo, secao, _ in SECOES_DPF:
+        grupos, total = _montar(tipo)
+        dpf[secao] = {"grupos": grupos, "total": total}
+
+    dre_grupos, resultado = _montar(TIPO_DRE)
+
+    return {
+        "fundo_id": fundo_id,
+        "datas": [d.isoformat() for d in datas],
+        "sem_balancete": [d.isoformat() for d in datas if d not in com_balancete],
+        "dividir_por_mil": dividir_por_mil,
+        "DPF": dpf,
+        "DRE": {"grupos": dre_grupos, "resultado": resultado},
+        "fechamento": [
+            a - (p + pl)
+            for a, p, pl in zip(dpf["ATIVO"]["total"], dpf["PASSIVO"]["total"], dpf["PL"]["total"])
+        ],
+    }
@@ -1,3 +1,1525 @@
-from django.test import TestCase
+import io
+import re
+import shutil
+import tempfile
+import threading
+import zipfile
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from unittest import mock
+
+import pandas as pd
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import close_old_connections, connection
+from django.db.models.query import QuerySet
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from openpyxl import Workbook
+
+from core.processing import bulk_load, demonstracoes
+from core.processing.batch_import_service import import_upload_lote
+from core.processing.consolidado_service import gerar_consolidado
+from core.processing.demonstracoes import DemonstracoesContexto, demonstracoes_em_cache, versao_dados
+from core.processing.dfc_service import gerar_tabela_dfc
+from core.processing.dmpl_service import DMPL_CAMPOS_VALOR, gerar_dados_dmpl
+from core.processing.dpf_service import gerar_dados_dpf
+from core.processing.dre_service import gerar_dados_dre
+from core.processing.import_jobs import claim_next_job, enqueue_import, retomar_job, run_pending_jobs
+from core.processing.import_service import (
+    ImportCheckpoint,
+    import_balancete,
+    import_balancete_batches,
+    import_mec,
+    import_mec_batches,
+)
+from core.processing.serie_service import SERIE_MAX_DATAS, gerar_serie
+from core.upload import chunked_reader
+from core.upload.balancete_parser import BalanceteSchemaError, iter_excel_batches, parse_excel
+from core.upload.batch_upload import (
+    TIPO_BALANCETE,
+    TIPO_MEC,
+    cnpj_from_filename,
+    date_from_filename,
+    iter_upload_files,
+    parse_upload_file,
+    parse_uploads,
+)
+from core.upload.batches import BalanceteBatch, optional_floats
+from core.upload.conversao import infer_date_format, to_date_series, to_float_series
+from core.upload.mec_parser import MecSchemaError, iter_excel_mec_batches, parse_excel_mec
+from core.upload.schema import FileSchema, get_schema
+from core.upload.xlsx_reader import iter_xlsx_frames
+from df.agregados import recalcular_agregados, recalcular_todos_agregados
+from df.models import (
+    BalanceteAgregado,
+    BalanceteItem,
+    Fundo,
+    GrupoGrande,
+    GrupoPequeno,
+    ImportBatch,
+    ImportJob,
+    MapeamentoContas,
+    MecItem,
+    codigo_do_nome,
+)
+from df.plano_contas import invalidar_plano_contas
+from usuarios.models import Empresa, Membership, Usuario
+
+
+def _arquivo(texto: str, nome: str = "balancete.csv", encoding: str = "utf-8"):
+    f = io.BytesIO(texto.encode(encoding))
+    f.name = nome
+    return f
+
+
+def _planilha(linhas: list, nome: str = "balancete.xlsx"):
+    wb = Workbook()
+    for linha in linhas:
+        wb.active.append(linha)
+    f = io.BytesIO()
+    wb.save(f)
+    f.seek(0)
+    f.name = nome
+    return f
+
+
+# =========================
+# Parser do balancete
+# =========================
+class ConversaoSaldosTests(SimpleTestCase):
+    def test_texto_ptbr_numeros_e_invalidos(self):
+        serie = pd.Series(["1.234,56", " -500,00 ", "", "abc", 10, 2.5, None], dtype=object)
+        convertido = to_float_series(serie).tolist()
+        self.assertEqual(convertido[:2], [1234.56, -500.0])
+        self.assertEqual(convertido[4:6], [10.0, 2.5])
+        self.assertTrue(all(v != v for v in convertido[2:4] + convertido[6:]))
+
+    def test_linhas_sem_conta_sao_ignoradas(self):
+        texto = (
+            "CONTA;SALDOANTERIOR;SALDOATUAL\n"
+            "1.1;0;1.234,56\n"
+            ";0;999,00\n"
+            "1.2;0;x\n"
+        )
+        batch = parse_excel(_arquivo(texto))
+        self.assertEqual(list(batch.contas), ["1.1", "1.2"])
+        self.assertEqual(optional_floats(batch.saldo_atual), [1234.56, None])
+
+
+# =========================
+# Leitura em lotes
+# =========================
+class LeituraEmLotesTests(SimpleTestCase):
+    TEXTO = "CONTA;SALDOANTERIOR;SALDOATUAL\n" + "".join(f"1.{i};0;{i},00\n" for i in range(1, 6))
+
+    def test_lotes_do_tamanho_pedido_e_mesmo_resultado_do_parse(self):
+        lotes = list(iter_excel_batches(_arquivo(self.TEXTO), chunk_size=2))
+        self.assertEqual([len(lote) for lote in lotes], [2, 2, 1])
+        self.assertEqual(
+            [v for lote in lotes for v in lote.saldo_atual],
+            list(parse_excel(_arquivo(self.TEXTO)).saldo_atual),
+        )
+
+    def test_cabecalho_invalido_falha_antes_do_primeiro_lote(self):
+        lotes = iter_excel_batches(_arquivo("CONTA;VALOR\n1.1;1,00\n"), chunk_size=1)
+        with self.assertRaises(BalanceteSchemaError) as ctx:
+            next(lotes)
+        self.assertIn("SALDOATUAL", ctx.exception.missing_columns)
+
+    def test_encoding_pela_amostra_inicial(self):
+        self.assertEqual(chunked_reader.sniff_csv(_arquivo("CONTA;DESCRIÇÃO\n", encoding="latin1")).encoding, "latin1")
+        self.assertEqual(chunked_reader.sniff_csv(_arquivo("CONTA;DESCRIÇÃO\n")).encoding, "utf-8")
+
+        # caractere multibyte cortado no fim da amostra não vira Latin1
+        amostra = b"a" * (chunked_reader._SNIFF_BYTES - 1) + "ç".encode("utf-8")
+        self.assertEqual(chunked_reader._sniff_encoding(amostra[:chunked_reader._SNIFF_BYTES], True), "utf-8")
+
+
+# =========================
+# Detecção do dialeto do CSV
+# =========================
+class SniffCsvTests(SimpleTestCase):
+    def test_separador_respeita_aspas(self):
+        texto = 'CONTA,DESCRICAO,SALDOANTERIOR,SALDOATUAL\n1.1,"Caixa; bancos",0,10.50\n1.2,"Aplicações",0,2.25\n'
+        dialeto = chunked_reader.sniff_csv(_arquivo(texto))
+        self.assertEqual((dialeto.sep, dialeto.decimal), (",", "."))
+
+        texto = "CONTA\tSALDOANTERIOR\tSALDOATUAL\n1.1\t0\t1.234,56\n"
+        dialeto = chunked_reader.sniff_csv(_arquivo(texto))
+        self.assertEqual((dialeto.sep, dialeto.decimal), ("\t", ","))
+
+    def test_sem_evidencia_decimal_fica_virgula(self):
+        texto = "CONTA;SALDOANTERIOR;SALDOATUAL\n1;0;10\n2;0;20\n"
+        self.assertEqual(chunked_reader.sniff_csv(_arquivo(texto)).decimal, ",")
+
+    def test_valores_com_virgula_decimal(self):
+        texto = "CONTA;SALDOANTERIOR;SALDOATUAL\n1;0;1.234,56\n2;0;-0,50\n"
+        self.assertEqual(chunked_reader.sniff_csv(_arquivo(texto)).decimal, ",")
+        self.assertEqual(list(parse_excel(_arquivo(texto)).saldo_atual), [1234.56, -0.5])
+
+    def test_latin1_depois_da_amostra(self):
+        # amostra inicial é UTF-8 válido; o trecho Latin1 aparece só no fim
+        linhas = "".join(f"{i};Conta {i};{i},00\n" for i in range(3000))
+        conteudo = ("CONTA;DESCRICAO;SALDOATUAL\n" + linhas).encode("utf-8") + "9;Compensação;1,00\n".encode("latin1")
+        self.assertGreater(len(conteudo), chunked_reader._SNIFF_BYTES)
+        f = io.BytesIO(conteudo)
+        f.name = "balancete.csv"
+
+        self.assertEqual(chunked_reader.sniff_csv(f).encoding, "utf-8")
+        ultimo = list(chunked_reader.iter_dataframes(f, chunk_size=1000))[-1]
+        self.assertEqual(ultimo["DESCRICAO"].iloc[-1], "Compensação")
+
+
+class SniffDecimalTests(SimpleTestCase):
+    BALANCETE_PTBR = (
+        "CONTA;DESCRICAO;SALDOANTERIOR;SALDOATUAL\n"
+        "1.1;Disponibilidades;0;1.234,56\n"
+        "1.2;Aplicações;0;-500,00\n"
+        "7.1;Compensação;0;1,00\n"
+        "2.1;Obrigações;0;10\n"
+    )
+
+    def test_codigos_de_conta_com_ponto_nao_mudam_o_decimal(self):
+        batch = parse_excel(_arquivo(self.BALANCETE_PTBR))
+        self.assertEqual(list(batch.contas), ["1.1", "1.2", "7.1", "2.1"])
+        self.assertEqual(list(batch.saldo_atual), [1234.56, -500.0, 1.0, 10.0])
+
+    def test_decimal_com_ponto_quando_os_valores_sao_claramente_assim(self):
+        texto = (
+            "CONTA,SALDOANTERIOR,SALDOATUAL\n"
+            "1.1,0,1234.56\n"
+            "1.2,0,-500.00\n"
+            "7.1,0,0.25\n"
+        )
+        batch = parse_excel(_arquivo(texto))
+        self.assertEqual(list(batch.saldo_atual), [1234.56, -500.0, 0.25])
+
+    def test_empate_mantem_virgula(self):
+        linhas = ["CONTA;SALDOATUAL", "1;1,50", "2;2.50"]
+        self.assertEqual(chunked_reader._sniff_decimal(linhas, ";"), ",")
+
+
+class CsvFallbackTests(SimpleTestCase):
+    def test_fallback_preserva_numero_das_linhas(self):
+        original = chunked_reader._read_csv_chunks
+
+        @contextmanager
+        def _c_quebra_no_segundo_lote(file_obj, dialect, chunk_size, *, skip=0):
+            # engine C entrega o primeiro lote e recusa o resto
+            if dialect.sep is None:
+                with original(file_obj, dialect, chunk_size, skip=skip) as reader:
+                    yield reader
+                return
+            with original(file_obj, dialect, chunk_size, skip=skip) as reader:
+                def _lotes():
+                    yield next(iter(reader))
+                    raise pd.errors.ParserError("linha irregular")
+                yield _lotes()
+
+        texto = "CONTA;SALDOATUAL\n" + "".join(f"{i};{i},00\n" for i in range(1, 6))
+        with mock.patch.object(chunked_reader, "_read_csv_chunks", _c_quebra_no_segundo_lote):
+            lotes = list(chunked_reader.iter_dataframes(_arquivo(texto), chunk_size=2))
+
+        self.assertEqual([list(df.index) for df in lotes], [[0, 1], [2, 3], [4]])
+        self.assertEqual([c for df in lotes for c in df["CONTA"]], ["1", "2", "3", "4", "5"])
+
+
+# =========================
+# Leitura de XLSX
+# =========================
+class XlsxTests(SimpleTestCase):
+    LINHAS = [
+        ["Balancete - Fundo Teste"],
+        ["Data-base: 31/12/2024"],
+        [],
+        ["Conta", "Descrição", "Saldo Anterior", "Saldo Atual"],
+        ["1.1", "Disponibilidades", 0, 1234.56],
+        [],
+        ["1.2", "Aplicações", 0, "-500,00"],
+        ["1.3", "Outros"],
+    ]
+
+    @staticmethod
+    def _pontua(colunas):
+        return sum(c in ("Conta", "Saldo Atual") for c in colunas)
+
+    def test_cabecalho_abaixo_do_preambulo(self):
+        frames = list(iter_xlsx_frames(_planilha(self.LINHAS), chunk_size=2, header_score=self._pontua))
+        self.assertEqual(list(frames[0].columns), ["Conta", "Descrição", "Saldo Anterior", "Saldo Atual"])
+        self.assertEqual([len(df) for df in frames], [2, 1])
+        # linha em branco descartada; linha curta completada com None
+        self.assertEqual([c for df in frames for c in df["Conta"]], ["1.1", "1.2", "1.3"])
+        self.assertIsNone(frames[-1]["Saldo Atual"].iloc[-1])
+
+    def test_indice_e_a_linha_da_aba(self):
+        frames = list(iter_xlsx_frames(_planilha(self.LINHAS), chunk_size=2, header_score=self._pontua))
+        # preâmbulo (3 linhas), cabeçalho e a linha em branco entram na contagem
+        self.assertEqual([list(df.index) for df in frames], [[4, 6], [7]])
+        self.assertEqual(parse_excel(_planilha(self.LINHAS)).linhas.tolist(), [4, 6, 7])
+
+    def test_sem_pontuacao_usa_a_primeira_linha_nao_vazia(self):
+        frames = list(iter_xlsx_frames(_planilha([[], ["A", None, "A"], [1, 2, 3]]), chunk_size=10))
+        self.assertEqual(list(frames[0].columns), ["A", "Unnamed: 1", "A.1"])
+        self.assertEqual(frames[0].values.tolist(), [[1, 2, 3]])
+
+    def test_planilha_so_com_cabecalho_entrega_frame_vazio(self):
+        frames = list(iter_xlsx_frames(_planilha([["Conta", "Saldo Atual"]]), chunk_size=10, header_score=self._pontua))
+        self.assertEqual(len(frames), 1)
+        self.assertTrue(frames[0].empty)
+        self.assertEqual(list(frames[0].columns), ["Conta", "Saldo Atual"])
+
+    def test_parse_do_balancete(self):
+        batch = parse_excel(_planilha(self.LINHAS))
+        self.assertEqual(list(batch.contas), ["1.1", "1.2", "1.3"])
+        self.assertEqual(optional_floats(batch.saldo_atual), [1234.56, -500.0, None])
+
+
+# =========================
+# Lotes colunares
+# =========================
+class LoteColunarTests(SimpleTestCase):
+    TEXTO = (
+        "CONTA;DESCRICAO;SALDOANTERIOR;SALDOATUAL\n"
+        "1.1;Caixa;0;1,00\n"
+        ";Total parcial;0;1,00\n"
+        "1.2;Bancos;0;x\n"
+    )
+
+    def test_linhas_apontam_para_a_posicao_no_arquivo(self):
+        batch = parse_excel(_arquivo(self.TEXTO))
+        self.assertEqual(batch.linhas.tolist(), [0, 2])
+        self.assertEqual(batch.raw(1)["DESCRICAO"], "Bancos")
+        self.assertEqual(batch.raw(1)["SALDOATUAL"], "x")
+
+    def test_concat_preserva_posicoes(self):
+        lotes = list(iter_excel_batches(_arquivo(self.TEXTO), chunk_size=1))
+        batch = BalanceteBatch.concat(lotes)
+        self.assertEqual(batch.linhas.tolist(), [0, 2])
+        self.assertEqual(list(batch.contas), ["1.1", "1.2"])
+        self.assertEqual(len(BalanceteBatch.concat([])), 0)
+
+
+# =========================
+# Parser do MEC
+# =========================
+MEC_CABECALHO = "Data Posição;Aplicação;Resgate;Estorno;PL;Qtd Cotas;Valor Cota\n"
+
+
+class MecParserTests(SimpleTestCase):
+    def test_valores_ptbr_e_linhas_rejeitadas(self):
+        texto = MEC_CABECALHO + (
+            "02/01/2024;1.000,50;0;0;1.000.000,00;1.000,00000000;1.000,00\n"
+            "03/01/2024;abc;0;0;1.000.000,00;1.000,00000000;1.000,00\n"
+            ";;;;;;\n"
+            "31/02/2024;0;0;0;1,00;1;1\n"
+            "05/01/2024;;;;1.000.000,00;1.000;1.000\n"
+        )
+        batch = parse_excel_mec(_arquivo(texto, "mec.csv"))
+        self.assertEqual(batch.linhas.tolist(), [0, 4])
+        self.assertEqual([str(d) for d in batch.datas], ["2024-01-02", "2024-01-05"])
+        self.assertEqual(batch.aplicacao.tolist()[0], 1000.5)
+        self.assertTrue(batch.aplicacao[1] != batch.aplicacao[1])  # vazio vira NaN, não rejeição
+        self.assertEqual(batch.pl.tolist(), [1000000.0, 1000000.0])
+
+        # linha em branco some; data e valor inválidos viram rejeição com o motivo
+        self.assertEqual([r.row_index for r in batch.rejeicoes], [1, 3])
+        self.assertIn("VALORAPLICACAO", batch.rejeicoes[0].reason)
+        self.assertIn("DATAPOSICAO", batch.rejeicoes[1].reason)
+        self.assertEqual(batch.rejeicoes[0].raw["VALORAPLICACAO"], "abc")
+
+    def test_datas_tipadas_do_xlsx(self):
+        f = _planilha([
+            ["Data Posição", "Aplicação", "Resgate", "Estorno", "PL", "Qtd Cotas", "Valor Cota"],
+            [datetime(2024, 1, 2), 100, 0, 0, 1000, 10, 100],
+            ["03/01/2024", 0, 50.5, 0, 950, 9.5, 100],
+        ], nome="mec.xlsx")
+        batch = parse_excel_mec(f)
+        self.assertEqual([str(d) for d in batch.datas], ["2024-01-02", "2024-01-03"])
+        self.assertEqual(batch.resgate.tolist(), [0.0, 50.5])
+
+
+class ConversaoDatasTests(SimpleTestCase):
+    def test_formato_inferido_pela_amostra(self):
+        self.assertEqual(infer_date_format(["31/12/2024", "01/01/2025"]), "%d/%m/%Y")
+        self.assertEqual(infer_date_format(["2024-12-31"]), "%Y-%m-%d")
+        self.assertIsNone(infer_date_format(["", "  "]))
+
+    def test_fora_do_formato_tenta_os_demais(self):
+        serie = pd.Series(["31/12/2024", "2025-01-02", "não é data", None], dtype=object)
+        datas = to_date_series(serie, "%d/%m/%Y")
+        self.assertEqual([d.date().isoformat() for d in datas[:2]], ["2024-12-31", "2025-01-02"])
+        self.assertTrue(datas[2:].isna().all())
+
+
+# =========================
+# Registro de esquemas
+# =========================
+class FileSchemaTests(SimpleTestCase):
+    ESQUEMA = FileSchema(
+        nome="teste",
+        columns=(("CONTA", ("COD CONTA", "CODIGO")), ("SALDOATUAL", ("SALDO ATUAL", "SALDO"))),
+        required=("CONTA", "SALDOATUAL"),
+    )
+
+    def test_aliases_normalizados_e_prioridade(self):
+        renames = self.ESQUEMA.resolve(["cód_conta", "Saldo", "Saldo-Atual", "Descrição"])
+        # canônica casa com o primeiro alias da lista, não com a primeira coluna
+        self.assertEqual(renames, {"cód_conta": "CONTA", "Saldo-Atual": "SALDOATUAL"})
+        self.assertEqual(self.ESQUEMA.score(["Título do relatório"]), 0)
+        self.assertEqual(self.ESQUEMA.score(["Conta", "Saldo Atual"]), 2)
+
+    def test_resolucao_em_cache_devolve_copia(self):
+        primeira = self.ESQUEMA.resolve(("Conta", "Saldo"))
+        primeira["Conta"] = "ALTERADO"
+        self.assertEqual(self.ESQUEMA.resolve(("Conta", "Saldo")), {"Conta": "CONTA", "Saldo": "SALDOATUAL"})
+
+    def test_pontuacao_nao_expulsa_cabecalhos_do_cache(self):
+        esquema = FileSchema(nome="cache", columns=self.ESQUEMA.columns, required=self.ESQUEMA.required)
+        esquema.resolve(("Conta", "Saldo"))
+        for i in range(300):
+            esquema.score([f"Relatório {i}", "Saldo"])
+        self.assertEqual(esquema._resolve_cached.cache_info().currsize, 1)
+        esquema.resolve(("Conta", "Saldo"))
+        self.assertEqual(esquema._resolve_cached.cache_info().hits, 1)
+        # mesma canônica por dois aliases conta uma vez
+        self.assertEqual(esquema.score(["Saldo", "Saldo Atual"]), 1)
+
+    def test_coluna_obrigatoria_ausente_usa_o_erro_do_esquema(self):
+        with self.assertRaises(BalanceteSchemaError) as ctx:
+            get_schema("balancete").validate(["Conta", "Descrição"])
+        self.assertEqual(ctx.exception.missing_columns, ["SALDOATUAL", "SALDOANTERIOR"])
+
+        with self.assertRaises(MecSchemaError):
+            parse_excel_mec(_arquivo("Data;Aplicação\n01/01/2024;1\n", "mec.csv"))
+
+
+# =========================
+# Upload em lote
+# =========================
+def _balancete_csv(saldos: dict) -> str:
+    linhas = "".join(f"{conta};0;{saldo}\n" for conta, saldo in saldos.items())
+    return "CONTA;SALDOANTERIOR;SALDOATUAL\n" + linhas
+
+
+def _zip(membros: dict, nome: str = "fechamento.zip"):
+    f = io.BytesIO()
+    with zipfile.ZipFile(f, "w") as zf:
+        for membro, texto in membros.items():
+            zf.writestr(membro, texto)
+    f.seek(0)
+    f.name = nome
+    return f
+
+
+class IdentificacaoArquivosTests(SimpleTestCase):
+    def test_cnpj_e_data_no_nome(self):
+        self.assertEqual(cnpj_from_filename("lote/12.345.678_0001-90 balancete.xlsx"), "12345678000190")
+        self.assertIsNone(cnpj_from_filename("balancete.xlsx"))
+        self.assertEqual(date_from_filename("12345678000190_2024-12-31.csv"), date(2024, 12, 31))
+        self.assertEqual(date_from_filename("balancete 31122024.csv"), date(2024, 12, 31))
+        # competência sem dia: último dia do mês
+        self.assertEqual(date_from_filename("balancete_02-2024.csv"), date(2024, 2, 29))
+
+    def test_zip_ignora_pastas_ocultos_e_outras_extensoes(self):
+        f = _zip({
+            "a/balancete.csv": "x",
+            "__MACOSX/a/._balancete.csv": "x",
+            "a/.oculto.csv": "x",
+            "a/~$aberto.xlsx": "x",
+            "a/leia-me.txt": "x",
+        })
+        self.assertEqual([nome for nome, _ in iter_upload_files(f)], ["a/balancete.csv"])
+
+    def test_layout_pelo_cabecalho(self):
+        mec = (MEC_CABECALHO + "02/01/2024;1,00;0;0;10,00;1;10\n").encode()
+        balancete = _balancete_csv({"1.1": "1,00"}).encode()
+
+        (parsed,) = parse_upload_file("12345678000190 2024-12.csv", balancete)
+        self.assertEqual((parsed.tipo, parsed.cnpj, parsed.data_referencia), (TIPO_BALANCETE, "12345678000190", date(2024, 12, 31)))
+        # nome sem "MEC": ainda assim reconhecido pelo cabeçalho
+        (parsed,) = parse_upload_file("12345678000190.csv", mec)
+        self.assertEqual((parsed.tipo, len(parsed.batch)), (TIPO_MEC, 1))
+
+        (parsed,) = parse_upload_file("outro.csv", b"A;B\n1;2\n")
+        self.assertIsNone(parsed.tipo)
+        self.assertIn("Layout não reconhecido", parsed.erro)
+
+    def test_layout_escolhido_uma_vez_pelo_cabecalho(self):
+        mec = (MEC_CABECALHO + "02/01/2024;1,00;0;0;10,00;1;10\n").encode()
+        with mock.patch("core.upload.batch_upload.iter_excel_batches") as balancete, \
+                mock.patch("core.upload.batch_upload.iter_excel_mec_batches", wraps=iter_excel_mec_batches) as leitor_mec:
+            (parsed,) = parse_upload_file("12345678000190.csv", mec)
+        # nem os parsers de balancete nem o MEC consolidado chegam a ler o arquivo
+        balancete.assert_not_called()
+        self.assertEqual(leitor_mec.call_count, 1)
+        self.assertEqual((parsed.tipo, len(parsed.batch)), (TIPO_MEC, 1))
+
+    def test_membros_lidos_sob_demanda(self):
+        lidos = []
+
+        def membros():
+            for i in range(10):
+                lidos.append(i)
+                yield f"{i:014d} 2024-12-31.csv", _balancete_csv({"1.1": f"{i},00"}).encode()
+
+        resultados = parse_uploads(membros(), max_workers=2)
+        primeiro = next(resultados)
+        self.assertEqual(primeiro.arquivo, "00000000000000 2024-12-31.csv")
+        self.assertLessEqual(len(lidos), 4)  # 2 * max_workers
+        self.assertEqual(len([primeiro, *resultados]), 10)
+
+    def test_planilha_consolidada_separa_por_cnpj_e_data(self):
+        texto = (
+            "CNPJ;Data Referência;CONTA;SALDOANTERIOR;SALDOATUAL\n"
+            "12.345.678/0001-90;31/12/2024;1.1;0;1,00\n"
+            "98.765.432/0001-10;31/12/2024;1.1;0;2,00\n"
+            "12.345.678/0001-90;31/12/2024;1.2;0;3,00\n"
+            "12.345.678/0001-90;30/11/2024;1.1;0;4,00\n"
+        )
+        grupos = {
+            (p.cnpj, p.data_referencia): list(p.batch.contas)
+            for p in parse_upload_file("consolidado.csv", texto.encode())
+        }
+        self.assertEqual(grupos, {
+            ("12345678000190", date(2024, 12, 31)): ["1.1", "1.2"],
+            ("98765432000110", date(2024, 12, 31)): ["1.1"],
+            ("12345678000190", date(2024, 11, 30)): ["1.1"],
+        })
+
+    def test_consolidada_tem_hash_por_grupo(self):
+        cabecalho = "CNPJ;Data Referência;CONTA;SALDOANTERIOR;SALDOATUAL\n"
+        a = "12.345.678/0001-90;31/12/2024;1.1;0;1,00\n"
+
+        def hashes(texto: str) -> dict:
+            return {p.cnpj: p.arquivo_hash.sha256 for p in parse_upload_file("consolidado.csv", texto.encode())}
+
+        antes = hashes(cabecalho + a + "98.765.432/0001-10;31/12/2024;1.1;0;2,00\n")
+        # só o fundo B mudou (e as linhas trocaram de posição)
+        depois = hashes(cabecalho + "98.765.432/0001-10;31/12/2024;1.1;0;5,00\n" + a)
+        self.assertNotEqual(antes["12345678000190"], antes["98765432000110"])
+        self.assertEqual(antes["12345678000190"], depois["12345678000190"])
+        self.assertNotEqual(antes["98765432000110"], depois["98765432000110"])
+
+    def test_pool_de_processos_mesmo_resultado(self):
+        arquivos = [
+            (f"{cnpj} 2024-12-31.csv", _balancete_csv({"1.1": f"{i},00"}).encode())
+            for i, cnpj in enumerate(("12345678000190", "98765432000110"), start=1)
+        ]
+        em_paralelo = parse_uploads(arquivos, max_workers=2)
+        no_processo = parse_uploads(arquivos, max_workers=1)
+        self.assertEqual(
+            [(p.cnpj, list(p.batch.saldo_atual)) for p in em_paralelo],
+            [(p.cnpj, list(p.batch.saldo_atual)) for p in no_processo],
+        )
+
+
+class ImportacaoTestCase(TestCase):
+    DATA = date(2024, 12, 31)
+    CONTAS = ("1.1", "1.2", "1.3", "1.4")
+
+    @classmethod
+    def setUpTestData(cls):
+        empresa = Empresa.objects.create(nome="Empresa Teste")
+        cls.fundo = Fundo.objects.create(empresa=empresa, nome="Fundo Teste", cnpj="00000000000100")
+        grupao = GrupoGrande.objects.create(nome="Disponibilidades", tipo=1, ordem=1)
+        grupinho = GrupoPequeno.objects.create(nome="Bancos", grupao=grupao)
+        for conta in cls.CONTAS:
+            MapeamentoContas.objects.create(conta=conta, grupo_pequeno=grupinho)
+
+    def importar(self, saldos: dict, **kwargs):
+        return import_balancete(
+            fundo_id=self.fundo.id, data_referencia=self.DATA,
+            batch=parse_excel(_arquivo(_balancete_csv(saldos))), **kwargs,
+        )
+
+    def saldos_gravados(self) -> dict:
+        itens = BalanceteItem.objects.filter(fundo=self.fundo, data_referencia=self.DATA)
+        return {conta: float(saldo) for conta, saldo in itens.values_list("conta_corrente__conta", "saldo_final")}
+
+
+class ImportacaoLoteTests(ImportacaoTestCase):
+    def test_cada_arquivo_vai_para_o_fundo_do_cnpj(self):
+        f = _zip({
+            "balancete 00000000000100 2024-12-31.csv": _balancete_csv({"1.1": "1,00", "1.2": "2,00"}),
+            "00000000000100 MEC.csv": MEC_CABECALHO + "02/01/2024;1,00;0;0;10,00;1;10\n",
+            "99999999000199 2024-12-31.csv": _balancete_csv({"1.1": "1,00"}),
+            "00000000000100 sem data.csv": _balancete_csv({"1.1": "1,00"}),
+        })
+        resultados = {r.arquivo: r for r in import_upload_lote(fundos=Fundo.objects.all(), arquivo=f, max_workers=1)}
+
+        balancete = resultados["balancete 00000000000100 2024-12-31.csv"]
+        self.assertTrue(balancete.ok)
+        self.assertEqual((balancete.fundo, balancete.report.imported), (self.fundo, 2))
+        self.assertEqual(self.saldos_gravados(), {"1.1": 1.0, "1.2": 2.0})
+        self.assertTrue(resultados["00000000000100 MEC.csv"].ok)
+        self.assertEqual(MecItem.objects.filter(fundo=self.fundo).count(), 1)
+
+        self.assertIn("Nenhum fundo cadastrado", resultados["99999999000199 2024-12-31.csv"].erro)
+        self.assertIn("Data de referência", resultados["00000000000100 sem data.csv"].erro)
+
+    def test_so_fundos_permitidos(self):
+        f = _zip({"00000000000100 2024-12-31.csv": _balancete_csv({"1.1": "1,00"})})
+        (resultado,) = import_upload_lote(fundos=Fundo.objects.none(), arquivo=f, max_workers=1)
+        self.assertIn("Nenhum fundo cadastrado", resultado.erro)
+        self.assertEqual(self.saldos_gravados(), {})
+
+
+# =========================
+# Registro de lotes (ImportBatch)
+# =========================
+class ImportBatchTests(ImportacaoTestCase):
+    def importar_arquivo(self, saldos: dict):
+        texto = _balancete_csv(saldos)
+        return import_balancete_batches(
+            fundo_id=self.fundo.id, data_referencia=self.DATA,
+            batches=iter_excel_batches(_arquivo(texto)),
+            arquivo=chunked_reader.fingerprint_bytes("balancete.csv", texto.encode()),
+        )
+
+    def test_reenvio_identico_nao_regrava(self):
+        primeiro = self.importar_arquivo({"1.1": "1,00", "1.2": "2,00"})
+        self.assertFalse(primeiro.already_imported)
+        registro = ImportBatch.objects.get(pk=primeiro.import_batch_id)
+        self.assertEqual((registro.importados, registro.nome_arquivo), (2, "balancete.csv"))
+
+        segundo = self.importar_arquivo({"1.1": "1,00", "1.2": "2,00"})
+        self.assertTrue(segundo.already_imported)
+        self.assertEqual(segundo.import_batch_id, primeiro.import_batch_id)
+        self.assertEqual((segundo.imported, segundo.updated), (0, 0))
+        self.assertEqual(ImportBatch.objects.count(), 1)
+
+    def test_reenvio_de_arquivo_antigo_depois_de_outro_regrava(self):
+        self.importar_arquivo({"1.1": "1,00"})
+        self.importar_arquivo({"1.1": "5,00"})
+        r = self.importar_arquivo({"1.1": "1,00"})
+        self.assertFalse(r.already_imported)
+        self.assertEqual(self.saldos_gravados(), {"1.1": 1.0})
+        self.assertEqual(ImportBatch.objects.count(), 3)
+
+    def test_reenvio_depois_de_erros_e_reprocessado(self):
+        texto = MEC_CABECALHO + "02/01/2024;1,00;0;0;10,00;1;10\n03/01/2024;x;0;0;10,00;1;10\n"
+
+        def importar_mec():
+            return import_mec_batches(
+                fundo_id=self.fundo.id,
+                batches=iter_excel_mec_batches(_arquivo(texto, "mec.csv")),
+                arquivo=chunked_reader.fingerprint_bytes("mec.csv", texto.encode()),
+            )
+
+        self.assertEqual(len(importar_mec().errors), 1)
+        r = importar_mec()
+        self.assertFalse(r.already_imported)
+        self.assertEqual(len(r.errors), 1)
+
+    def test_reenvio_depois_de_contas_ignoradas_e_reprocessado(self):
+        saldos = {"1.1": "1,00", "9.9": "9,00"}
+        self.assertEqual(self.importar_arquivo(saldos).ignored, 1)
+
+        # a conta passa a existir no plano: o mesmo arquivo agora grava a linha
+        MapeamentoContas.objects.create(conta="9.9", grupo_pequeno=GrupoPequeno.objects.get())
+        r = self.importar_arquivo(saldos)
+        self.assertFalse(r.already_imported)
+        self.assertEqual((r.imported, r.ignored), (1, 0))
+        self.assertEqual(self.saldos_gravados(), {"1.1": 1.0, "9.9": 9.0})
+        self.assertTrue(self.importar_arquivo(saldos).already_imported)
+
+
+# =========================
+# Importação do balancete
+# =========================
+class BalanceteImportacaoTests(ImportacaoTestCase):
+    def test_upsert_conta_inseridos_atualizados_e_ignorados(self):
+        r = self.importar({"1.1": "1,00", "1.2": "2,00", "9.9": "9,00"})
+        self.assertEqual((r.imported, r.updated, r.ignored), (2, 0, 1))
+
+        r = self.importar({"1.1": "10,00", "1.3": "3,00"})
+        self.assertEqual((r.imported, r.updated, r.ignored), (1, 1, 0))
+        self.assertEqual(self.saldos_gravados(), {"1.1": 10.0, "1.2": 2.0, "1.3": 3.0})
+
+    def test_conta_repetida_vale_a_ultima_linha(self):
+        texto = "CONTA;SALDOANTERIOR;SALDOATUAL\n1.1;0;1,00\n1.1;0;2,00\n"
+        r = import_balancete(fundo_id=self.fundo.id, data_referencia=self.DATA, batch=parse_excel(_arquivo(texto)))
+        self.assertEqual((r.imported, r.updated), (1, 1))
+        self.assertEqual(self.saldos_gravados(), {"1.1": 2.0})
+
+    def test_saldo_fora_do_limite_vira_erro_sem_derrubar_o_lote(self):
+        r = self.importar({"1.1": "1,00", "1.2": "1" + "0" * 18 + ",00"})
+        self.assertEqual(r.imported, 1)
+        self.assertEqual([e.row_index for e in r.errors], [1])
+        self.assertEqual(self.saldos_gravados(), {"1.1": 1.0})
+
+    def test_contagem_entre_lotes_do_mesmo_arquivo(self):
+        texto = _balancete_csv({"1.1": "1,00", "1.2": "2,00", "1.1 ": "3,00"})
+        r = import_balancete_batches(
+            fundo_id=self.fundo.id, data_referencia=self.DATA,
+            batches=iter_excel_batches(_arquivo(texto), chunk_size=1),
+        )
+        self.assertEqual((r.imported, r.updated), (2, 1))
+        self.assertEqual(self.saldos_gravados(), {"1.1": 3.0, "1.2": 2.0})
+
+
+# =========================
+# Importação do MEC
+# =========================
+class MecImportacaoTests(ImportacaoTestCase):
+    def importar_mec(self, linhas: str):
+        return import_mec(fundo_id=self.fundo.id, batch=parse_excel_mec(_arquivo(MEC_CABECALHO + linhas, "mec.csv")))
+
+    def test_diferencial_conta_novos_atualizados_iguais_e_rejeitados(self):
+        r = self.importar_mec(
+            "02/01/2024;100,00;0;0;1000,00;10;100\n"
+            "03/01/2024;0;0;0;1000,00;10;100\n"
+        )
+        self.assertEqual((r.imported, r.updated, r.unchanged, len(r.errors)), (2, 0, 0, 0))
+
+        r = self.importar_mec(
+            "02/01/2024;100,00;0;0;1000,00;10;100\n"   # igual ao gravado
+            "03/01/2024;0;50,00;0;950,00;9,5;100\n"    # mudou
+            "04/01/2024;x;0;0;950,00;9,5;100\n"        # valor inválido
+            "05/01/2024;0;0;0;950,00;9,5;100\n"        # nova
+        )
+        self.assertEqual((r.imported, r.updated, r.unchanged, len(r.errors)), (1, 1, 1, 1))
+        self.assertEqual(r.errors[0].row_index, 2)
+        self.assertEqual(MecItem.objects.filter(fundo=self.fundo).count(), 3)
+        self.assertEqual(MecItem.objects.get(fundo=self.fundo, data_posicao=date(2024, 1, 3)).resgate, Decimal("50.00"))
+
+    def test_data_repetida_vale_a_ultima_linha(self):
+        r = self.importar_mec(
+            "02/01/2024;100,00;0;0;1000,00;10;100\n"
+            "02/01/2024;200,00;0;0;1000,00;10;100\n"
+        )
+        self.assertEqual((r.imported, r.ignored), (1, 1))
+        self.assertEqual(MecItem.objects.get(fundo=self.fundo).aplicacao, Decimal("200.00"))
+
+    def test_valor_negativo_vira_erro(self):
+        r = self.importar_mec("02/01/2024;-1,00;0;0;1000,00;10;100\n")
+        self.assertEqual((r.imported, len(r.errors)), (0, 1))
+        self.assertIn("negativo", r.errors[0].reason)
+
+
+# =========================
+# Jobs de importação
+# =========================
+class MidiaTemporariaMixin:
+    """Arquivos enviados aos jobs vão para um MEDIA_ROOT descartável."""
+
+    @classmethod
+    def setUpClass(cls):
+        midia = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, midia, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=midia)
+        override.enable()
+        cls.addClassCleanup(override.disable)
+        super().setUpClass()
+
+
+class ImportJobTests(MidiaTemporariaMixin, ImportacaoTestCase):
+    def enfileirar(self, texto: str, nome: str = "balancete.csv", tipo: str = ImportBatch.TIPO_BALANCETE):
+        return enqueue_import(
+            fundo_id=self.fundo.id, tipo=tipo, data_referencia=self.DATA if tipo == ImportBatch.TIPO_BALANCETE else None,
+            arquivo=SimpleUploadedFile(nome, texto.encode()),
+        )
+
+    def test_worker_processa_a_fila_e_guarda_o_resultado(self):
+        balancete = self.enfileirar(_balancete_csv({"1.1": "1,00", "9.9": "9,00"}))
+        mec = self.enfileirar(MEC_CABECALHO + "02/01/2024;1,00;0;0;10,00;1;10\n", "mec.csv", ImportBatch.TIPO_MEC)
+        self.assertEqual(balancete.status, ImportJob.Status.PENDENTE)
+
+        self.assertEqual(run_pending_jobs(), 2)
+        balancete.refresh_from_db()
+        self.assertEqual(balancete.status, ImportJob.Status.CONCLUIDO)
+        self.assertEqual((balancete.report["imported"], balancete.report["ignored"]), (1, 1))
+        self.assertEqual(balancete.linhas_processadas, 2)
+        self.assertEqual(balancete.import_batch.sha256, ImportBatch.objects.get(tipo=ImportBatch.TIPO_BALANCETE).sha256)
+        self.assertFalse(balancete.arquivo)  # arquivo apagado depois do sucesso
+        self.assertEqual(self.saldos_gravados(), {"1.1": 1.0})
+
+        mec.refresh_from_db()
+        self.assertEqual((mec.status, mec.report["imported"]), (ImportJob.Status.CONCLUIDO, 1))
+
+    def test_planilha_invalida_termina_com_erro(self):
+        job = self.enfileirar("CONTA;VALOR\n1.1;1,00\n")
+        run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.Status.ERRO)
+        self.assertIn("faltam colunas SALDOATUAL", job.erro)
+        self.assertTrue(job.arquivo)  # mantido para reprocessar/inspecionar
+
+    def test_reserva_condicional_nao_entrega_o_mesmo_job_duas_vezes(self):
+        primeiro = self.enfileirar(_balancete_csv({"1.1": "1,00"}))
+        segundo = self.enfileirar(_balancete_csv({"1.2": "2,00"}))
+
+        # outro worker reserva o mesmo job entre o SELECT e o UPDATE deste
+        update_original = QuerySet.update
+        concorrente = []
+
+        def _update_com_concorrente(qs, **kwargs):
+            if not concorrente:
+                concorrente.append(None)
+                concorrente[0] = claim_next_job()
+            return update_original(qs, **kwargs)
+
+        with mock.patch.object(QuerySet, "update", _update_com_concorrente):
+            meu = claim_next_job()
+
+        self.assertEqual(concorrente[0].id, primeiro.id)
+        self.assertEqual(meu.id, segundo.id)
+        self.assertIsNone(claim_next_job())
+
+
+class ImportJobLoteTests(MidiaTemporariaMixin, ImportacaoTestCase):
+    ZIP = {
+        "00000000000100 2024-12-31.csv": _balancete_csv({"1.1": "1,00"}),
+        "99999999000199 2024-12-31.csv": _balancete_csv({"1.1": "1,00"}),
+    }
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(username="operador", password="x")
+        Membership.objects.create(empresa=self.fundo.empresa, usuario=self.usuario, role=Membership.Role.ADMIN)
+        self.client.force_login(self.usuario)
+
+    def enviar(self, **headers):
+        arquivo = SimpleUploadedFile("fechamento.zip", _zip(self.ZIP).getvalue())
+        return self.client.post(reverse("importar_lote"), {"arquivo_lote": arquivo}, **headers)
+
+    def test_upload_enfileira_e_o_worker_importa(self):
+        resposta = self.enviar(HTTP_ACCEPT="application/json")
+        self.assertEqual(resposta.status_code, 202)
+        job = ImportJob.objects.get(id=resposta.json()["job_id"])
+        self.assertEqual(resposta.json()["status_url"], reverse("import_job_status", args=[job.id]))
+        self.assertEqual((job.tipo, job.status, job.fundos_permitidos), (ImportJob.TIPO_LOTE, ImportJob.Status.PENDENTE, [self.fundo.id]))
+        self.assertEqual(self.saldos_gravados(), {})  # nada importado no request
+
+        self.assertEqual(run_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.Status.CONCLUIDO)
+        self.assertEqual((job.report["total_ok"], job.report["total_erros"]), (1, 1))
+        arquivos = {a["arquivo"]: a for a in job.report["arquivos"]}
+        self.assertEqual(arquivos["00000000000100 2024-12-31.csv"]["fundo_id"], self.fundo.id)
+        self.assertIn("Nenhum fundo cadastrado", arquivos["99999999000199 2024-12-31.csv"]["erro"])
+        self.assertEqual(self.saldos_gravados(), {"1.1": 1.0})
+
+        status = self.client.get(reverse("import_job_status", args=[job.id])).json()
+        self.assertTrue(status["finalizado"])
+
+    @override_settings(IMPORT_JOBS_ASYNC=False)
+    def test_modo_sincrono_roda_no_request_e_mostra_o_resultado(self):
+        resposta = self.enviar()
+        job = ImportJob.objects.get()
+        self.assertRedirects(resposta, reverse("import_job_lote", args=[job.id]), fetch_redirect_response=False)
+        self.assertEqual(job.status, ImportJob.Status.CONCLUIDO)
+        self.assertEqual(self.saldos_gravados(), {"1.1": 1.0})
+
+        pagina = self.client.get(reverse("import_job_lote", args=[job.id]))
+        self.assertContains(pagina, "Fundo Teste")
+        self.assertContains(pagina, "Nenhum fundo cadastrado")
+
+
+class ImportJobConcorrenciaTests(TransactionTestCase):
+    """Workers em threads (conexões separadas) disputando a mesma fila."""
+
+    WORKERS = 4
+    JOBS = 8
+
+    def setUp(self):
+        empresa = Empresa.objects.create(nome="Empresa Teste")
+        fundo = Fundo.objects.create(empresa=empresa, nome="Fundo Teste", cnpj="00000000000100")
+        ImportJob.objects.bulk_create([
+            ImportJob(fundo=fundo, tipo=ImportBatch.TIPO_MEC, nome_arquivo=f"mec{i}.csv") for i in range(self.JOBS)
+        ])
+
+    def test_cada_job_reservado_por_um_unico_worker(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("SQLite em memória não é compartilhado entre conexões de threads")
+        reservados = []
+        barreira = threading.Barrier(self.WORKERS)
+
+        def _worker():
+            try:
+                barreira.wait()
+                while (job := claim_next_job()) is not None:
+                    reservados.append(job.id)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=_worker) for _ in range(self.WORKERS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(sorted(reservados), sorted(ImportJob.objects.values_list("id", flat=True)))
+        self.assertEqual(ImportJob.objects.filter(status=ImportJob.Status.PROCESSANDO).count(), self.JOBS)
+
+
+# =========================
+# Carga do balancete (staging + merge)
+# =========================
+class CargaSaldosTests(ImportacaoTestCase):
+    def test_loader_pelo_banco_e_pela_configuracao(self):
+        loader = bulk_load.saldo_loader(fundo_id=self.fundo.id, data_referencia=self.DATA)
+        esperado = {"sqlite": bulk_load.SQLiteSaldoLoader, "mysql": bulk_load.MySQLSaldoLoader}.get(
+            connection.vendor, bulk_load.SaldoLoader,
+        )
+        self.assertIs(type(loader), esperado)
+        with override_settings(BALANCETE_BULK_LOAD="orm"):
+            loader = bulk_load.saldo_loader(fundo_id=self.fundo.id, data_referencia=self.DATA)
+        self.assertIs(type(loader), bulk_load.SaldoLoader)
+
+    def test_staging_e_orm_gravam_o_mesmo_resultado(self):
+        ids = dict(MapeamentoContas.objects.values_list("conta", "id"))
+        for estrategia, data in (("staging", self.DATA), ("orm", date(2024, 11, 30))):
+            loader = bulk_load.saldo_loader(fundo_id=self.fundo.id, data_referencia=data, estrategia=estrategia)
+            loader.add({ids["1.1"]: Decimal("1.00"), ids["1.2"]: Decimal("2.00")})
+            # conta repetida em outro lote: vale o último saldo
+            loader.add({ids["1.1"]: Decimal("10.00")})
+            loader.finish()
+
+        gravados = {
+            data: dict(itens.values_list("conta_corrente__conta", "saldo_final"))
+            for data, itens in (
+                (d, BalanceteItem.objects.filter(fundo=self.fundo, data_referencia=d))
+                for d in (self.DATA, date(2024, 11, 30))
+            )
+        }
+        self.assertEqual(gravados[self.DATA], {"1.1": Decimal("10.00"), "1.2": Decimal("2.00")})
+        self.assertEqual(gravados[self.DATA], gravados[date(2024, 11, 30)])
+
+    def test_merge_atualiza_saldos_existentes(self):
+        self.importar({"1.1": "1,00", "1.2": "2,00"})
+        r = self.importar({"1.1": "5,00"})
+        self.assertEqual((r.imported, r.updated), (0, 1))
+        self.assertEqual(self.saldos_gravados(), {"1.1": 5.0, "1.2": 2.0})
+
+    @override_settings(BALANCETE_BULK_LOAD="staging")
+    def test_carga_real_no_mysql(self):
+        if connection.vendor != "mysql":
+            self.skipTest("caminho LOAD via tabela temporária do MySQL")
+        loader = bulk_load.saldo_loader(fundo_id=self.fundo.id, data_referencia=self.DATA)
+        self.assertIsInstance(loader, bulk_load.MySQLSaldoLoader)
+        conta_id = MapeamentoContas.objects.get(conta="1.1").id
+        loader.add({conta_id: Decimal("1.00")})
+        loader.add({conta_id: Decimal("3.00")})
+        loader.finish()
+        self.assertEqual(self.saldos_gravados(), {"1.1": 3.0})
+
+
+class _CursorGravador:
+    def __init__(self, comandos: list):
+        self.comandos = comandos
+
+    def execute(self, sql, params=None):
+        self.comandos.append(("execute", sql, params))
+
+    def executemany(self, sql, params):
+        self.comandos.append(("executemany", sql, params))
+
+
+class _ConexaoMySQLFalsa:
+    """Só o necessário para o StagingSaldoLoader montar o SQL (sem driver MySQL)."""
+
+    class ops:
+        quote_name = staticmethod(lambda nome: f"`{nome}`")
+        adapt_datefield_value = staticmethod(str)
+        adapt_datetimefield_value = staticmethod(lambda v: "2025-01-01 00:00:00")
+
+    def __init__(self):
+        self.comandos = []
+
+    @contextmanager
+    def cursor(self):
+        yield _CursorGravador(self.comandos)
+
+
+class MySQLSaldoLoaderSqlTests(SimpleTestCase):
+    def carregar(self, *lotes):
+        with mock.patch.object(bulk_load, "connections", {"default": _ConexaoMySQLFalsa()}):
+            loader = bulk_load.MySQLSaldoLoader(fundo_id=7, data_referencia=date(2024, 12, 31), using="default")
+        for lote in lotes:
+            loader.add(lote)
+        loader.finish()
+        return loader.connection.comandos
+
+    def test_sequencia_de_comandos_e_parametros(self):
+        comandos = self.carregar({1: Decimal("1.00"), 2: Decimal("2.00")}, {}, {1: Decimal("3.00")})
+        self.assertEqual(
+            [(tipo, sql.split(" (")[0].split(" SELECT")[0]) for tipo, sql, _ in comandos],
+            [
+                ("execute", "DROP TEMPORARY TABLE IF EXISTS `tmp_carga_balancete`"),
+                ("execute", "CREATE TEMPORARY TABLE `tmp_carga_balancete`"),
+                ("executemany", "INSERT INTO `tmp_carga_balancete`"),
+                ("executemany", "INSERT INTO `tmp_carga_balancete`"),
+                ("execute", "INSERT INTO `df_balanceteitem`"),
+                ("execute", "DROP TEMPORARY TABLE IF EXISTS `tmp_carga_balancete`"),
+            ],
+        )
+        self.assertEqual(comandos[2][2], [(1, Decimal("1.00")), (2, Decimal("2.00"))])
+        self.assertEqual(comandos[4][2], [7, "2024-12-31", "2025-01-01 00:00:00"])
+
+    def test_placeholders_batem_com_os_parametros(self):
+        comandos = self.carregar({1: Decimal("1.00")})
+        _, insert_sql, insert_params = comandos[2]
+        _, merge_sql, merge_params = comandos[3]
+        self.assertEqual(insert_sql.count("%s"), len(insert_params[0]))
+        self.assertEqual(merge_sql.count("%s"), len(merge_params))
+        # conta repetida na staging substitui; merge atualiza a linha existente pela chave única
+        self.assertRegex(insert_sql, r"ON DUPLICATE KEY UPDATE saldo_final = VALUES\(saldo_final\)$")
+        self.assertRegex(merge_sql, r"^INSERT INTO `df_balanceteitem` \(fundo_id, data_referencia, conta_corrente_id, saldo_final, data_importacao\) SELECT ")
+        self.assertTrue(merge_sql.endswith("ON DUPLICATE KEY UPDATE saldo_final = s.saldo_final"))
+        # nenhuma chave {..} do template sobrou sem formatar
+        self.assertFalse(re.search(r"[{}]", insert_sql + merge_sql))
+
+    def test_sem_saldos_nao_cria_tabela(self):
+        self.assertEqual(self.carregar({}), [])
+
+
+# =========================
+# Substituição do snapshot (fundo, data)
+# =========================
+class SubstituicaoTests(ImportacaoTestCase):
+    def test_remove_contas_ausentes_do_arquivo(self):
+        self.importar({"1.1": "1,00", "1.2": "2,00", "1.3": "3,00"})
+        r = self.importar({"1.2": "20,00", "1.4": "4,00"}, substituir=True)
+        self.assertEqual((r.imported, r.updated, r.removed), (1, 1, 2))
+        self.assertEqual(self.saldos_gravados(), {"1.2": 20.0, "1.4": 4.0})
+
+    def test_arquivo_sem_saldo_valido_nao_apaga_nada(self):
+        self.importar({"1.1": "1,00", "1.2": "2,00"})
+        r = self.importar({"9.9": "9,00"}, substituir=True)
+        self.assertEqual((r.ignored, r.removed), (1, 0))
+        self.assertEqual(self.saldos_gravados(), {"1.1": 1.0, "1.2": 2.0})
+
+    def test_outras_datas_nao_sao_afetadas(self):
+        outra = BalanceteItem.objects.create(
+            fundo=self.fundo, data_referencia=date(2024, 11, 30),
+            conta_corrente=MapeamentoContas.objects.get(conta="1.3"), saldo_final=Decimal("3.00"),
+        )
+        self.importar({"1.1": "1,00"}, substituir=True)
+        self.assertTrue(BalanceteItem.objects.filter(pk=outra.pk).exists())
+
+    def test_reenvio_identico_em_substituicao_depois_de_upsert_reprocessa(self):
+        texto = _balancete_csv({"1.1": "1,00"})
+
+        def importar(substituir):
+            return import_balancete_batches(
+                fundo_id=self.fundo.id, data_referencia=self.DATA,
+                batches=iter_excel_batches(_arquivo(texto)), substituir=substituir,
+                arquivo=chunked_reader.fingerprint_bytes("balancete.csv", texto.encode()),
+            )
+
+        self.importar({"1.2": "2,00"})
+        importar(substituir=False)
+        r = importar(substituir=True)
+        self.assertFalse(r.already_imported)
+        self.assertEqual(r.removed, 1)
+        self.assertTrue(importar(substituir=True).already_imported)
+        self.assertEqual(ImportBatch.objects.get(pk=r.import_batch_id).removidos, 1)
+
+
+# =========================
+# Importação em blocos com checkpoint
+# =========================
+def _interrompe_depois(batches, n: int):
+    """Lotes do parser até o n-ésimo; depois simula a queda do worker."""
+    for i, batch in enumerate(batches):
+        if i == n:
+            raise RuntimeError("worker caiu")
+        yield batch
+
+
+class CheckpointTests(ImportacaoTestCase):
+    def importar_em_blocos(self, texto: str, checkpoint: ImportCheckpoint, interromper: int = None, **kwargs):
+        batches = iter_excel_batches(_arquivo(texto), chunk_size=1)
+        if interromper is not None:
+            batches = _interrompe_depois(batches, interromper)
+        return import_balancete_batches(
+            fundo_id=self.fundo.id, data_referencia=self.DATA, batches=batches, checkpoint=checkpoint, **kwargs,
+        )
+
+    def test_retomada_pula_lotes_gravados_e_fecha_o_relatorio(self):
+        texto = _balancete_csv({"1.1": "1,00", "1.2": "2,00", "9.9": "9,00", "1.1 ": "3,00"})
+        gravados = []
+        checkpoint = ImportCheckpoint(salvar=lambda cp: gravados.append(cp.to_dict()))
+        with self.assertRaises(RuntimeError):
+            self.importar_em_blocos(texto, checkpoint, interromper=2)
+        self.assertEqual(checkpoint.lotes, 2)
+        self.assertEqual(gravados[-1]["lotes"], 2)
+        self.assertEqual(self.saldos_gravados(), {"1.1": 1.0, "1.2": 2.0})
+
+        r = self.importar_em_blocos(texto, ImportCheckpoint.from_dict(gravados[-1]))
+        self.assertEqual((r.imported, r.updated, r.ignored), (2, 1, 1))
+        self.assertEqual(self.saldos_gravados(), {"1.1": 3.0, "1.2": 2.0})
+
+    def test_substituicao_ignora_o_checkpoint_e_e_tudo_ou_nada(self):
+        self.importar({"1.1": "1,00", "1.2": "2,00"})
+        texto = _balancete_csv({"1.3": "3,00", "1.4": "4,00"})
+        checkpoint = ImportCheckpoint()
+        with self.assertRaises(RuntimeError):
+            self.importar_em_blocos(texto, checkpoint, interromper=1, substituir=True)
+        self.assertEqual(checkpoint.lotes, 0)
+        self.assertEqual(self.saldos_gravados(), {"1.1": 1.0, "1.2": 2.0})
+
+        r = self.importar_em_blocos(texto, checkpoint, substituir=True)
+        self.assertEqual((r.imported, r.removed), (2, 2))
+        self.assertEqual(self.saldos_gravados(), {"1.3": 3.0, "1.4": 4.0})
+
+
+class RetomadaJobTests(MidiaTemporariaMixin, ImportacaoTestCase):
+    def test_job_com_erro_volta_para_a_fila_e_termina(self):
+        job = enqueue_import(
+            fundo_id=self.fundo.id, tipo=ImportBatch.TIPO_BALANCETE, data_referencia=self.DATA,
+            arquivo=SimpleUploadedFile("balancete.csv", _balancete_csv({"1.1": "1,00"}).encode()),
+        )
+        ImportJob.objects.filter(id=job.id).update(status=ImportJob.Status.ERRO, erro="worker caiu")
+        job.refresh_from_db()
+
+        self.assertTrue(retomar_job(job))
+        self.assertFalse(retomar_job(job))  # já está PENDENTE
+        self.assertEqual(run_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.checkpoint), (ImportJob.Status.CONCLUIDO, None))
+        self.assertEqual(self.saldos_gravados(), {"1.1": 1.0})
+
+
+# =========================
+# Contexto compartilhado das demonstrações
+# =========================
+class DemonstracoesContextoTests(TestCase):
+    DPF = {
+        "ATIVO": {"TOTAL_ATIVO": {"ATUAL": 300, "ANTERIOR": 200}},
+        "PASSIVO": {"TOTAL_PASSIVO": {"ATUAL": 50, "ANTERIOR": 40}},
+        "PL": {"TOTAL_PL": {"ATUAL": 150, "ANTERIOR": 110}},
+    }
+
+    @contextmanager
+    def geradores(self):
+        with mock.patch.object(demonstracoes, "gerar_dados_dre", return_value=({}, 100, 50)) as dre, \
+                mock.patch.object(demonstracoes, "gerar_dados_dpf", return_value=(self.DPF, {})) as dpf, \
+                mock.patch.object(demonstracoes, "gerar_dados_dmpl",
+                                  return_value={"aplicacoes_valor": 10, "resgates_valor": 4}) as dmpl:
+            yield dre, dpf, dmpl
+
+    def test_cada_demonstracao_calculada_uma_vez(self):
+        ctx = DemonstracoesContexto(1, date(2024, 12, 31), date(2023, 12, 31))
+        with self.geradores() as geradores:
+            dfc, variacao, _ = ctx.dfc
+            ctx.dre, ctx.dpf, ctx.dmpl, ctx.total_pl_passivo, ctx.dpf_percentuais
+        for gerador in geradores:
+            gerador.assert_called_once_with(
+                fundo_id=1, data_atual=date(2024, 12, 31), data_anterior=date(2023, 12, 31), zerar_anterior=False,
+            )
+        self.assertEqual(dfc["fluxo_operacionais"]["resultado_liquido"]["ATUAL"], 100)
+        self.assertEqual(dfc["fluxo_financiamento"]["caixa_financiamento"]["ATUAL"], 6)
+
+    def test_pl_ajustado_e_percentuais_sem_alterar_a_dpf(self):
+        ctx = DemonstracoesContexto(1, date(2024, 12, 31), date(2023, 12, 31))
+        with self.geradores():
+            self.assertEqual(ctx.pl_ajustado, (250, 160))
+            self.assertEqual(ctx.total_pl_passivo, (300, 200))
+            ativo = ctx.dpf_percentuais["ATIVO"]["TOTAL_ATIVO"]
+        self.assertEqual((ativo["PERC_ATUAL"], ativo["PERC_ANTERIOR"]), (120.0, 125.0))
+        self.assertNotIn("PERC_ATUAL", self.DPF["ATIVO"]["TOTAL_ATIVO"])
+
+
+# =========================
+# Agregados por grupinho
+# =========================
+class AgregadosTests(ImportacaoTestCase):
+    def agregados(self) -> dict:
+        linhas = BalanceteAgregado.objects.filter(fundo=self.fundo, data_referencia=self.DATA)
+        return {nome: float(saldo) for nome, saldo in linhas.values_list("grupo_pequeno__nome", "saldo_final")}
+
+    def test_importacao_grava_a_soma_por_grupinho(self):
+        self.importar({"1.1": "1,00", "1.2": "2,50", "9.9": "9,00"})
+        self.assertEqual(self.agregados(), {"Bancos": 3.5})
+
+        self.importar({"1.2": "4,50"}, substituir=True)
+        self.assertEqual(self.agregados(), {"Bancos": 4.5})
+
+    def test_importacao_em_blocos_fecha_com_o_total(self):
+        import_balancete_batches(
+            fundo_id=self.fundo.id, data_referencia=self.DATA, checkpoint=ImportCheckpoint(),
+            batches=iter_excel_batches(_arquivo(_balancete_csv({"1.1": "1,00", "1.2": "2,00"})), chunk_size=1),
+        )
+        self.assertEqual(self.agregados(), {"Bancos": 3.0})
+
+    def importar_em_blocos(self, checkpoint: ImportCheckpoint):
+        return import_balancete_batches(
+            fundo_id=self.fundo.id, data_referencia=self.DATA, checkpoint=checkpoint,
+            batches=iter_excel_batches(_arquivo(_balancete_csv({"1.1": "1,00", "1.2": "2,00", "1.3": "3,00"})), chunk_size=1),
+        )
+
+    def test_importacao_em_blocos_recalcula_uma_vez(self):
+        with mock.patch("core.processing.import_service.recalcular_agregados", wraps=recalcular_agregados) as recalculo:
+            self.importar_em_blocos(ImportCheckpoint())
+        recalculo.assert_called_once_with(fundo_id=self.fundo.id, datas=[self.DATA])
+        self.assertEqual(self.agregados(), {"Bancos": 6.0})
+
+    def test_retomada_conclui_recalculo_pendente(self):
+        gravados = []
+        checkpoint = ImportCheckpoint(salvar=lambda cp: gravados.append(cp.to_dict()))
+        with mock.patch("core.processing.import_service.recalcular_agregados", side_effect=RuntimeError("worker caiu")):
+            with self.assertRaises(RuntimeError):
+                self.importar_em_blocos(checkpoint)
+        self.assertEqual((gravados[-1]["lotes"], gravados[-1]["agregados_pendentes"]), (3, True))
+        self.assertEqual(self.agregados(), {})
+
+        retomada = ImportCheckpoint.from_dict(gravados[-1], salvar=lambda cp: gravados.append(cp.to_dict()))
+        self.importar_em_blocos(retomada)
+        self.assertFalse(gravados[-1]["agregados_pendentes"])
+        self.assertEqual(self.agregados(), {"Bancos": 6.0})
+
+    def test_conta_movida_recalcula_os_dois_grupinhos(self):
+        self.importar({"1.1": "1,00", "1.2": "2,00"})
+        caixa = GrupoPequeno.objects.create(nome="Caixa", grupao=GrupoGrande.objects.get())
+        conta = MapeamentoContas.objects.get(conta="1.2")
+        conta.grupo_pequeno = caixa
+        conta.save()
+        self.assertEqual(self.agregados(), {"Bancos": 1.0, "Caixa": 2.0})
+
+    def test_reconstrucao_completa_limpa_datas_sem_balancete(self):
+        self.importar({"1.1": "1,00"})
+        BalanceteItem.objects.filter(fundo=self.fundo).delete()
+        recalcular_todos_agregados()
+        self.assertEqual(self.agregados(), {})
+
+
+# =========================
+# Cache das demonstrações
+# =========================
+@override_settings(DEMONSTRACOES_CACHE_TTL=60)
+class DemonstracoesCacheTests(ImportacaoTestCase):
+    DATA_ANTERIOR = date(2023, 12, 31)
+
+    def setUp(self):
+        cache.clear()
+
+    def calculos(self):
+        """Quantas vezes cada demonstração foi calculada ao montar o contexto em cache."""
+        contagem = {}
+
+        def contar(nome, original):
+            def gerador(**kwargs):
+                contagem[nome] = contagem.get(nome, 0) + 1
+                return original(**kwargs)
+            return gerador
+
+        patches = [
+            mock.patch.object(demonstracoes, nome, contar(nome, getattr(demonstracoes, nome)))
+            for nome in ("gerar_dados_dre", "gerar_dados_dpf", "gerar_dados_dmpl")
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        return contagem
+
+    def contexto(self):
+        ctx = demonstracoes_em_cache(fundo_id=self.fundo.id, data_atual=self.DATA, data_anterior=self.DATA_ANTERIOR)
+        ctx.dre, ctx.dpf, ctx.dmpl, ctx.dfc
+        return ctx
+
+    def test_segunda_leitura_vem_do_cache(self):
+        contagem = self.calculos()
+        primeiro = self.contexto()
+        segundo = self.contexto()
+        self.assertEqual(contagem, {"gerar_dados_dre": 1, "gerar_dados_dpf": 1, "gerar_dados_dmpl": 1})
+        self.assertEqual(segundo.dfc, primeiro.dfc)
+
+    def test_importacao_troca_a_versao(self):
+        contagem = self.calculos()
+        antes = versao_dados(self.fundo.id)
+        self.contexto()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.importar({"1.1": "1,00"})
+        self.assertNotEqual(versao_dados(self.fundo.id), antes)
+        self.contexto()
+        self.assertEqual(contagem["gerar_dados_dre"], 2)
+
+    @override_settings(DEMONSTRACOES_CACHE_TTL=0)
+    def test_ttl_zero_desliga_o_cache(self):
+        contagem = self.calculos()
+        self.contexto()
+        self.contexto()
+        self.assertEqual(contagem["gerar_dados_dre"], 2)
+
+
+class VersaoDadosTests(ImportacaoTestCase):
+    def test_importacao_avanca_versao_guardada_no_banco(self):
+        antes = versao_dados(self.fundo.id)
+        self.importar({"1.1": "1,00"})
+        depois = versao_dados(self.fundo.id)
+        self.assertNotEqual(depois, antes)
+
+        # o cache local de outro processo não tem nada: a versão continua a mesma
+        cache.clear()
+        self.assertEqual(versao_dados(self.fundo.id), depois)
+
+
+# =========================
+# DMPL
+# =========================
+class DmplTests(ImportacaoTestCase):
+    # (data, aplicação, resgate, qtd de cotas, cota)
+    POSICOES = (
+        (date(2023, 12, 29), 1_000_000, 0, "1000", "1000"),
+        (date(2024, 6, 28), 500_000, 200_000, "1240", "1250"),
+        (date(2024, 12, 31), 300_000, 100_000, "1373.333333", "1500"),
+        (date(2025, 6, 30), 150_000, 0, "1467.083333", "1600"),
+        (date(2025, 12, 31), 0, 400_000, "1200", "2000"),
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for data, aplicacao, resgate, qtd, cota in cls.POSICOES:
+            MecItem.objects.create(
+                fundo=cls.fundo, data_posicao=data, aplicacao=aplicacao, resgate=resgate,
+                pl=Decimal(qtd) * Decimal(cota), qtd_cotas=Decimal(qtd), cota=Decimal(cota),
+            )
+
+    def test_periodo_atual_e_anterior(self):
+        d = gerar_dados_dmpl(self.fundo.id, date(2025, 12, 31), date(2024, 12, 31))
+        # mesmos valores da implementação anterior (uma consulta ORM por posição/período)
+        self.assertEqual(
+            {k: d[k] for k in (
+                "qtd_cotas_inicio", "qtd_cotas_fim", "qtd_cotas_inicio_ant",
+                "cota_inicio", "cota_fim", "cota_inicio_ant",
+                "aplicacoes_qtd", "resgates_qtd", "aplicacoes_valor", "resgates_valor",
+                "valor_ultimo", "valor_primeiro", "valor_primeiro_ant", "pl_antes_resultado_periodo",
+            )},
+            {
+                "qtd_cotas_inicio": 1373.333333, "qtd_cotas_fim": 1200.0, "qtd_cotas_inicio_ant": 1000.0,
+                "cota_inicio": 1500.0, "cota_fim": 2000.0, "cota_inicio_ant": 1000.0,
+                "aplicacoes_qtd": 93.75, "resgates_qtd": 200.0, "aplicacoes_valor": 150, "resgates_valor": 400,
+                "valor_ultimo": 2400, "valor_primeiro": 2060, "valor_primeiro_ant": 1000,
+                "pl_antes_resultado_periodo": 1810,
+            },
+        )
+        # período anterior: da primeira posição do fundo até data_anterior
+        self.assertEqual(
+            (d["aplicacoes_valor_ant"], d["resgates_valor_ant"], d["pl_antes_resultado_periodo_ant"]),
+            (800, 300, 1500),
+        )
+        self.assertEqual((d["aplicacoes_qtd_ant"], d["resgates_qtd_ant"]), (600.0, 226.666667))
+
+    def test_zerar_anterior(self):
+        d = gerar_dados_dmpl(self.fundo.id, date(2024, 12, 31), None, zerar_anterior=True)
+        self.assertEqual(
+            (d["aplicacoes_valor"], d["resgates_valor"], d["aplicacoes_qtd"], d["resgates_qtd"]),
+            (1800, 300, 1600.0, 226.666667),
+        )
+        self.assertEqual((d["valor_primeiro"], d["qtd_cotas_inicio"], d["valor_primeiro_ant"]), (0, 0, 0))
+        self.assertEqual((d["valor_ultimo"], d["pl_antes_resultado_periodo"]), (2060, 1500))
+
+    def test_fundo_sem_mec_zera_tudo(self):
+        outro = Fundo.objects.create(empresa=self.fundo.empresa, nome="Sem MEC", cnpj="11111111000111")
+        d = gerar_dados_dmpl(outro.id, date(2025, 12, 31), date(2024, 12, 31))
+        self.assertEqual(set(d.values()), {0})
+
+
+# =========================
+# Série histórica DPF/DRE
+# =========================
+class SerieTests(ImportacaoTestCase):
+    DATAS = (date(2024, 10, 31), date(2024, 11, 30), date(2024, 12, 31))
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        passivo = GrupoGrande.objects.create(nome="Passivo Circulante", tipo=2, ordem=1)
+        resultado = GrupoGrande.objects.create(nome="Receitas", tipo=4, ordem=1)
+        MapeamentoContas.objects.create(conta="2.1", grupo_pequeno=GrupoPequeno.objects.create(nome="Taxas", grupao=passivo))
+        MapeamentoContas.objects.create(conta="7.1", grupo_pequeno=GrupoPequeno.objects.create(nome="Rendimentos", grupao=resultado))
+        saldos = (
+            {"1.1": "1500,00", "1.2": "2499,00", "2.1": "700,00", "7.1": "300,00"},
+            {"1.1": "1800,00", "2.1": "650,00"},
+            {"1.1": "2100,00", "1.2": "600,00", "2.1": "900,00", "7.1": "1200,00"},
+        )
+        for data, saldo in zip(cls.DATAS, saldos):
+            import_balancete(fundo_id=cls.fundo.id, data_referencia=data, batch=parse_excel(_arquivo(_balancete_csv(saldo))))
+
+    def test_cada_coluna_bate_com_a_demonstracao_da_data(self):
+        datas = self.DATAS + (date(2024, 9, 30),)
+        with self.assertNumQueries(2):  # versão do plano de contas + uma consulta para todas as datas
+            serie = gerar_serie(self.fundo.id, datas)
+        self.assertEqual(serie["sem_balancete"], ["2024-09-30"])
+        self.assertEqual(serie["datas"][0], "2024-09-30")
+
+        for i, data in enumerate(sorted(datas)):
+            dpf, metricas = gerar_dados_dpf(self.fundo.id, data, None, zerar_anterior=True)
+            _, resultado, _ = gerar_dados_dre(self.fundo.id, data, None, zerar_anterior=True)
+            for secao in ("ATIVO", "PASSIVO", "PL"):
+                self.assertEqual(serie["DPF"][secao]["total"][i], dpf[secao]["TOTAL_" + secao]["ATUAL"])
+            self.assertEqual(serie["DRE"]["resultado"][i], resultado)
+            self.assertEqual(serie["fechamento"][i], metricas["FECHAMENTO_ATUAL"])
+
+        (ativo,) = serie["DPF"]["ATIVO"]["grupos"]
+        self.assertEqual(ativo["valores"], [0, 4, 2, 3])  # arredonda por grupinho antes de somar
+
+    def test_limites_de_datas(self):
+        with self.assertRaises(ValueError):
+            gerar_serie(self.fundo.id, [])
+        with self.assertRaises(ValueError):
+            gerar_serie(self.fundo.id, [date(2000, 1, 1) + timedelta(days=i) for i in range(SERIE_MAX_DATAS + 1)])
+
+
+# =========================
+# Consolidado de vários fundos
+# =========================
+class ConsolidadoTests(ImportacaoTestCase):
+    ANTERIOR = date(2023, 12, 31)
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.outro = Fundo.objects.create(empresa=cls.fundo.empresa, nome="Fundo B", cnpj="11111111000111")
+        passivo = GrupoGrande.objects.create(nome="Passivo Circulante", tipo=2, ordem=1)
+        resultado = GrupoGrande.objects.create(nome="Receitas", tipo=4, ordem=1)
+        MapeamentoContas.objects.create(conta="2.1", grupo_pequeno=GrupoPequeno.objects.create(nome="Taxas", grupao=passivo))
+        MapeamentoContas.objects.create(conta="7.1", grupo_pequeno=GrupoPequeno.objects.create(nome="Rendimentos", grupao=resultado))
+        cargas = (
+            (cls.fundo, cls.DATA, {"1.1": "1500,00", "1.2": "2499,00", "2.1": "700,00", "7.1": "300,00"}),
+            (cls.fundo, cls.ANTERIOR, {"1.1": "1000,00", "2.1": "400,00"}),
+            (cls.outro, cls.DATA, {"1.1": "5000,00", "7.1": "800,00"}),
+        )
+        for fundo, data, saldos in cargas:
+            import_balancete(fundo_id=fundo.id, data_referencia=data, batch=parse_excel(_arquivo(_balancete_csv(saldos))))
+        MecItem.objects.create(
+            fundo=cls.fundo, data_posicao=cls.ANTERIOR, aplicacao=100_000, resgate=0,
+            pl=Decimal("100000"), qtd_cotas=Decimal("100"), cota=Decimal("1000"),
+        )
+        MecItem.objects.create(
+            fundo=cls.fundo, data_posicao=cls.DATA, aplicacao=50_000, resgate=20_000,
+            pl=Decimal("132000"), qtd_cotas=Decimal("120"), cota=Decimal("1100"),
+        )
+
+    def test_coluna_de_cada_fundo_bate_com_a_pagina_do_fundo(self):
+        ids = [self.fundo.id, self.outro.id]
+        with self.assertNumQueries(3):  # versão do plano + balancetes + DMPL
+            c = gerar_consolidado(ids, self.DATA, self.ANTERIOR)
+        self.assertEqual(c["fundo_ids"], ids)
+
+        for i, fundo_id in enumerate(ids):
+            dpf, metricas = gerar_dados_dpf(fundo_id, self.DATA, self.ANTERIOR)
+            _, resultado, resultado_ant = gerar_dados_dre(fundo_id, self.DATA, self.ANTERIOR)
+            for secao in ("ATIVO", "PASSIVO", "PL"):
+                total = "TOTAL_" + secao
+                for periodo in ("ATUAL", "ANTERIOR"):
+                    self.assertEqual(c["DPF"][secao][total][periodo]["fundos"][i], dpf[secao][total][periodo])
+            self.assertEqual(c["DRE"]["RESULTADO"]["ATUAL"]["fundos"][i], resultado)
+            self.assertEqual(c["DRE"]["RESULTADO"]["ANTERIOR"]["fundos"][i], resultado_ant)
+            self.assertEqual(c["FECHAMENTO"]["ATUAL"]["fundos"][i], metricas["FECHAMENTO_ATUAL"])
+            self.assertEqual(c["DMPL"]["fundos"][i], gerar_dados_dmpl(fundo_id, self.DATA, self.ANTERIOR))
+
+    def test_consolidado_e_a_soma_das_colunas(self):
+        c = gerar_consolidado([self.fundo.id, self.outro.id], self.DATA, self.ANTERIOR)
+        (ativo,) = c["DPF"]["ATIVO"]["grupos"]
+        self.assertEqual(ativo["ATUAL"], {"fundos": [4, 5], "consolidado": 9})
+        self.assertEqual(c["DRE"]["RESULTADO"]["ATUAL"], {"fundos": [0, 1], "consolidado": 1})
+        dmpl = c["DMPL"]
+        for campo in DMPL_CAMPOS_VALOR:
+            self.assertEqual(dmpl["consolidado"][campo], sum(f[campo] for f in dmpl["fundos"]))
+        self.assertEqual(dmpl["consolidado"]["valor_ultimo"], 132)
+
+    def test_sem_fundos(self):
+        with self.assertRaises(ValueError):
+            gerar_consolidado([], self.DATA, self.ANTERIOR)
+
+
+# =========================
+# Códigos estáveis dos grupos (DFC)
+# =========================
+class CodigoGrupoTests(ImportacaoTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        passivo = GrupoGrande.objects.create(nome="Passivo Circulante", tipo=2, ordem=1)
+        cls.taxa_gestao = GrupoPequeno.objects.create(nome="Taxa de Gestão", grupao=passivo)
+        MapeamentoContas.objects.create(conta="2.1", grupo_pequeno=cls.taxa_gestao)
+
+    def test_codigo_gerado_do_nome_e_mantido_ao_renomear(self):
+        self.assertEqual(self.taxa_gestao.codigo, "taxa_de_gestao")
+        self.taxa_gestao.nome = "Taxa de gestão a pagar"
+        self.taxa_gestao.save()
+        self.taxa_gestao.refresh_from_db()
+        self.assertEqual(self.taxa_gestao.codigo, "taxa_de_gestao")
+        self.assertEqual(codigo_do_nome("(-) Provisão para operações de crédito"), "provisao_para_operacoes_de_credito")
+
+    def test_dfc_mantem_os_valores_depois_de_renomear(self):
+        self.importar({"1.1": "5000,00", "2.1": "3000,00"})
+
+        def dfc():
+            tabela, _, _ = DemonstracoesContexto(self.fundo.id, self.DATA, None, zerar_anterior=True).dfc
+            return tabela
+
+        antes = dfc()
+        self.assertEqual(antes["fluxo_operacionais"]["ajustes"]["taxa_gestao"]["ATUAL"], 3)
+        self.assertEqual(antes["caixa_final"]["ATUAL"], 5)
+
+        self.taxa_gestao.nome = "Taxa de gestão a pagar"
+        self.taxa_gestao.save()
+        GrupoGrande.objects.filter(tipo=1).update(nome="Caixa e equivalentes")
+        invalidar_plano_contas()
+        self.assertEqual(dfc(), antes)
+
+
+# =========================
+# DFC: linhas pelo código estável
+# =========================
+class DfcCodigosTests(ImportacaoTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        outros = GrupoGrande.objects.create(nome="Outros Valores", tipo=1, ordem=2)
+        passivo = GrupoGrande.objects.create(nome="Passivo Circulante", tipo=2, ordem=1)
+        receitas = GrupoGrande.objects.create(nome="Receitas", tipo=4, ordem=1)
+        despesas = GrupoGrande.objects.create(nome="Despesas", tipo=4, ordem=2)
+        GrupoGrande.objects.create(nome="Direitos Creditórios sem aquisição substancial dos riscos e benefícios", tipo=1, ordem=3)
+        GrupoGrande.objects.create(nome="Aplicações interfinanceiras de liquidez", tipo=1, ordem=4)
+        GrupoPequeno.objects.create(nome="Taxa de Gestão", grupao=passivo)
+        GrupoPequeno.objects.create(nome="(-) Provisão para operações de crédito", grupao=despesas)
+        # mesmos nomes na DPF e na DRE: o DFC precisa ler cada um na demonstração certa
+        for conta, nome, grupao in (
+            ("1.9", "Resultado com recebíveis", outros),
+            ("7.1", "Resultado com recebíveis", receitas),
+            ("2.1", "Taxa de Administração", passivo),
+            ("7.2", "Taxa de Administração", despesas),
+        ):
+            grupinho = GrupoPequeno.objects.create(nome=nome, grupao=grupao)
+            MapeamentoContas.objects.create(conta=conta, grupo_pequeno=grupinho)
+
+    def dfc(self):
+        return gerar_tabela_dfc(self.fundo.id, self.DATA, None, zerar_anterior=True)[0]
+
+    def test_codigo_repetido_em_outra_demonstracao_nao_muda_de_linha(self):
+        self.assertEqual(
+            set(GrupoPequeno.objects.filter(nome="Resultado com recebíveis").values_list("codigo", flat=True)),
+            {"resultado_com_recebiveis"},
+        )
+        self.importar({"1.1": "5000000,00", "1.9": "111000,00", "7.1": "222000,00", "2.1": "33000,00", "7.2": "-44000,00"})
+
+        dfc = self.dfc()
+        self.assertEqual(dfc["fluxo_operacionais"]["ajustes"]["rendimento_dc"]["ATUAL"], -222)
+        self.assertEqual(dfc["fluxo_operacionais"]["ajustes"]["taxa_adm"]["ATUAL"], 33)
+        self.assertEqual(dfc["caixa_final"]["ATUAL"], 5000)
+
+    def test_renomear_grupo_mantem_a_linha(self):
+        self.importar({"1.1": "5000000,00", "2.1": "33000,00"})
+        for grupo in (GrupoGrande.objects.get(nome="Disponibilidades"), GrupoPequeno.objects.get(nome="Taxa de Administração", grupao__tipo=2)):
+            grupo.nome += " (renomeado)"
+            grupo.save()
+
+        dfc = self.dfc()
+        self.assertEqual(dfc["fluxo_operacionais"]["ajustes"]["taxa_adm"]["ATUAL"], 33)
+        self.assertEqual(dfc["caixa_final"]["ATUAL"], 5000)
+
+    def test_codigo_inexistente_avisa_uma_vez(self):
+        arvore = DemonstracoesContexto(self.fundo.id, self.DATA, None, zerar_anterior=True).arvore
+        with self.assertLogs("core.processing.demonstracoes", level="WARNING") as logs:
+            self.assertEqual(arvore.grupinho("codigo_que_nao_existe", (4,)), (0, 0))
+            self.assertEqual(arvore.grupinho("codigo_que_nao_existe", (4,)), (0, 0))
+        self.assertEqual(len(logs.output), 1)
@@ -0,0 +1,411 @@
+# core/upload/batch_upload.py
+from __future__ import annotations
+
+from calendar import monthrange
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from datetime import date
+from itertools import chain, islice
+from time import perf_counter
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import hashlib
+import io
+import os
+import re
+import zipfile
+import numpy as np
+import pandas as pd
+
+from core.upload.balancete_parser import (
+    BALANCETE_SCHEMA,
+    BalanceteSchemaError,
+    iter_excel_batches,
+)
+from core.upload.batches import BalanceteBatch, ColumnarBatch, MecBatch, RejectedRow
+from core.upload.chunked_reader import (
+    DEFAULT_CHUNK_SIZE,
+    FileFingerprint,
+    fingerprint_bytes,
+    is_csv,
+    iter_dataframes,
+    sniff_csv,
+)
+from core.upload.conversao import infer_date_format, is_text, to_date_series
+from core.upload.mec_parser import MEC_SCHEMA, MecSchemaError, iter_excel_mec_batches
+from core.upload.schema import FileSchema, UploadSchemaError, register_schema
+
+TIPO_BALANCETE = "balancete"
+TIPO_MEC = "mec"
+
+EXTENSOES_ACEITAS = (".xlsx", ".xls", ".csv")
+
+
+# =========================
+# Esquemas consolidados (vários fundos em uma planilha)
+# =========================
+CNPJ = "CNPJ"
+DATAREFERENCIA = "DATAREFERENCIA"
+
+_CNPJ_ALIASES = ("CNPJ", "CNPJ FUNDO", "CNPJ DO FUNDO", "DOC FUNDO")
+_DATAREFERENCIA_ALIASES = (
+    "DATA REFERENCIA", "DT REFERENCIA", "DATA BASE", "DATA BALANCETE", "COMPETENCIA", "DATA",
+)
+
+BALANCETE_CONSOLIDADO_SCHEMA = register_schema(FileSchema(
+    nome="balancete_consolidado",
+    columns=BALANCETE_SCHEMA.columns + (
+        (CNPJ, _CNPJ_ALIASES),
+        (DATAREFERENCIA, _DATAREFERENCIA_ALIASES),
+    ),
+    required=BALANCETE_SCHEMA.required + (CNPJ, DATAREFERENCIA),
+    error_cls=BalanceteSchemaError,
+    numeric=BALANCETE_SCHEMA.numeric,
+))
+
+MEC_CONSOLIDADO_SCHEMA = register_schema(FileSchema(
+    nome="mec_consolidado",
+    columns=MEC_SCHEMA.columns + ((CNPJ, _CNPJ_ALIASES),),
+    required=MEC_SCHEMA.required + (CNPJ,),
+    error_cls=MecSchemaError,
+    numeric=MEC_SCHEMA.numeric,
+))
+
+
+# =========================
+# Resultado do parse de um arquivo
+# =========================
+@dataclass(frozen=True)
+class ParsedFile:
+    """
+    Lote pronto para importar, já associado a um CNPJ (e à data, no balancete).
+    Uma planilha consolidada gera um ParsedFile por (CNPJ, data).
+    """
+    arquivo: str
+    tipo: Optional[str] = None          # TIPO_BALANCETE | TIPO_MEC
+    cnpj: Optional[str] = None          # só dígitos
+    data_referencia: Optional[date] = None
+    batch: Optional[ColumnarBatch] = None
+    erro: Optional[str] = None
+    arquivo_hash: Optional[FileFingerprint] = None
+    duracao_leitura: float = 0.0  # segundos gastos no parse do arquivo
+
+
+# =========================
+# Identificação pelo nome do arquivo
+# =========================
+_CNPJ_RE = re.compile(r"(?<!\d)(\d{2})[.\s_-]?(\d{3})[.\s_-]?(\d{3})[\s_-]?(\d{4})[\s_-]?(\d{2})(?!\d)")
+_DATA_RES = (
+    # (regex, grupos -> (ano, mês, dia)); dia None = último dia do mês
+    (re.compile(r"(?<!\d)(\d{4})[-_.]?(\d{2})[-_.]?(\d{2})(?!\d)"), lambda g: (g[0], g[1], g[2])),
+    (re.compile(r"(?<!\d)(\d{2})[-_.]?(\d{2})[-_.]?(\d{4})(?!\d)"), lambda g: (g[2], g[1], g[0])),
+    (re.compile(r"(?<!\d)(\d{4})[-_.]?(\d{2})(?!\d)"), lambda g: (g[0], g[1], None)),
+    (re.compile(r"(?<!\d)(\d{2})[-_.](\d{4})(?!\d)"), lambda g: (g[1], g[0], None)),
+)
+
+
+def normalize_cnpj(valor) -> Optional[str]:
+    """CNPJ só com dígitos (14 posições), aceitando número vindo do XLSX."""
+    if valor is None or (isinstance(valor, float) and valor != valor):
+        return None
+    if isinstance(valor, (int, float, np.integer, np.floating)):
+        return f"{int(valor):014d}"
+    digitos = re.sub(r"\D", "", str(valor))
+    if not digitos or len(digitos) > 14:
+        return None
+    return digitos.zfill(14)
+
+
+def cnpj_from_filename(nome: str) -> Optional[str]:
+    m = _CNPJ_RE.search(os.path.basename(nome))
+    return "".join(m.groups()) if m else None
+
+
+def date_from_filename(nome: str) -> Optional[date]:
+    """
+    Data de referência no nome do arquivo (AAAA-MM-DD, DD-MM-AAAA, AAAAMMDD,
+    AAAA-MM, MM-AAAA...). Competência sem dia vira o último dia do mês.
+    """
+    base = _CNPJ_RE.sub(" ", os.path.basename(nome))
+    for regex, partes in _DATA_RES:
+        for m in regex.finditer(base):
+            ano, mes, dia = (int(p) if p is not None else None for p in partes(m.groups()))
+            if not 1900 <= ano <= 2100 or not 1 <= mes <= 12:
+                continue
+            try:
+                return date(ano, mes, dia or monthrange(ano, mes)[1])
+            except ValueError:
+                continue
+    return None
+
+
+# =========================
+# Leitura do upload (ZIP ou arquivo único)
+# =========================
+def _is_zip_upload(file_obj, nome: str) -> bool:
+    # XLSX também é um ZIP: só tratamos como pacote o que não for planilha
+    if nome.lower().endswith(EXTENSOES_ACEITAS):
+        return False
+    file_obj.seek(0)
+    if not zipfile.is_zipfile(file_obj):
+        return False
+    file_obj.seek(0)
+    with zipfile.ZipFile(file_obj) as zf:
+        return "[Content_Types].xml" not in zf.namelist()
+
+
+def iter_upload_files(file_obj, nome: Optional[str] = None) -> Iterator[Tuple[str, bytes]]:
+    """
+    Entrega (nome, conteúdo) de cada planilha do upload: os membros de um ZIP
+    (ignorando pastas, arquivos ocultos/temporários e extensões não aceitas)
+    ou o próprio arquivo, quando não for ZIP. `nome` é o nome original do
+    envio (padrão: file_obj.name; no worker, o nome no storage é outro).
+    """
+    nome = nome or getattr(file_obj, "name", "") or "arquivo"
+    if not _is_zip_upload(file_obj, nome):
+        file_obj.seek(0)
+        yield nome, file_obj.read()
+        return
+
+    file_obj.seek(0)
+    with zipfile.ZipFile(file_obj) as zf:
+        for info in zf.infolist():
+            base = os.path.basename(info.filename)
+            if info.is_dir() or info.filename.startswith("__MACOSX/") or base.startswith((".", "~$")):
+                continue
+            if not base.lower().endswith(EXTENSOES_ACEITAS):
+                continue
+            yield info.filename, zf.read(info)
+
+
+# =========================
+# Parse (roda nos processos do pool)
+# =========================
+def _group_positions(*chaves: Sequence) -> Dict[Tuple, np.ndarray]:
+    """Posições do lote agrupadas por chave (uma lista de valores por linha)."""
+    grupos: Dict[Tuple, List[int]] = {}
+    for pos, chave in enumerate(zip(*chaves)):
+        grupos.setdefault(chave, []).append(pos)
+    return {chave: np.asarray(posicoes, dtype="int64") for chave, posicoes in grupos.items()}
+
+
+def _cnpjs(serie: pd.Series) -> List[Optional[str]]:
+    # CNPJs se repetem muito: normaliza só os valores distintos
+    mapa = {v: normalize_cnpj(v) for v in pd.unique(serie)}
+    return [mapa[v] for v in serie.tolist()]
+
+
+def _parse_balancete(nome: str, arquivo, chunk_size: int) -> List[ParsedFile]:
+    batches = list(iter_excel_batches(arquivo, chunk_size=chunk_size))
+    return [ParsedFile(
+        arquivo=nome,
+        tipo=TIPO_BALANCETE,
+        cnpj=cnpj_from_filename(nome),
+        data_referencia=date_from_filename(nome),
+        batch=BalanceteBatch.concat(batches),
+    )]
+
+
+def _parse_mec(nome: str, arquivo, chunk_size: int) -> List[ParsedFile]:
+    batches = list(iter_excel_mec_batches(arquivo, chunk_size=chunk_size))
+    return [ParsedFile(
+        arquivo=nome,
+        tipo=TIPO_MEC,
+        cnpj=cnpj_from_filename(nome),
+        batch=MecBatch.concat(batches),
+    )]
+
+
+def _parse_balancete_consolidado(nome: str, arquivo, chunk_size: int) -> List[ParsedFile]:
+    grupos: Dict[Tuple, List[BalanceteBatch]] = {}
+    formato_data: Optional[str] = None
+
+    for batch in iter_excel_batches(arquivo, chunk_size=chunk_size, schema=BALANCETE_CONSOLIDADO_SCHEMA):
+        col_data = batch.origem[DATAREFERENCIA]
+        if formato_data is None:
+            formato_data = infer_date_format(col_data[is_text(col_data)].head(50).tolist())
+        datas = [d.date() if not pd.isna(d) else None for d in to_date_series(col_data, formato_data)]
+        for chave, posicoes in _group_positions(_cnpjs(batch.origem[CNPJ]), datas).items():
+            grupos.setdefault(chave, []).append(batch.take(posicoes))
+
+    return [
+        ParsedFile(
+            arquivo=nome,
+            tipo=TIPO_BALANCETE,
+            cnpj=cnpj,
+            data_referencia=data_ref,
+            batch=BalanceteBatch.concat(partes),
+            erro=None if cnpj and data_ref else "Linhas sem CNPJ ou data de referência válidos.",
+        )
+        for (cnpj, data_ref), partes in grupos.items()
+    ]
+
+
+def _parse_mec_consolidado(nome: str, arquivo, chunk_size: int) -> List[ParsedFile]:
+    grupos: Dict[Optional[str], List[MecBatch]] = {}
+    rejeicoes: Dict[Optional[str], List[RejectedRow]] = {}
+
+    for batch in iter_excel_mec_batches(arquivo, chunk_size=chunk_size, schema=MEC_CONSOLIDADO_SCHEMA):
+        for (cnpj,), posicoes in _group_positions(_cnpjs(batch.origem[CNPJ])).items():
+            grupos.setdefault(cnpj, []).append(batch.take(posicoes))
+        # rejeições do parser seguem o CNPJ da própria linha
+        for rej in batch.rejeicoes:
+            rejeicoes.setdefault(normalize_cnpj(rej.raw.get(CNPJ)), []).append(rej)
+
+    return [
+        ParsedFile(
+            arquivo=nome,
+            tipo=TIPO_MEC,
+            cnpj=cnpj,
+            batch=replace(MecBatch.concat(grupos.get(cnpj, [])), rejeicoes=tuple(rejeicoes.get(cnpj, ()))),
+            erro=None if cnpj else "Linhas sem CNPJ válido.",
+        )
+        for cnpj in dict.fromkeys([*grupos, *rejeicoes])
+    ]
+
+
+def _sha256_linhas(batch: ColumnarBatch) -> str:
+    """
+    SHA-256 das linhas de um grupo da planilha consolidada (colunas
+    canônicas, sem a posição no arquivo, mais as linhas rejeitadas): alterar
+    um fundo/data na planilha não muda o hash dos demais grupos.
+    """
+    h = hashlib.sha256()
+    h.update("\x1f".join(map(str, batch.origem.columns)).encode())
+    h.update(pd.util.hash_pandas_object(batch.origem, index=False).to_numpy().tobytes())
+    for rej in getattr(batch, "rejeicoes", ()):
+        h.update(f"\x1e{rej.reason}\x1f{sorted(rej.raw.items(), key=str)}".encode())
+    return h.hexdigest()
+
+
+Parser = Callable[[str, object, int], List[ParsedFile]]
+
+# Ordem de preferência: os layouts consolidados exigem mais colunas, então vêm antes
+_PARSERS: Tuple[Tuple[str, Parser, FileSchema], ...] = (
+    (TIPO_BALANCETE, _parse_balancete_consolidado, BALANCETE_CONSOLIDADO_SCHEMA),
+    (TIPO_MEC, _parse_mec_consolidado, MEC_CONSOLIDADO_SCHEMA),
+    (TIPO_BALANCETE, _parse_balancete, BALANCETE_SCHEMA),
+    (TIPO_MEC, _parse_mec, MEC_SCHEMA),
+)
+_CONSOLIDADOS = (_parse_balancete_consolidado, _parse_mec_consolidado)
+
+
+def _parsers_para(nome: str) -> List[Tuple[Parser, FileSchema]]:
+    """Parsers na ordem de preferência; o nome do arquivo ('MEC') só muda a prioridade."""
+    primeiro = TIPO_MEC if "MEC" in os.path.basename(nome).upper() else TIPO_BALANCETE
+    return (
+        [(p, schema) for tipo, p, schema in _PARSERS if tipo == primeiro]
+        + [(p, schema) for tipo, p, schema in _PARSERS if tipo != primeiro]
+    )
+
+
+def _nota_cabecalho(colunas: List[str]) -> int:
+    # no XLSX, o cabeçalho é a linha que melhor casa com algum dos layouts
+    return max(schema.score(colunas) for _, _, schema in _PARSERS)
+
+
+def _cabecalho(arquivo) -> List[str]:
+    """Colunas do cabeçalho, lendo só o início do arquivo (uma linha de dados)."""
+    dialect = sniff_csv(arquivo) if is_csv(arquivo) else None
+    frames = iter_dataframes(arquivo, chunk_size=1, dialect=dialect, header_score=_nota_cabecalho)
+    try:
+        return list(next(frames).columns)
+    finally:
+        frames.close()
+
+
+def _parser_pelo_cabecalho(nome: str, colunas: List[str]) -> Tuple[Optional[Parser], List[str]]:
+    """
+    Primeiro parser (na ordem de preferência) cujo esquema tem todas as
+    colunas obrigatórias no cabeçalho. Sem nenhum, devolve as colunas que
+    faltam no layout mais próximo.
+    """
+    faltando: Optional[List[str]] = None
+    for parser, schema in _parsers_para(nome):
+        try:
+            schema.validate(colunas)
+        except UploadSchemaError as e:
+            if faltando is None or len(e.missing_columns) < len(faltando):
+                faltando = e.missing_columns
+            continue
+        return parser, []
+    return None, faltando or []
+
+
+def _layout_nao_reconhecido(nome: str, faltando: Sequence[str]) -> ParsedFile:
+    return ParsedFile(
+        arquivo=nome,
+        erro=f"Layout não reconhecido como balancete nem MEC: faltam colunas {', '.join(faltando)}.",
+    )
+
+
+def parse_upload_file(nome: str, conteudo: bytes, chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[ParsedFile]:
+    """
+    Identifica o layout do arquivo pelo cabeçalho (balancete/MEC, individual
+    ou consolidado) e devolve os lotes prontos para importar. O layout é
+    escolhido uma vez, lendo só o cabeçalho; o arquivo é percorrido por um
+    único parser. Nunca levanta: falhas viram ParsedFile com `erro`, para
+    não derrubar o lote inteiro.
+    """
+    inicio = perf_counter()
+    arquivo = io.BytesIO(conteudo)
+    arquivo.name = os.path.basename(nome)
+    try:
+        parser, faltando = _parser_pelo_cabecalho(nome, _cabecalho(arquivo))
+        if parser is None:
+            return [_layout_nao_reconhecido(nome, faltando)]
+        parsed = parser(nome, arquivo, chunk_size)
+    except UploadSchemaError as e:
+        return [_layout_nao_reconhecido(nome, e.missing_columns)]
+    except Exception as e:
+        return [ParsedFile(arquivo=nome, erro=f"Erro ao ler arquivo: {e}")]
+    duracao = perf_counter() - inicio
+    inteiro = fingerprint_bytes(nome, conteudo)
+
+    def _hash(p: ParsedFile) -> FileFingerprint:
+        # consolidada: cada (CNPJ, data) é registrado em ImportBatch com o hash das suas linhas
+        if parser in _CONSOLIDADOS:
+            return replace(inteiro, sha256=_sha256_linhas(p.batch))
+        return inteiro
+
+    return [replace(p, arquivo_hash=_hash(p), duracao_leitura=duracao) for p in parsed]
+
+
+def parse_uploads(
+    arquivos: Iterable[Tuple[str, bytes]],
+    *,
+    max_workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[ParsedFile]:
+    """
+    Faz o parse de vários arquivos em paralelo (ProcessPoolExecutor). O parse
+    é CPU-bound (pandas/openpyxl), então processos escalam onde threads não
+    escalariam; só os lotes colunares voltam ao processo principal, que
+    cuida do banco. Com um arquivo (ou max_workers <= 1) roda no próprio
+    processo.
+
+    `arquivos` é consumido sob demanda (ex.: iter_upload_files lendo os
+    membros do ZIP): no máximo 2 * max_workers arquivos ficam em memória
+    entre fila e parse. Os resultados saem na ordem de entrada, assim que
+    prontos, então o chamador grava um arquivo enquanto os seguintes ainda
+    estão em parse.
+    """
+    arquivos = iter(arquivos)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    primeiros = list(islice(arquivos, 2))
+    if max_workers <= 1 or len(primeiros) < 2:
+        for nome, conteudo in chain(primeiros, arquivos):
+            yield from parse_upload_file(nome, conteudo, chunk_size)
+        return
+
+    limite = 2 * max_workers
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        pendentes: Deque[Future] = deque()
+        for nome, conteudo in chain(primeiros, arquivos):
+            pendentes.append(pool.submit(parse_upload_file, nome, conteudo, chunk_size))
+            if len(pendentes) >= limite:
+                yield from pendentes.popleft().result()
+        while pendentes:
+            yield from pendentes.popleft().result()
@@ -0,0 +1,106 @@
+# core/upload/batches.py
+from __future__ import annotations
+
+from dataclasses import MISSING, dataclass, field, fields
+from typing import Dict, List, Sequence, Tuple, Type, TypeVar
+import numpy as np
+import pandas as pd
+
+B = TypeVar("B", bound="ColumnarBatch")
+
+
+@dataclass(frozen=True)
+class RejectedRow:
+    """Linha descartada pelo parser, com o motivo (vira ImportReport.errors)."""
+    row_index: int
+    reason: str
+    raw: Dict
+
+
+# =========================
+# Lote colunar (saída dos parsers)
+# =========================
+@dataclass(frozen=True, eq=False)
+class ColumnarBatch:
+    """
+    Lote de linhas já convertidas, guardado por colunas (arrays NumPy) em vez
+    de um objeto Python por linha.
+
+    - linhas: posição de cada linha no arquivo (0 = primeira linha de dados)
+    - origem: DataFrame de origem (colunas canônicas), alinhado aos arrays; só é
+      convertido em dict, via raw(), para as linhas que viram erro no import
+    """
+    linhas: np.ndarray
+    origem: pd.DataFrame = field(repr=False)
+
+    def __len__(self) -> int:
+        return len(self.linhas)
+
+    def raw(self, pos: int) -> Dict:
+        """Linha original (debug/erros) da posição `pos` do lote."""
+        return self.origem.iloc[pos].to_dict()
+
+    def take(self: B, posicoes: np.ndarray) -> B:
+        """
+        Sub-lote com as posições indicadas. Campos tupla (ex.: rejeicoes) não
+        são alinhados às linhas e voltam vazios; quem divide o lote decide
+        para onde eles vão (ver dataclasses.replace).
+        """
+        valores = {}
+        for f in fields(self):
+            atual = getattr(self, f.name)
+            if isinstance(atual, pd.DataFrame):
+                valores[f.name] = atual.iloc[posicoes]
+            elif isinstance(atual, tuple):
+                valores[f.name] = ()
+            else:
+                valores[f.name] = atual[posicoes]
+        return type(self)(**valores)
+
+    @classmethod
+    def concat(cls: Type[B], batches: Sequence[B]) -> B:
+        """Junta vários lotes em um só (usado pelas APIs não-streaming)."""
+        if not batches:
+            return cls.empty()
+        valores = {}
+        for f in fields(cls):
+            partes = [getattr(b, f.name) for b in batches]
+            if isinstance(partes[0], pd.DataFrame):
+                valores[f.name] = pd.concat(partes)
+            elif isinstance(partes[0], tuple):
+                valores[f.name] = tuple(item for parte in partes for item in parte)
+            else:
+                valores[f.name] = np.concatenate(partes)
+        return cls(**valores)
+
+    @classmethod
+    def empty(cls: Type[B]) -> B:
+        valores = {}
+        for f in fields(cls):
+            if f.default is not MISSING:
+                continue
+            valores[f.name] = pd.DataFrame(dtype=object) if f.name == "origem" else np.array([])
+        return cls(**valores)
+
+
+@dataclass(frozen=True, eq=False)
+class BalanceteBatch(ColumnarBatch):
+    contas: np.ndarray
+    saldo_atual: np.ndarray  # NaN = vazio/inválido
+
+
+@dataclass(frozen=True, eq=False)
+class MecBatch(ColumnarBatch):
+    datas: np.ndarray
+    aplicacao: np.ndarray
+    resgate: np.ndarray
+    estorno: np.ndarray
+    pl: np.ndarray
+    qtd_cotas: np.ndarray
+    cota: np.ndarray
+    rejeicoes: Tuple[RejectedRow, ...] = ()  # linhas descartadas pelo parser
+
+
+def optional_floats(values: np.ndarray) -> List:
+    """Converte um array float64 em lista Python com None no lugar de NaN."""
+    return [None if v != v else v for v in values.tolist()]
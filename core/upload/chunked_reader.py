@@ -0,0 +1,269 @@
+# core/upload/chunked_reader.py
+from __future__ import annotations
+
+import codecs
+import csv
+import hashlib
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Sequence
+import pandas as pd
+
+from core.upload.xlsx_reader import HeaderScore, iter_xlsx_frames
+
+# Quantidade de linhas por lote entregue aos parsers/importadores
+DEFAULT_CHUNK_SIZE = 20_000
+
+# Bloco de leitura usado no cálculo do hash do arquivo
+_HASH_BLOCK = 1024 * 1024
+
+# Bytes inspecionados no início do CSV para decidir encoding/separador/decimal
+_SNIFF_BYTES = 32 * 1024
+_SNIFF_MAX_LINES = 50
+_DELIMITADORES = (";", ",", "\t", "|")
+
+# Números "1.234,56" / "1234,5" (PT-BR) vs "1,234.56" / "1234.50" (EN)
+_RE_DECIMAL_VIRGULA = re.compile(r"^-?\(?\d{1,3}(\.\d{3})*,\d+\)?$|^-?\d+,\d+$")
+_RE_DECIMAL_PONTO = re.compile(r"^-?\(?\d{1,3}(,\d{3})*\.\d+\)?$|^-?\d+\.\d{1,2}$")
+
+
+
+
+def _latin1_fallback(exc: UnicodeError):
+    """
+    Handler de erro de decodificação: bytes que não são UTF-8 válido (ex.: um
+    trecho Latin1 depois da amostra inspecionada) são lidos como Latin1, sem
+    precisar reprocessar o arquivo inteiro com outro encoding.
+    """
+    if isinstance(exc, UnicodeDecodeError):
+        return exc.object[exc.start:exc.end].decode("latin1"), exc.end
+    raise exc
+
+
+_ENCODING_ERRORS = "cinnamon_latin1_fallback"
+codecs.register_error(_ENCODING_ERRORS, _latin1_fallback)
+
+
+# =========================
+# Identificação do arquivo (hash do conteúdo)
+# =========================
+@dataclass(frozen=True)
+class FileFingerprint:
+    sha256: str
+    nome: str = ""
+    tamanho: int = 0
+
+
+def fingerprint_bytes(nome: str, conteudo: bytes) -> FileFingerprint:
+    return FileFingerprint(
+        sha256=hashlib.sha256(conteudo).hexdigest(),
+        nome=os.path.basename(nome or ""),
+        tamanho=len(conteudo),
+    )
+
+
+def fingerprint(file_obj) -> FileFingerprint:
+    """SHA-256 do conteúdo enviado, lido em blocos (o arquivo volta ao início)."""
+    h = hashlib.sha256()
+    tamanho = 0
+    file_obj.seek(0)
+    for bloco in iter(lambda: file_obj.read(_HASH_BLOCK), b""):
+        h.update(bloco)
+        tamanho += len(bloco)
+    file_obj.seek(0)
+    return FileFingerprint(
+        sha256=h.hexdigest(),
+        nome=os.path.basename(getattr(file_obj, "name", "") or ""),
+        tamanho=tamanho,
+    )
+
+
+# =========================
+# Dialeto detectado
+# =========================
+@dataclass(frozen=True)
+class CsvDialect:
+    encoding: str
+    sep: Optional[str]  # None => não foi possível detectar (usa o sniffer do engine python)
+    decimal: str = ","
+
+
+def is_csv(file_obj) -> bool:
+    name = getattr(file_obj, "name", "") or ""
+    return name.lower().endswith(".csv")
+
+
+def _is_legacy_xls(file_obj) -> bool:
+    name = getattr(file_obj, "name", "") or ""
+    return name.lower().endswith(".xls")
+
+
+def _sniff_encoding(head: bytes, truncated: bool) -> str:
+    """UTF-8 (com ou sem BOM) se a amostra decodifica; senão Latin1 (ISO-8859-1)."""
+    if head.startswith(b"\xef\xbb\xbf"):
+        return "utf-8-sig"
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # Caractere multibyte cortado no fim da amostra não conta como erro
+        if not (truncated and e.reason == "unexpected end of data"):
+            return "latin1"
+    return "utf-8"
+
+
+def _sniff_sep(linhas: List[str]) -> Optional[str]:
+    """
+    Escolhe o separador cujo cabeçalho tem mais de uma coluna e cuja contagem
+    de campos se repete de forma consistente nas linhas seguintes
+    (respeitando aspas, via csv.reader).
+    """
+    melhor, melhor_nota = None, (0.0, 0)
+    for sep in _DELIMITADORES:
+        contagens = [len(campos) for campos in csv.reader(linhas, delimiter=sep)]
+        if not contagens or contagens[0] < 2:
+            continue
+        consistencia = sum(1 for c in contagens if c == contagens[0]) / len(contagens)
+        nota = (consistencia, contagens[0])
+        if consistencia >= 0.9 and nota > melhor_nota:
+            melhor, melhor_nota = sep, nota
+    return melhor
+
+
+# Ponto só vence com folga: na dúvida, o padrão PT-BR (vírgula)
+_PONTO_VANTAGEM = 3
+
+# cabeçalho -> posições das colunas numéricas (ver FileSchema.numeric_positions)
+ColunasNumericas = Callable[[Sequence[str]], List[int]]
+
+
+def _sniff_decimal(linhas: List[str], sep: Optional[str], colunas_numericas: Optional[ColunasNumericas] = None) -> str:
+    """
+    Vota entre vírgula e ponto decimal olhando os valores da amostra. Com
+    `colunas_numericas`, só as colunas de valor votam: códigos de conta como
+    "1.1" ou "7.1" parecem decimais com ponto e virariam o arquivo inteiro.
+    """
+    if sep is None or not linhas:
+        return ","
+    registros = list(csv.reader(linhas, delimiter=sep))
+    posicoes = None
+    if colunas_numericas is not None:
+        posicoes = colunas_numericas([c.strip() for c in registros[0]])
+        if not posicoes:
+            return ","
+    votos: Counter = Counter()
+    for campos in registros[1:]:
+        valores = campos if posicoes is None else [campos[i] for i in posicoes if i < len(campos)]
+        for campo in valores:
+            campo = campo.strip()
+            if _RE_DECIMAL_VIRGULA.match(campo):
+                votos[","] += 1
+            elif _RE_DECIMAL_PONTO.match(campo):
+                votos["."] += 1
+    if votos["."] and votos["."] >= _PONTO_VANTAGEM * votos[","]:
+        return "."
+    return ","
+
+
+def sniff_csv(file_obj, colunas_numericas: Optional[ColunasNumericas] = None) -> CsvDialect:
+    """
+    Inspeciona só os primeiros KB do arquivo para decidir encoding,
+    separador e convenção decimal. Rebobina o arquivo ao final.
+    `colunas_numericas` restringe o voto do decimal às colunas de valor.
+    """
+    file_obj.seek(0)
+    head = file_obj.read(_SNIFF_BYTES)
+    file_obj.seek(0)
+
+    truncated = len(head) == _SNIFF_BYTES
+    encoding = _sniff_encoding(head, truncated)
+    texto = head.decode(encoding, errors="replace")
+    linhas = texto.splitlines()
+    if truncated and len(linhas) > 1:
+        linhas = linhas[:-1]  # última linha provavelmente cortada
+    linhas = [ln for ln in linhas[:_SNIFF_MAX_LINES] if ln.strip()]
+
+    sep = _sniff_sep(linhas)
+    return CsvDialect(encoding=encoding, sep=sep, decimal=_sniff_decimal(linhas, sep, colunas_numericas))
+
+
+def _read_csv_chunks(file_obj, dialect: CsvDialect, chunk_size: int, *, skip: int = 0):
+    file_obj.seek(0)
+    if dialect.sep is None:
+        # Arquivo "estranho": mesmo caminho de antes (sniffer do engine python)
+        opts = {"sep": None, "engine": "python"}
+    else:
+        opts = {"sep": dialect.sep, "engine": "c"}
+    return pd.read_csv(
+        file_obj,
+        dtype=object,
+        encoding=dialect.encoding,
+        encoding_errors=_ENCODING_ERRORS,
+        skiprows=range(1, skip + 1) if skip else None,
+        chunksize=chunk_size,
+        **opts,
+    )
+
+
+def _iter_csv(file_obj, dialect: CsvDialect, chunk_size: int) -> Iterator[pd.DataFrame]:
+    entregues = 0
+    entregou_lote = False
+    try:
+        with _read_csv_chunks(file_obj, dialect, chunk_size) as reader:
+            for chunk in reader:
+                entregues += len(chunk)
+                entregou_lote = True
+                yield chunk
+    except pd.errors.ParserError:
+        if dialect.sep is None:
+            raise
+        # Engine C recusou o arquivo (linhas irregulares, aspas quebradas...):
+        # retoma do ponto onde parou com o engine python, como era antes.
+        fallback = CsvDialect(encoding=dialect.encoding, sep=None, decimal=dialect.decimal)
+        deslocamento = entregues
+        with _read_csv_chunks(file_obj, fallback, chunk_size, skip=entregues) as reader:
+            for chunk in reader:
+                # o novo reader numera a partir de 0: mantém o índice (linha) do arquivo original
+                chunk.index = chunk.index + deslocamento
+                entregues += len(chunk)
+                entregou_lote = True
+                yield chunk
+    if not entregou_lote:
+        yield pd.DataFrame(dtype=object)
+
+
+def iter_dataframes(
+    file_obj,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    dialect: Optional[CsvDialect] = None,
+    header_score: Optional[HeaderScore] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Lê XLSX ou CSV em lotes de até `chunk_size` linhas (dtype=object, colunas originais).
+
+    - CSV: lido direto do arquivo enviado em blocos, com o engine C e o
+      dialeto detectado por sniff_csv (ou o informado em `dialect`).
+    - XLSX: linhas lidas em streaming (openpyxl read_only); o cabeçalho é
+      localizado com `header_score` (ver xlsx_reader.iter_xlsx_frames).
+    - XLS legado: carregado inteiro via pd.read_excel e fatiado.
+
+    Sempre entrega ao menos um DataFrame (possivelmente vazio) para que o
+    chamador consiga validar o cabeçalho.
+    """
+    file_obj.seek(0)
+
+    if is_csv(file_obj):
+        yield from _iter_csv(file_obj, dialect or sniff_csv(file_obj), chunk_size)
+        return
+
+    if not _is_legacy_xls(file_obj):
+        yield from iter_xlsx_frames(file_obj, chunk_size, header_score=header_score)
+        return
+
+    df = pd.read_excel(file_obj, dtype=object)
+    if df.empty:
+        yield df
+        return
+    for inicio in range(0, len(df), chunk_size):
+        yield df.iloc[inicio:inicio + chunk_size]
@@ -0,0 +1,96 @@
+# core/upload/conversao.py
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Optional, Sequence
+import numpy as np
+import pandas as pd
+
+# Formatos de data aceitos nos arquivos (testados nesta ordem: dia primeiro)
+DATE_FORMATS = (
+    "%d/%m/%Y",
+    "%d/%m/%y",
+    "%Y-%m-%d",
+    "%d-%m-%Y",
+    "%d.%m.%Y",
+    "%Y/%m/%d",
+    "%d/%m/%Y %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S",
+)
+_DATE_SAMPLE = 50
+
+
+def is_text(serie: pd.Series) -> pd.Series:
+    """Máscara das células que são strings (o resto veio tipado do XLSX ou é vazio)."""
+    return serie.map(type).eq(str)
+
+
+def to_float_series(serie: pd.Series, decimal: str = ",") -> pd.Series:
+    """
+    Versão vetorizada da conversão numérica (uma passada na coluna inteira):
+    - strings PT-BR: remove milhar "." e troca decimal "," por "."
+      (com decimal=".", remove o milhar "," e mantém o ponto)
+    - strings vazias / não numéricas -> NaN
+    - valores já numéricos (vindos do XLSX) são mantidos
+    """
+    milhar = "." if decimal == "," else ","
+    eh_texto = is_text(serie)
+
+    convertido = pd.Series(np.nan, index=serie.index, dtype="float64")
+    if eh_texto.any():
+        normalizado = (
+            serie[eh_texto]
+            .astype(str)
+            .str.strip()
+            .str.replace(milhar, "", regex=False)
+            .str.replace(decimal, ".", regex=False)
+        )
+        convertido[eh_texto] = pd.to_numeric(normalizado, errors="coerce")
+    if (~eh_texto).any():
+        convertido[~eh_texto] = pd.to_numeric(serie[~eh_texto], errors="coerce")
+    return convertido
+
+
+def infer_date_format(amostra: Sequence[str]) -> Optional[str]:
+    """Primeiro formato de DATE_FORMATS que interpreta toda a amostra (ou None)."""
+    amostra = [v.strip() for v in amostra if v and v.strip()][:_DATE_SAMPLE]
+    if not amostra:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            for v in amostra:
+                datetime.strptime(v, fmt)
+        except ValueError:
+            continue
+        return fmt
+    return None
+
+
+def to_date_series(serie: pd.Series, formato: Optional[str] = None) -> pd.Series:
+    """
+    Converte a coluna inteira para datetime64 (NaT quando não interpretável).
+
+    Strings usam `formato` (ver infer_date_format) em uma única chamada
+    vetorizada; o que não casar com ele tenta os demais DATE_FORMATS e, por
+    fim, um parse dayfirst genérico. Células já tipadas (datetime do XLSX)
+    são convertidas direto.
+    """
+    eh_texto = is_text(serie)
+    convertido = pd.Series(pd.NaT, index=serie.index, dtype="datetime64[ns]")
+
+    if eh_texto.any():
+        texto = serie[eh_texto].astype(str).str.strip()
+        datas = pd.Series(pd.NaT, index=texto.index, dtype="datetime64[ns]")
+        formatos = ((formato,) if formato else ()) + tuple(f for f in DATE_FORMATS if f != formato)
+        for fmt in formatos:
+            pendentes = datas.isna() & (texto != "")
+            if not pendentes.any():
+                break
+            datas[pendentes] = pd.to_datetime(texto[pendentes], format=fmt, errors="coerce")
+        pendentes = datas.isna() & (texto != "")
+        if pendentes.any():
+            datas[pendentes] = pd.to_datetime(texto[pendentes], dayfirst=True, format="mixed", errors="coerce")
+        convertido[eh_texto] = datas
+    if (~eh_texto).any():
+        convertido[~eh_texto] = pd.to_datetime(serie[~eh_texto], errors="coerce")
+    return convertido
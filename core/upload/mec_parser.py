@@ -1,38 +1,18 @@
 # core/upload/mec_parser.py
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import List, Optional, Dict
+from typing import Iterator, Optional
 import pandas as pd
-import io
-import unicodedata
-import datetime
-
-# =========================
-# DTO de saída
-# =========================
-@dataclass
-class MecRowDTO:
-    data_posicao: datetime.date
-    aplicacao: Optional[float]
-    resgate: Optional[float]
-    estorno: Optional[float]
-    pl: Optional[float]
-    qtd_cotas: Optional[float]
-    cota: Optional[float]
-    raw: Dict  # linha original (debug/erros)
 
+from core.upload.batches import MecBatch, RejectedRow
+from core.upload.conversao import infer_date_format, is_text, to_date_series, to_float_series
+from core.upload.chunked_reader import DEFAULT_CHUNK_SIZE
+from core.upload.schema import FileSchema, UploadSchemaError, register_schema
 
 # =========================
 # Erros de esquema
 # =========================
-class MecSchemaError(Exception):
-    def __init__(self, missing_columns: List[str], *, debug_info: Optional[str] = None):
-        self.missing_columns = missing_columns
-        self.debug_info = debug_info
-        msg = f"Colunas ausentes: {', '.join(missing_columns)}"
-        if debug_info:
-            msg += f" | Debug: {debug_info}"
-        super().__init__(msg)
+class MecSchemaError(UploadSchemaError):
+    pass
 
 
 # =========================
@@ -58,115 +38,106 @@ REQUIRED_CANONICAL_COLS = (
 
 
 # =========================
-# Helpers
+# Esquema (aliases/renomeações)
 # =========================
-def _normalize(s: str) -> str:
-    s = str(s or "").strip()
-    s = "".join(ch for ch in unicodedata.normalize("NFKD", s) if not unicodedata.combining(ch))
-    s = s.replace("_", " ").replace("-", " ").replace("/", " ")
-    s = " ".join(s.split()).upper()
-    return s
-
-def _build_renames(columns: List[str]) -> Dict[str, str]:
-    aliases: Dict[str, List[str]] = {
-        DATAPOSICAO: ["DATA POSICAO", "DATA", "DT POSICAO"],
-        VALORAPLICACAO: ["VALOR APLICACAO", "APLICACAO", "VL APLICACAO"],
-        VALORRESGATE: ["VALOR RESGATE", "RESGATE", "VL RESGATE"],
-        VALORTOTALESTORNO: ["VALOR TOTAL ESTORNO", "ESTORNO", "VL ESTORNO"],
-        VALORPATRIMONIO: ["VALOR PATRIMONIO", "PATRIMONIO LIQ", "PL"],
-        QUANTIDADECOTAS: ["QUANTIDADE COTAS", "QTD COTAS"],
-        VALORCOTA: ["VALOR COTA", "COTA"],
-    }
-
-    norm_to_original = {_normalize(c): c for c in columns}
-    renames: Dict[str, str] = {}
-
-    for canonical, options in aliases.items():
-        found = None
-        if _normalize(canonical) in norm_to_original:
-            found = norm_to_original[_normalize(canonical)]
-        else:
-            for opt in options:
-                if _normalize(opt) in norm_to_original:
-                    found = norm_to_original[_normalize(opt)]
-                    break
-        if found:
-            renames[found] = canonical
-    return renames
-
-def _to_float(val) -> Optional[float]:
-    try:
-        if pd.isna(val):
-            return None
-        if isinstance(val, str):
-            v = val.strip()
-            if v == "":
-                return None
-            v = v.replace(".", "").replace(",", ".")
-            return float(v)
-        return float(val)
-    except Exception:
-        return None
+MEC_SCHEMA = register_schema(FileSchema(
+    nome="mec",
+    columns=(
+        (DATAPOSICAO, ("DATA POSICAO", "DATA", "DT POSICAO")),
+        (VALORAPLICACAO, ("VALOR APLICACAO", "APLICACAO", "VL APLICACAO")),
+        (VALORRESGATE, ("VALOR RESGATE", "RESGATE", "VL RESGATE")),
+        (VALORTOTALESTORNO, ("VALOR TOTAL ESTORNO", "ESTORNO", "VL ESTORNO")),
+        (VALORPATRIMONIO, ("VALOR PATRIMONIO", "PATRIMONIO LIQ", "PL")),
+        (QUANTIDADECOTAS, ("QUANTIDADE COTAS", "QTD COTAS")),
+        (VALORCOTA, ("VALOR COTA", "COTA")),
+    ),
+    required=REQUIRED_CANONICAL_COLS,
+    error_cls=MecSchemaError,
+    numeric=REQUIRED_CANONICAL_COLS[1:],   # tudo menos DATAPOSICAO
+))
 
 
 # =========================
 # Parser principal
 # =========================
-def parse_excel_mec(file_obj) -> List[MecRowDTO]:
-    name = getattr(file_obj, "name", "") or ""
-    content = file_obj.read()
-    file_obj.seek(0)
-
-    if name.lower().endswith(".csv"):
-        try:
-            # Tenta abrir em UTF-8
-            df = pd.read_csv(io.BytesIO(content), dtype=object, encoding="utf-8", sep=None, engine="python")
-        except UnicodeDecodeError:
-            # Fallback para Latin1 (ISO-8859-1)
-            df = pd.read_csv(io.BytesIO(content), dtype=object, encoding="latin1", sep=None, engine="python")
-    else:
-        df = pd.read_excel(io.BytesIO(content), dtype=object)
-
-    if df.empty:
-        raise MecSchemaError(list(REQUIRED_CANONICAL_COLS), debug_info="DataFrame vazio")
-
-    original_cols = list(df.columns)
-    renames = _build_renames(original_cols)
-    df = df.rename(columns=renames)
-
-    missing = [c for c in REQUIRED_CANONICAL_COLS if c not in df.columns]
-    if missing:
-        debug = (
-            f"originais={original_cols} | renames={renames} | "
-            f"presentes={list(df.columns)} | required={list(REQUIRED_CANONICAL_COLS)}"
-        )
-        raise MecSchemaError(missing, debug_info=debug)
-
-    rows: List[MecRowDTO] = []
-    for _, row in df.iterrows():
-        try:
-            data_raw = row.get(DATAPOSICAO)
-            if pd.isna(data_raw):
-                continue
-            if isinstance(data_raw, str):
-                data_posicao = pd.to_datetime(data_raw, dayfirst=True).date()
-            else:
-                data_posicao = pd.to_datetime(data_raw).date()
-
-            rows.append(
-                MecRowDTO(
-                    data_posicao=data_posicao,
-                    aplicacao=_to_float(row.get(VALORAPLICACAO)),
-                    resgate=_to_float(row.get(VALORRESGATE)),
-                    estorno=_to_float(row.get(VALORTOTALESTORNO)),
-                    pl=_to_float(row.get(VALORPATRIMONIO)),
-                    qtd_cotas=_to_float(row.get(QUANTIDADECOTAS)),
-                    cota=_to_float(row.get(VALORCOTA)),
-                    raw=dict(row),
-                )
-            )
-        except Exception as e:
-            # Se uma linha falhar, apenas pula (ou você pode acumular em errors)
-            continue
-
-    return rows
+_VALUE_COLS = (
+    ("aplicacao", VALORAPLICACAO),
+    ("resgate", VALORRESGATE),
+    ("estorno", VALORTOTALESTORNO),
+    ("pl", VALORPATRIMONIO),
+    ("qtd_cotas", QUANTIDADECOTAS),
+    ("cota", VALORCOTA),
+)
+
+
+def _is_blank(serie: pd.Series) -> pd.Series:
+    return serie.isna() | (is_text(serie) & serie.astype(str).str.strip().eq(""))
+
+
+def _batch_from_frame(df: pd.DataFrame, decimal: str = ",", formato_data: Optional[str] = None) -> MecBatch:
+    """
+    Converte um DataFrame já renomeado (colunas canônicas) em lote colunar,
+    com DATAPOSICAO e colunas de valor convertidas em bloco.
+
+    Linhas sem DATAPOSICAO são descartadas (linhas em branco/totais);
+    linhas com data ou valor preenchido porém ininterpretável vão para
+    `rejeicoes`, com o motivo.
+    """
+    datas = to_date_series(df[DATAPOSICAO], formato_data)
+    sem_data = _is_blank(df[DATAPOSICAO])
+
+    # Coluna que causou a rejeição da linha (None = linha aceita)
+    coluna_invalida = pd.Series(None, index=df.index, dtype=object)
+    coluna_invalida[datas.isna() & ~sem_data] = DATAPOSICAO
+
+    valores = {}
+    for campo, col in _VALUE_COLS:
+        convertido = to_float_series(df[col], decimal)
+        invalido = convertido.isna() & ~_is_blank(df[col]) & ~sem_data & coluna_invalida.isna()
+        coluna_invalida[invalido] = col
+        valores[campo] = convertido
+
+    rejeitado = coluna_invalida.notna()
+    aceito = (~rejeitado & ~sem_data).to_numpy()
+
+    # raw só é materializado para as linhas rejeitadas
+    rejeicoes = tuple(
+        RejectedRow(row_index=int(idx), reason=f"{col} inválido: {df.at[idx, col]!r}", raw=df.loc[idx].to_dict())
+        for idx, col in coluna_invalida[rejeitado].items()
+    )
+
+    origem = df[aceito]
+    return MecBatch(
+        linhas=origem.index.to_numpy(dtype="int64"),
+        origem=origem,
+        datas=datas[aceito].to_numpy(dtype="datetime64[D]"),
+        rejeicoes=rejeicoes,
+        **{campo: serie[aceito].to_numpy(dtype="float64") for campo, serie in valores.items()},
+    )
+
+
+def iter_excel_mec_batches(
+    file_obj,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    schema: FileSchema = MEC_SCHEMA,
+) -> Iterator[MecBatch]:
+    """
+    Modo streaming: entrega lotes colunares (MecBatch) à medida que o arquivo é lido.
+    O cabeçalho é validado no primeiro lote. `schema` permite variações do
+    layout (ex.: MEC consolidado com coluna de CNPJ).
+    """
+    formato_data: Optional[str] = None
+
+    for df, decimal in schema.iter_frames(file_obj, chunk_size=chunk_size):
+        if formato_data is None:
+            # Formato inferido uma vez por arquivo, a partir do primeiro lote
+            amostra = df[DATAPOSICAO][is_text(df[DATAPOSICAO])].head(50).tolist()
+            formato_data = infer_date_format(amostra)
+
+        batch = _batch_from_frame(df, decimal, formato_data)
+        if len(batch) or batch.rejeicoes:
+            yield batch
+
+
+def parse_excel_mec(file_obj) -> MecBatch:
+    return MecBatch.concat(list(iter_excel_mec_batches(file_obj)))
@@ -0,0 +1,150 @@
+# core/upload/schema.py
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Type
+import unicodedata
+import pandas as pd
+
+from core.upload.chunked_reader import DEFAULT_CHUNK_SIZE, is_csv, iter_dataframes, sniff_csv
+
+
+# =========================
+# Erros de esquema
+# =========================
+class UploadSchemaError(Exception):
+    def __init__(self, missing_columns: List[str], *, debug_info: Optional[str] = None):
+        self.missing_columns = missing_columns
+        self.debug_info = debug_info
+        msg = f"Colunas ausentes: {', '.join(missing_columns)}"
+        if debug_info:
+            msg += f" | Debug: {debug_info}"
+        super().__init__(msg)
+
+
+# =========================
+# Normalização
+# =========================
+@lru_cache(maxsize=4096)
+def normalize_label(s) -> str:
+    """
+    Normaliza para comparação de nomes de coluna:
+    - remove acentos
+    - upper
+    - troca separadores por espaço
+    - comprime múltiplos espaços
+    """
+    s = str(s or "").strip()
+    s = "".join(ch for ch in unicodedata.normalize("NFKD", s) if not unicodedata.combining(ch))
+    s = s.replace("_", " ").replace("-", " ").replace("/", " ")
+    s = " ".join(s.split()).upper()
+    return s
+
+
+# =========================
+# Esquema declarativo de arquivo
+# =========================
+@dataclass(frozen=True)
+class FileSchema:
+    """
+    Descreve um tipo de arquivo de upload: colunas canônicas (na ordem de
+    prioridade), seus aliases e quais são obrigatórias.
+
+    O índice de aliases normalizados é montado uma única vez, na criação do
+    esquema; o mapeamento resolvido fica em cache por assinatura de cabeçalho
+    (tupla de nomes de coluna), então uploads repetidos do mesmo
+    administrador não refazem a resolução.
+    """
+    nome: str
+    columns: Tuple[Tuple[str, Tuple[str, ...]], ...]  # (canônica, aliases)
+    required: Tuple[str, ...]
+    error_cls: Type[UploadSchemaError] = UploadSchemaError
+    numeric: Tuple[str, ...] = ()   # colunas de valor: só elas votam no separador decimal do CSV
+
+    def __post_init__(self):
+        # canônica -> chaves normalizadas (a própria canônica primeiro, depois os aliases)
+        index = tuple(
+            (canonical, tuple(dict.fromkeys(normalize_label(o) for o in (canonical, *aliases))))
+            for canonical, aliases in self.columns
+        )
+        object.__setattr__(self, "_index", index)
+        # chave normalizada -> canônica: pontuação de linhas sem passar pelo cache do resolve
+        object.__setattr__(self, "_canonica_por_chave", {key: canonical for canonical, keys in index for key in keys})
+        object.__setattr__(self, "_resolve_cached", lru_cache(maxsize=256)(self._resolve))
+
+    def _resolve(self, header: Tuple) -> Dict[str, str]:
+        # Índice: normalizado da coluna original -> nome original
+        norm_to_original = {normalize_label(c): c for c in header}
+        renames: Dict[str, str] = {}
+        for canonical, keys in self._index:
+            for key in keys:
+                if key in norm_to_original:
+                    renames[norm_to_original[key]] = canonical
+                    break
+        return renames
+
+    def resolve(self, columns: Sequence) -> Dict[str, str]:
+        """Mapeamento coluna encontrada -> nome canônico (cacheado por cabeçalho)."""
+        return dict(self._resolve_cached(tuple(columns)))
+
+    def score(self, columns: Sequence) -> int:
+        """
+        Quantas colunas canônicas a linha casa (usado para achar o cabeçalho no
+        XLSX). Não usa o cache do resolve: as linhas de preâmbulo pontuadas são
+        todas diferentes e expulsariam os cabeçalhos reais do cache.
+        """
+        chaves = self._canonica_por_chave
+        return len({chaves[k] for k in map(normalize_label, columns) if k in chaves})
+
+    def numeric_positions(self, columns: Sequence) -> List[int]:
+        """Posições (no cabeçalho original) das colunas canônicas numéricas."""
+        renames = self.resolve(columns)
+        return [i for i, c in enumerate(columns) if renames.get(c) in self.numeric]
+
+    def validate(self, columns: Sequence) -> Dict[str, str]:
+        """Resolve o cabeçalho e levanta error_cls se faltar coluna obrigatória."""
+        original_cols = list(columns)
+        renames = self.resolve(original_cols)
+        presentes = [renames.get(c, c) for c in original_cols]
+
+        # Diagnóstico: quais canônicas faltaram?
+        missing = [c for c in self.required if c not in presentes]
+        if missing:
+            debug = (
+                f"originais={original_cols} | renames={renames} | "
+                f"presentes={presentes} | required={list(self.required)}"
+            )
+            raise self.error_cls(missing, debug_info=debug)
+        return renames
+
+    def iter_frames(self, file_obj, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[pd.DataFrame, str]]:
+        """
+        Lê o arquivo em lotes já com colunas canônicas, validando o cabeçalho
+        no primeiro lote. Entrega (DataFrame, separador decimal detectado).
+        """
+        renames: Optional[Dict[str, str]] = None
+        dialect = sniff_csv(file_obj, self.numeric_positions if self.numeric else None) if is_csv(file_obj) else None
+        decimal = dialect.decimal if dialect else ","
+
+        for df in iter_dataframes(file_obj, chunk_size=chunk_size, dialect=dialect, header_score=self.score):
+            if renames is None:
+                if df.empty:
+                    raise self.error_cls(list(self.required), debug_info="DataFrame vazio")
+                renames = self.validate(df.columns)
+            yield df.rename(columns=renames), decimal
+
+
+# =========================
+# Registro de esquemas
+# =========================
+SCHEMAS: Dict[str, FileSchema] = {}
+
+
+def register_schema(schema: FileSchema) -> FileSchema:
+    SCHEMAS[schema.nome] = schema
+    return schema
+
+
+def get_schema(nome: str) -> FileSchema:
+    return SCHEMAS[nome]
@@ -0,0 +1,116 @@
+# core/upload/xlsx_reader.py
+from __future__ import annotations
+
+from typing import Callable, Iterator, List, Optional, Sequence
+import pandas as pd
+from openpyxl import load_workbook
+
+# Quantas linhas do topo da planilha são examinadas em busca do cabeçalho
+HEADER_SCAN_ROWS = 30
+
+# Recebe os valores de uma linha e devolve quantas colunas canônicas ela casa
+HeaderScore = Callable[[List[str]], int]
+
+
+def _is_blank(values: Sequence) -> bool:
+    return all(v is None or (isinstance(v, str) and not v.strip()) for v in values)
+
+
+def _header_labels(values: Sequence) -> List[str]:
+    """
+    Converte a linha de cabeçalho em nomes de coluna, no mesmo padrão do
+    pandas: célula vazia vira "Unnamed: i" e repetidos ganham sufixo ".1", ".2"...
+    """
+    labels: List[str] = []
+    vistos: dict = {}
+    for i, v in enumerate(values):
+        label = str(v).strip() if v is not None and str(v).strip() else f"Unnamed: {i}"
+        if label in vistos:
+            vistos[label] += 1
+            label = f"{label}.{vistos[label]}"
+        else:
+            vistos[label] = 0
+        labels.append(label)
+    return labels
+
+
+def _find_header(preamble: List[tuple], header_score: Optional[HeaderScore]) -> int:
+    """
+    Índice (dentro de `preamble`) da linha de cabeçalho: a de maior pontuação
+    em header_score. Sem pontuação positiva, assume a primeira linha não vazia
+    (comportamento do pd.read_excel).
+    """
+    candidatos = [i for i, values in enumerate(preamble) if not _is_blank(values)]
+    if not candidatos:
+        return 0
+    if header_score is None:
+        return candidatos[0]
+
+    melhor, melhor_nota = candidatos[0], 0
+    for i in candidatos:
+        nota = header_score(_header_labels(preamble[i]))
+        if nota > melhor_nota:
+            melhor, melhor_nota = i, nota
+    return melhor
+
+
+def iter_xlsx_frames(
+    file_obj,
+    chunk_size: int,
+    header_score: Optional[HeaderScore] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Lê a primeira aba de um XLSX em modo read_only (openpyxl), sem montar o
+    DOM do workbook, e entrega DataFrames (dtype=object) de até `chunk_size` linhas.
+
+    O cabeçalho não precisa estar na linha 1: as primeiras HEADER_SCAN_ROWS
+    linhas são pontuadas com `header_score` e a melhor é usada como cabeçalho,
+    descartando títulos/preâmbulos acima dela.
+
+    O índice de cada frame é a posição da linha na aba (0 = primeira linha
+    da planilha, preâmbulo e linhas em branco incluídos): os erros apontam
+    para a linha que o usuário vê no Excel (índice + 1).
+    """
+    file_obj.seek(0)
+    wb = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        rows = ws.iter_rows(values_only=True)
+
+        preamble: List[tuple] = []
+        for values in rows:
+            preamble.append(values)
+            if len(preamble) >= HEADER_SCAN_ROWS:
+                break
+
+        if not preamble:
+            yield pd.DataFrame(dtype=object)
+            return
+
+        header_idx = _find_header(preamble, header_score)
+        columns = _header_labels(preamble[header_idx])
+        largura = len(columns)
+
+        def _data_rows() -> Iterator[tuple]:
+            for values in preamble[header_idx + 1:]:
+                yield values
+            yield from rows
+
+        lote: List[tuple] = []
+        posicoes: List[int] = []
+        entregou = False
+        for posicao, values in enumerate(_data_rows(), start=header_idx + 1):
+            if _is_blank(values):
+                continue
+            values = tuple(values[:largura]) + (None,) * (largura - len(values))
+            lote.append(values)
+            posicoes.append(posicao)
+            if len(lote) >= chunk_size:
+                yield pd.DataFrame(lote, columns=columns, dtype=object, index=posicoes)
+                lote, posicoes = [], []
+                entregou = True
+
+        if lote or not entregou:
+            yield pd.DataFrame(lote, columns=columns, dtype=object, index=pd.Index(posicoes, dtype="int64"))
+    finally:
+        wb.close()
@@ -16,8 +16,13 @@ urlpatterns = [
     path('', demonstracao_financeira, name='demonstracao_financeira'),
     path("importar-balancete/", importar_balancete_view, name="importar_balancete"),
     path("importar-mec/", importar_mec_view, name="importar_mec"),
+    path("importar-lote/", importar_lote_view, name="importar_lote"),
+    path("importacoes/<int:job_id>/status/", import_job_status, name="import_job_status"),
+    path("importacoes/<int:job_id>/lote/", import_job_lote, name="import_job_lote"),
     path('dre-resultado/<int:fundo_id>/<str:data_atual>/<str:data_anterior>/', df_resultado, name='dre_resultado'),
     path("dre-resultado/<int:fundo_id>/<str:data_atual>/<str:data_anterior>/exportar/", exportar_dfs_excel, name="exportar_dfs_excel"),
+    path("dre-resultado/<int:fundo_id>/serie/", serie_demonstracoes, name="serie_demonstracoes"),
+    path("consolidado/<str:data_atual>/<str:data_anterior>/", consolidado_demonstracoes, name="consolidado_demonstracoes"),
 
 
     # Fundos
@@ -1,10 +1,11 @@
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import FileResponse, HttpResponse
+from django.http import FileResponse, HttpResponse, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 
-from df.models import Fundo, BalanceteItem
+from df.models import Fundo, BalanceteAgregado, BalanceteItem, ImportBatch, ImportJob
 from usuarios.models import Empresa, Membership
 from usuarios.utils.company_scope import query_por_empresa_ativa
 from usuarios.permissions import (
@@ -20,13 +21,10 @@ from .forms import FundoForm
 
 # Camadas novas (core)
 from core.export.df_excel import criar_aba_dpf, criar_aba_dre, criar_aba_dmpl, criar_aba_dfc
-from core.processing.import_service import import_balancete, import_mec
-from core.processing.dre_service import gerar_dados_dre
-from core.processing.dpf_service import gerar_dados_dpf
-from core.processing.dmpl_service import gerar_dados_dmpl
-from core.processing.dfc_service import gerar_tabela_dfc
-from core.upload.balancete_parser import parse_excel, BalanceteSchemaError
-from core.upload.mec_parser import parse_excel_mec, MecSchemaError
+from core.processing.import_jobs import enqueue_import, job_status_payload, run_job_inline
+from core.processing.demonstracoes import demonstracoes_em_cache
+from core.processing.serie_service import gerar_serie
+from core.processing.consolidado_service import gerar_consolidado
 
 import os
 from openpyxl import Workbook
@@ -113,26 +111,25 @@ def importar_balancete_view(request):
         fundo_qs = query_por_empresa_ativa(Fundo.objects.all(), request, "empresa")
         fundo = get_object_or_404(fundo_qs, id=fundo_id)
 
-        try:
-            rows = parse_excel(arquivo_balancete)
-            report = import_balancete(fundo_id=fundo.id, data_referencia=data_referencia, rows=rows)
-        except BalanceteSchemaError as e:
-            messages.error(request, f"Planilha inválida: faltam colunas {', '.join(e.missing_columns)}")
-            return redirect("demonstracao_financeira")
-        except Exception as e:
-            messages.error(request, f"Erro ao importar balancete: {e}")
+        if not arquivo_balancete:
+            messages.error(request, "Selecione a planilha do balancete.")
             return redirect("demonstracao_financeira")
 
-        if report.errors:
-            messages.warning(request, f"Balancete importado com erros. {report.imported} inseridos, {report.updated} atualizados, {report.ignored} ignorados.")
-        else:
-            messages.success(request, f"Balancete importado: {report.imported} inseridos, {report.updated} atualizados, {report.ignored} ignorados.")
+        job = enqueue_import(
+            fundo_id=fundo.id,
+            tipo=ImportBatch.TIPO_BALANCETE,
+            arquivo=arquivo_balancete,
+            data_referencia=data_referencia,
+            usuario=request.user,
+            substituir=request.POST.get("substituir") == "1",
+        )
+        return _resposta_job(request, job)
 
     return redirect("demonstracao_financeira")
 
 
 # ===============================
-# IMPORTAR MEC (sem alterações)
+# IMPORTAR MEC
 # ===============================
 @login_required
 @company_can_manage_fundos
@@ -148,79 +145,142 @@ def importar_mec_view(request):
             messages.error(request, "Selecione o arquivo do MEC.")
             return redirect("demonstracao_financeira")
 
-        try:
-            rows_mec = parse_excel_mec(arquivo_mec)
-            report = import_mec(fundo_id=fundo.id, rows=rows_mec)
-        except MecSchemaError as e:
-            messages.error(request, f"Planilha do MEC inválida: faltam colunas {', '.join(e.missing_columns)}")
-            return redirect("demonstracao_financeira")
-        except Exception as e:
-            messages.error(request, f"Erro ao importar MEC: {e}")
-            return redirect("demonstracao_financeira")
-
-        if report.errors:
-            messages.warning(request, f"MEC importado com erros. {report.imported} inseridos, {report.updated} atualizados, {report.ignored} ignorados.")
-        else:
-            messages.success(request, f"MEC importado com sucesso. {report.imported} inseridos, {report.updated} atualizados, {report.ignored} ignorados.")
+        job = enqueue_import(
+            fundo_id=fundo.id,
+            tipo=ImportBatch.TIPO_MEC,
+            arquivo=arquivo_mec,
+            usuario=request.user,
+        )
+        return _resposta_job(request, job)
 
     return redirect("demonstracao_financeira")
 
 
 # ===============================
-# DF RESULTADO / Exportações (sem mudanças)
+# JOBS DE IMPORTAÇÃO (fila + polling)
 # ===============================
-def _pct(v, base):
-    try:
-        v = float(v or 0)
-        b = float(base or 0)
-        return round((v / b) * 100, 2) if b != 0 else 0.0
-    except Exception:
-        return 0.0
+def _is_ajax(request):
+    return request.headers.get("x-requested-with") == "XMLHttpRequest" or "application/json" in request.headers.get("accept", "")
+
+
+def _mensagem_job(request, job):
+    """Mensagem final do job (modo síncrono); no assíncrono o JS monta a mesma a partir do status."""
+    if job.tipo == ImportJob.TIPO_LOTE:
+        if job.status == ImportJob.Status.ERRO:
+            messages.error(request, f"Erro ao importar lote: {job.erro}")
+        elif not (job.report or {}).get("arquivos"):
+            messages.warning(request, "Nenhuma planilha (.xlsx, .xls ou .csv) encontrada no arquivo enviado.")
+        return
+    nome = "Balancete" if job.tipo == ImportBatch.TIPO_BALANCETE else "MEC"
+    if job.status == ImportJob.Status.ERRO:
+        messages.error(request, f"{nome}: {job.erro}")
+        return
+    r = job.report or {}
+    if r.get("already_imported"):
+        messages.info(request, f"Este {nome} já foi importado para o fundo (arquivo idêntico). Nada foi alterado.")
+        return
+    resumo = (
+        f"{r.get('imported', 0)} inseridos, {r.get('updated', 0)} atualizados, "
+        f"{r.get('unchanged', 0)} sem alteração, {r.get('ignored', 0)} ignorados"
+    )
+    if r.get("removed"):
+        resumo += f", {r['removed']} removidos"
+    if r.get("errors_total"):
+        messages.warning(request, f"{nome} importado com erros. {resumo}, {r['errors_total']} linhas rejeitadas.")
+    else:
+        messages.success(request, f"{nome} importado: {resumo}.")
 
 
-def annotate_percents(dpf: dict, pl_atual_val: float, pl_ant_val: float) -> dict:
+def _resposta_job(request, job):
     """
-    Adiciona PERC_ATUAL/PERC_ANTERIOR em:
-      - cada TOTAL_* (com base em ATUAL/ANTERIOR)
-      - cada grupo (com base em SOMA/SOMA_ANTERIOR)
-      - cada subgrupo (com base em ATUAL/ANTERIOR)
-    Sempre usando como base o PL ajustado (pl_atual_val / pl_ant_val).
+    Upload enfileirado: responde na hora com o id do job. Requisições AJAX
+    recebem JSON (202); o form normal volta para a página, que acompanha o
+    job pelo endpoint de status (?job=<id>).
     """
-    for sec_name, sec in dpf.items():  # ATIVO, PASSIVO, PL
-        if not isinstance(sec, dict):
-            continue
-
-        for grupo_label, bloco in sec.items():
-            if not isinstance(bloco, dict):
-                continue
-
-            # Totais da seção (ex.: TOTAL_ATIVO, TOTAL_PASSIVO, TOTAL_PL)
-            if grupo_label.startswith("TOTAL_"):
-                atual_tot = bloco.get("ATUAL", 0)
-                ant_tot = bloco.get("ANTERIOR", 0)
-                bloco["PERC_ATUAL"] = _pct(atual_tot, pl_atual_val)
-                bloco["PERC_ANTERIOR"] = _pct(ant_tot, pl_ant_val)
-                continue
-
-            # Grupos normais
-            soma_atual = bloco.get("SOMA", 0)
-            soma_ant = bloco.get("SOMA_ANTERIOR", 0)
-            bloco["PERC_ATUAL"] = _pct(soma_atual, pl_atual_val)
-            bloco["PERC_ANTERIOR"] = _pct(soma_ant, pl_ant_val)
-
-            # Subgrupos
-            for sub_label, valores in bloco.items():
-                if sub_label in ("SOMA", "SOMA_ANTERIOR"):
-                    continue
-                if isinstance(valores, dict) and ("ATUAL" in valores or "ANTERIOR" in valores):
-                    atual_v = valores.get("ATUAL", 0)
-                    ant_v = valores.get("ANTERIOR", 0)
-                    valores["PERC_ATUAL"] = _pct(atual_v, pl_atual_val)
-                    valores["PERC_ANTERIOR"] = _pct(ant_v, pl_ant_val)
-
-    return dpf
+    if not settings.IMPORT_JOBS_ASYNC:
+        job = run_job_inline(job)
+
+    status_url = reverse("import_job_status", args=[job.id])
+    if _is_ajax(request):
+        return JsonResponse({"job_id": job.id, "status_url": status_url, **job_status_payload(job)}, status=202)
+
+    if settings.IMPORT_JOBS_ASYNC:
+        return redirect(f"{reverse('demonstracao_financeira')}?job={job.id}")
+
+    _mensagem_job(request, job)
+    if job.tipo == ImportJob.TIPO_LOTE and job.status == ImportJob.Status.CONCLUIDO and job.report.get("arquivos"):
+        return redirect("import_job_lote", job_id=job.id)
+    return redirect("demonstracao_financeira")
+
+
+def _jobs_visiveis(request):
+    # job de lote não tem fundo (vários CNPJs): fica visível para quem enviou
+    return (
+        query_por_empresa_ativa(ImportJob.objects.all(), request, "fundo__empresa")
+        | ImportJob.objects.filter(tipo=ImportJob.TIPO_LOTE, usuario=request.user)
+    )
+
+
+@login_required
+@company_can_view_data
+def import_job_status(request, job_id):
+    job = get_object_or_404(_jobs_visiveis(request), id=job_id)
+    return JsonResponse(job_status_payload(job))
+
+
+@login_required
+@company_can_view_data
+def import_job_lote(request, job_id):
+    """Resultado por arquivo de um job de lote concluído."""
+    job = get_object_or_404(
+        _jobs_visiveis(request),
+        id=job_id,
+        tipo=ImportJob.TIPO_LOTE,
+        status=ImportJob.Status.CONCLUIDO,
+    )
+    r = job.report or {}
+    resultados = [
+        {**a, "data_referencia": date.fromisoformat(a["data_referencia"]) if a["data_referencia"] else None}
+        for a in r.get("arquivos", [])
+    ]
+    return render(request, "importacao_lote.html", {
+        "job": job,
+        "resultados": resultados,
+        "total_ok": r.get("total_ok", 0),
+        "total_erros": r.get("total_erros", 0),
+    })
 
 
+# ===============================
+# IMPORTAÇÃO EM LOTE (ZIP ou planilha consolidada)
+# ===============================
+@login_required
+@company_can_manage_fundos
+def importar_lote_view(request):
+    if request.method != "POST":
+        return redirect("demonstracao_financeira")
+
+    arquivo_lote = request.FILES.get("arquivo_lote")
+    if not arquivo_lote:
+        messages.error(request, "Selecione o arquivo ZIP ou a planilha consolidada.")
+        return redirect("demonstracao_financeira")
+
+    # o worker roteia cada arquivo pelo CNPJ, só entre os fundos que o usuário vê agora
+    fundos = query_por_empresa_ativa(Fundo.objects.all(), request, "empresa")
+    job = enqueue_import(
+        fundo_id=None,
+        tipo=ImportJob.TIPO_LOTE,
+        arquivo=arquivo_lote,
+        usuario=request.user,
+        substituir=request.POST.get("substituir") == "1",
+        fundos_permitidos=list(fundos.values_list("id", flat=True)),
+    )
+    return _resposta_job(request, job)
+
+
+# ===============================
+# DF RESULTADO / Exportações (sem mudanças)
+# ===============================
 @login_required
 @company_can_view_data
 def df_resultado(request, fundo_id, data_atual, data_anterior):
@@ -243,39 +303,22 @@ def df_resultado(request, fundo_id, data_atual, data_anterior):
     # 2) Busca fundo (ajuste aqui se você usa escopo por empresa)
     fundo = get_object_or_404(Fundo, id=fundo_id)
 
-    # 3) Chama os serviços passando os OBJETOS date + flag zerar_anterior
-    dre_tabela, resultado_exercicio, resultado_exercicio_anterior = gerar_dados_dre(
-        fundo_id=fundo.id,
-        data_atual=data_atual_date,
-        data_anterior=data_anterior_date,
-        zerar_anterior=zerar_anterior,
-    )
-    dpf_tabela, metricas_dpf = gerar_dados_dpf(
-        fundo_id=fundo.id,
-        data_atual=data_atual_date,
-        data_anterior=data_anterior_date,
-        zerar_anterior=zerar_anterior,
-    )
-    dados_dmpl = gerar_dados_dmpl(
-        fundo_id=fundo.id,
-        data_atual=data_atual_date,
-        data_anterior=data_anterior_date,
-        zerar_anterior=zerar_anterior,
-    )
-    dfc_tabela, variacao_caixa_atual, variacao_caixa_ant = gerar_tabela_dfc(
+    # 3) Demonstrações do cache (ou calculadas uma vez cada; o DFC reaproveita DRE/DPF/DMPL)
+    ctx = demonstracoes_em_cache(
         fundo_id=fundo.id,
         data_atual=data_atual_date,
         data_anterior=data_anterior_date,
         zerar_anterior=zerar_anterior,
     )
+    dre_tabela, resultado_exercicio, resultado_exercicio_anterior = ctx.dre
+    dados_dmpl = ctx.dmpl
+    dfc_tabela, variacao_caixa_atual, variacao_caixa_ant = ctx.dfc
 
     # === PL ajustado ===
-    pl_atual = (dpf_tabela["PL"]["TOTAL_PL"]["ATUAL"] or 0) + (resultado_exercicio or 0)
-    pl_anterior = (dpf_tabela["PL"]["TOTAL_PL"]["ANTERIOR"] or 0) + (resultado_exercicio_anterior or 0)
-    total_pl_passivo_atual = pl_atual + (dpf_tabela["PASSIVO"]["TOTAL_PASSIVO"]["ATUAL"] or 0)
-    total_pl_passivo_anterior = pl_anterior + (dpf_tabela["PASSIVO"]["TOTAL_PASSIVO"]["ANTERIOR"] or 0)
+    pl_atual, pl_anterior = ctx.pl_ajustado
+    total_pl_passivo_atual, total_pl_passivo_anterior = ctx.total_pl_passivo
 
-    dpf_tabela = annotate_percents(dpf_tabela, pl_atual, pl_anterior)
+    dpf_tabela = ctx.dpf_percentuais
 
     # 4) Strings para URL de exportação (NÃO vamos mais chamar strftime no template)
     data_atual_str = data_atual  # já vem da URL como 'YYYY-MM-DD'
@@ -338,27 +381,19 @@ def exportar_dfs_excel(request, fundo_id, data_atual, data_anterior):
     # =====================
     # Gerar dados das DFs
     # =====================
-    dre_tabela, resultado_exercicio, resultado_exercicio_anterior = gerar_dados_dre(
-        fundo_id=fundo.id, data_atual=data_atual, data_anterior=data_anterior, zerar_anterior=zerar_anterior
-    )
-    dpf_tabela, _metricas_dpf = gerar_dados_dpf(
+    ctx = demonstracoes_em_cache(
         fundo_id=fundo.id, data_atual=data_atual, data_anterior=data_anterior, zerar_anterior=zerar_anterior
     )
+    dre_tabela, resultado_exercicio, resultado_exercicio_anterior = ctx.dre
 
     # === PL ajustado ===
-    pl_atual = (dpf_tabela["PL"]["TOTAL_PL"]["ATUAL"] or 0) + (resultado_exercicio or 0)
-    pl_anterior = (dpf_tabela["PL"]["TOTAL_PL"]["ANTERIOR"] or 0) + (resultado_exercicio_anterior or 0)
-    total_pl_passivo_atual = pl_atual + (dpf_tabela["PASSIVO"]["TOTAL_PASSIVO"]["ATUAL"] or 0)
-    total_pl_passivo_anterior = pl_anterior + (dpf_tabela["PASSIVO"]["TOTAL_PASSIVO"]["ANTERIOR"] or 0)
+    pl_atual, pl_anterior = ctx.pl_ajustado
+    total_pl_passivo_atual, total_pl_passivo_anterior = ctx.total_pl_passivo
 
-    dpf_tabela = annotate_percents(dpf_tabela, pl_atual, pl_anterior)
+    dpf_tabela = ctx.dpf_percentuais
 
-    dados_dmpl = gerar_dados_dmpl(
-        fundo_id=fundo.id, data_atual=data_atual, data_anterior=data_anterior, zerar_anterior=zerar_anterior
-    )
-    dfc_tabela, variacao_atual, variacao_ant = gerar_tabela_dfc(
-        fundo_id=fundo.id, data_atual=data_atual, data_anterior=data_anterior, zerar_anterior=zerar_anterior
-    )
+    dados_dmpl = ctx.dmpl
+    dfc_tabela, variacao_atual, variacao_ant = ctx.dfc
 
     # =====================
     # Criar o workbook
@@ -418,6 +453,87 @@ def exportar_dfs_excel(request, fundo_id, data_atual, data_anterior):
     wb.save(response)
     return response
 
+
+# ===============================
+# SÉRIE HISTÓRICA (JSON para gráficos/planilhas)
+# ===============================
+SERIE_ULTIMAS_PADRAO = 12
+
+
+@login_required
+@company_can_view_data
+def serie_demonstracoes(request, fundo_id):
+    """
+    GET ?datas=2024-01-31,2024-02-29,...  (ou ?data=... repetido)
+    Sem datas: os últimos `ultimas` balancetes do fundo (padrão 12).
+    Responde DPF/DRE por grupo em todas as datas (ver serie_service.gerar_serie).
+    """
+    fundo_qs = query_por_empresa_ativa(Fundo.objects.all(), request, "empresa")
+    fundo = get_object_or_404(fundo_qs, id=fundo_id)
+
+    brutas = [d for valor in request.GET.getlist("datas") for d in valor.split(",")]
+    brutas += request.GET.getlist("data")
+    try:
+        datas = [datetime.strptime(d.strip(), "%Y-%m-%d").date() for d in brutas if d.strip()]
+        ultimas = int(request.GET.get("ultimas", SERIE_ULTIMAS_PADRAO))
+    except ValueError:
+        return JsonResponse({"erro": "Formato inválido: use datas=AAAA-MM-DD,... e ultimas=<número>."}, status=400)
+
+    if not datas:
+        datas = list(
+            BalanceteAgregado.objects.filter(fundo=fundo)
+            .order_by("-data_referencia")
+            .values_list("data_referencia", flat=True)
+            .distinct()[:max(ultimas, 1)]
+        )
+        if not datas:
+            return JsonResponse({"erro": "Fundo sem balancetes importados."}, status=404)
+
+    try:
+        serie = gerar_serie(fundo.id, datas, dividir_por_mil=request.GET.get("dividir_por_mil", "1") != "0")
+    except ValueError as e:
+        return JsonResponse({"erro": str(e)}, status=400)
+    return JsonResponse({"fundo": fundo.nome, **serie})
+
+
+# ===============================
+# CONSOLIDADO (vários fundos, JSON)
+# ===============================
+@login_required
+@company_can_view_data
+def consolidado_demonstracoes(request, data_atual, data_anterior):
+    """
+    DPF/DRE/DMPL consolidadas de vários fundos nas duas datas.
+    GET ?fundos=1,2,3  (sem o parâmetro: todos os fundos da empresa ativa)
+    data_anterior pode ser 'ZERADO', como em df_resultado.
+    """
+    zerar_anterior = data_anterior == "ZERADO"
+    try:
+        data_atual = datetime.strptime(data_atual, "%Y-%m-%d").date()
+        data_anterior = None if zerar_anterior else datetime.strptime(data_anterior, "%Y-%m-%d").date()
+        ids = [int(i) for valor in request.GET.getlist("fundos") for i in valor.split(",") if i.strip()]
+    except ValueError:
+        return JsonResponse({"erro": "Formato inválido: datas AAAA-MM-DD e fundos=<id>,<id>,..."}, status=400)
+
+    fundos_qs = query_por_empresa_ativa(Fundo.objects.all(), request, "empresa").order_by("nome")
+    if ids:
+        fundos_qs = fundos_qs.filter(id__in=ids)
+    fundos = list(fundos_qs.values("id", "nome"))
+    if ids and len(fundos) != len(set(ids)):
+        return JsonResponse({"erro": "Fundo inexistente ou fora da empresa ativa."}, status=404)
+    if not fundos:
+        return JsonResponse({"erro": "Nenhum fundo na empresa ativa."}, status=404)
+
+    consolidado = gerar_consolidado(
+        [f["id"] for f in fundos],
+        data_atual,
+        data_anterior,
+        zerar_anterior=zerar_anterior,
+        dividir_por_mil=request.GET.get("dividir_por_mil", "1") != "0",
+    )
+    return JsonResponse({"fundos": fundos, **consolidado})
+
+
 # ===========================
 # CRUD de Fundos (inalterado)
 # ===========================
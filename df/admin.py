@@ -1,4 +1,5 @@
 from django.contrib import admin
+from .agregados import recalcular_agregados
 from .models import (
     Fundo,
     GrupoGrande,
@@ -6,6 +7,8 @@ from .models import (
     MapeamentoContas,
     BalanceteItem,
     MecItem,
+    ImportBatch,
+    ImportJob,
 )
 
 
@@ -17,18 +20,39 @@ class FundoAdmin(admin.ModelAdmin):
     ordering = ("empresa", "nome")
 
 
+class CodigoDfcAdminMixin:
+    """
+    Código sugerido a partir do nome na criação; nos grupos que o DFC lê
+    pelo código (ver dfc_service.CODIGOS_*), fica somente leitura.
+    """
+    codigos_dfc = ""  # nome do dicionário em dfc_service
+
+    def get_prepopulated_fields(self, request, obj=None):
+        return {"codigo": ("nome",)} if obj is None else {}
+
+    def get_readonly_fields(self, request, obj=None):
+        from core.processing import dfc_service
+
+        campos = tuple(super().get_readonly_fields(request, obj))
+        if obj is not None and obj.tipo in getattr(dfc_service, self.codigos_dfc).get(obj.codigo, ()):
+            campos += ("codigo",)
+        return campos
+
+
 @admin.register(GrupoGrande)
-class GrupoGrandeAdmin(admin.ModelAdmin):
-    list_display = ("nome", "tipo")
+class GrupoGrandeAdmin(CodigoDfcAdminMixin, admin.ModelAdmin):
+    codigos_dfc = "CODIGOS_GRUPOES"
+    list_display = ("nome", "codigo", "tipo")
     list_filter = ("tipo", )
-    search_fields = ("nome",)
+    search_fields = ("nome", "codigo")
     ordering = ("nome", )
 
 
 @admin.register(GrupoPequeno)
-class GrupoPequenoAdmin(admin.ModelAdmin):
-    list_display = ("nome", "grupao")
-    search_fields = ("nome", "grupao__nome")
+class GrupoPequenoAdmin(CodigoDfcAdminMixin, admin.ModelAdmin):
+    codigos_dfc = "CODIGOS_GRUPINHOS"
+    list_display = ("nome", "codigo", "grupao")
+    search_fields = ("nome", "codigo", "grupao__nome")
     ordering = ("grupao", "nome")
 
 
@@ -58,6 +82,26 @@ class BalanceteItemAdmin(admin.ModelAdmin):
     def get_conta(self, obj):
         return obj.conta_corrente.conta if obj.conta_corrente else "—"
 
+    # Edições manuais também precisam refletir no BalanceteAgregado (lido pela DRE/DPF)
+    def save_model(self, request, obj, form, change):
+        anterior = None
+        if change:
+            anterior = BalanceteItem.objects.filter(pk=obj.pk).values_list("fundo_id", "data_referencia").first()
+        super().save_model(request, obj, form, change)
+        recalcular_agregados(fundo_id=obj.fundo_id, datas=[obj.data_referencia])
+        if anterior and anterior != (obj.fundo_id, obj.data_referencia):
+            recalcular_agregados(fundo_id=anterior[0], datas=[anterior[1]])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        recalcular_agregados(fundo_id=obj.fundo_id, datas=[obj.data_referencia])
+
+    def delete_queryset(self, request, queryset):
+        afetados = set(queryset.values_list("fundo_id", "data_referencia").distinct().order_by())
+        super().delete_queryset(request, queryset)
+        for fundo_id, data_referencia in afetados:
+            recalcular_agregados(fundo_id=fundo_id, datas=[data_referencia])
+
 
 @admin.register(MecItem)
 class MecItemAdmin(admin.ModelAdmin):
@@ -66,3 +110,39 @@ class MecItemAdmin(admin.ModelAdmin):
     search_fields = ("fundo__nome",)
     ordering = ("-data_posicao", "fundo")
     autocomplete_fields = ("fundo",)
+
+
+@admin.register(ImportBatch)
+class ImportBatchAdmin(admin.ModelAdmin):
+    list_display = (
+        "criado_em", "fundo", "tipo", "data_referencia", "nome_arquivo",
+        "importados", "atualizados", "ignorados", "removidos", "erros", "substituicao", "duracao_leitura_ms", "duracao_gravacao_ms",
+    )
+    list_filter = ("tipo", "fundo")
+    search_fields = ("fundo__nome", "nome_arquivo", "sha256")
+    ordering = ("-criado_em",)
+    date_hierarchy = "criado_em"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "criado_em", "fundo", "tipo", "data_referencia", "nome_arquivo", "status", "linhas_processadas")
+    list_filter = ("status", "tipo", "fundo")
+    search_fields = ("fundo__nome", "nome_arquivo")
+    ordering = ("-criado_em",)
+    readonly_fields = ("report", "checkpoint", "erro", "import_batch", "criado_em", "iniciado_em", "concluido_em")
+    actions = ("retomar",)
+
+    @admin.action(description="Retomar importação (continua do último lote gravado)")
+    def retomar(self, request, queryset):
+        from core.processing.import_jobs import retomar_job
+
+        # jobs presos em PROCESSANDO (worker morto) também podem ser retomados por aqui
+        retomados = sum(retomar_job(job, incluir_processando=True) for job in queryset)
+        self.message_user(request, f"{retomados} job(s) devolvido(s) à fila.")
@@ -0,0 +1,110 @@
+# df/agregados.py
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set
+
+from django.db import transaction
+from django.db.models import Sum
+
+from df.models import BalanceteAgregado, BalanceteItem
+from df.versoes import avancar_versao, chave_fundo, ler_versao
+
+BULK_BATCH_SIZE = 2000
+
+
+# =========================
+# Carimbo de versão dos dados de cada fundo
+# =========================
+def versao_dados_fundo(fundo_id: int) -> int:
+    return ler_versao(chave_fundo(fundo_id))
+
+
+def marcar_fundo_alterado(fundo_id: int) -> None:
+    """
+    Avança o carimbo do fundo (invalida as demonstrações em cache) no banco,
+    dentro da transação corrente: os outros processos passam a ver a versão
+    nova no mesmo commit que torna os dados visíveis.
+    """
+    avancar_versao(chave_fundo(fundo_id))
+
+
+# =========================
+# Agregados por grupinho
+# =========================
+
+
+@transaction.atomic
+def recalcular_agregados(*, fundo_id: int, datas: Iterable[date]) -> int:
+    """
+    Refaz BalanceteAgregado de (fundo, datas) a partir de BalanceteItem: um
+    DELETE e um GROUP BY por grupinho. Custo proporcional às linhas do
+    balancete dessas datas; chamado depois de cada carga. Retorna quantas
+    linhas agregadas foram gravadas.
+    """
+    datas = sorted({d for d in datas if d is not None})
+    if not datas:
+        return 0
+
+    BalanceteAgregado.objects.filter(fundo_id=fundo_id, data_referencia__in=datas).delete()
+    somas = (
+        BalanceteItem.objects
+        .filter(
+            fundo_id=fundo_id,
+            data_referencia__in=datas,
+            conta_corrente__grupo_pequeno__isnull=False,
+        )
+        .values("data_referencia", "conta_corrente__grupo_pequeno_id")
+        .annotate(total=Sum("saldo_final"))
+        .order_by()
+    )
+    agregados = [
+        BalanceteAgregado(
+            fundo_id=fundo_id,
+            data_referencia=row["data_referencia"],
+            grupo_pequeno_id=row["conta_corrente__grupo_pequeno_id"],
+            saldo_final=row["total"] or Decimal("0.00"),
+        )
+        for row in somas
+    ]
+    BalanceteAgregado.objects.bulk_create(agregados, batch_size=BULK_BATCH_SIZE)
+    marcar_fundo_alterado(fundo_id)
+    return len(agregados)
+
+
+def _datas_por_fundo(itens) -> Dict[int, Set[date]]:
+    datas: Dict[int, Set[date]] = {}
+    for fundo_id, data_referencia in itens.values_list("fundo_id", "data_referencia").distinct().order_by():
+        datas.setdefault(fundo_id, set()).add(data_referencia)
+    return datas
+
+
+def recalcular_agregados_da_conta(conta_id: int) -> int:
+    """Conta mudou de grupinho: refaz os agregados de todo (fundo, data) em que ela aparece."""
+    total = 0
+    for fundo_id, datas in _datas_por_fundo(BalanceteItem.objects.filter(conta_corrente_id=conta_id)).items():
+        total += recalcular_agregados(fundo_id=fundo_id, datas=datas)
+    return total
+
+
+def recalcular_todos_agregados(fundo_ids: Optional[List[int]] = None) -> int:
+    """
+    Reconstrução completa (ou dos fundos indicados), para mapeamentos
+    alterados por update()/bulk_create ou carga inicial. Datas que só
+    existem no agregado (balancete apagado) também são limpas.
+    """
+    itens = BalanceteItem.objects.all()
+    agregados = BalanceteAgregado.objects.all()
+    if fundo_ids:
+        itens = itens.filter(fundo_id__in=fundo_ids)
+        agregados = agregados.filter(fundo_id__in=fundo_ids)
+
+    datas = _datas_por_fundo(itens)
+    for fundo_id, datas_agregado in _datas_por_fundo(agregados).items():
+        datas.setdefault(fundo_id, set()).update(datas_agregado)
+
+    total = 0
+    for fundo_id, datas_fundo in datas.items():
+        total += recalcular_agregados(fundo_id=fundo_id, datas=datas_fundo)
+    return total
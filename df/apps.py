@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DfConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'df'
+
+    def ready(self):
+        from df import signals  # noqa: F401
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('df', '0008_remove_balanceteitem_uq_balancete_fundo_ano_conta_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('balancete', 'Balancete'), ('mec', 'MEC')], max_length=20)),
+                ('data_referencia', models.DateField(blank=True, null=True)),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('nome_arquivo', models.CharField(blank=True, default='', max_length=255)),
+                ('tamanho_bytes', models.BigIntegerField(default=0)),
+                ('importados', models.PositiveIntegerField(default=0)),
+                ('atualizados', models.PositiveIntegerField(default=0)),
+                ('ignorados', models.PositiveIntegerField(default=0)),
+                ('erros', models.PositiveIntegerField(default=0)),
+                ('duracao_leitura_ms', models.PositiveIntegerField(default=0)),
+                ('duracao_gravacao_ms', models.PositiveIntegerField(default=0)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('fundo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_batches', to='df.fundo')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_batches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Lote de Importação',
+                'verbose_name_plural': 'Lotes de Importação',
+                'ordering': ['-criado_em'],
+                'indexes': [models.Index(fields=['fundo', 'tipo', 'data_referencia'], name='idx_impbatch_fundo_tipo_data')],
+            },
+        ),
+    ]
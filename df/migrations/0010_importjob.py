@@ -0,0 +1,42 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('df', '0009_importbatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('balancete', 'Balancete'), ('mec', 'MEC')], max_length=20)),
+                ('data_referencia', models.DateField(blank=True, null=True)),
+                ('arquivo', models.FileField(blank=True, upload_to='importacoes/%Y/%m/')),
+                ('nome_arquivo', models.CharField(blank=True, default='', max_length=255)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('concluido', 'Concluído'), ('erro', 'Erro')], default='pendente', max_length=20)),
+                ('linhas_processadas', models.PositiveIntegerField(default=0)),
+                ('report', models.JSONField(blank=True, null=True)),
+                ('erro', models.TextField(blank=True, default='')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+                ('fundo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to='df.fundo')),
+                ('import_batch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='df.importbatch')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Job de Importação',
+                'verbose_name_plural': 'Jobs de Importação',
+                'ordering': ['-criado_em'],
+                'indexes': [models.Index(fields=['status', 'criado_em'], name='idx_importjob_status_criado')],
+            },
+        ),
+    ]
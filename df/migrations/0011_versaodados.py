@@ -0,0 +1,24 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('df', '0010_importjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoDados',
+            fields=[
+                ('chave', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('versao', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Versão dos Dados',
+                'verbose_name_plural': 'Versões dos Dados',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('df', '0011_versaodados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='removidos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='substituicao',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='substituir',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('df', '0012_importacao_substituicao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='checkpoint',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:32
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def preencher_agregados(apps, schema_editor):
+    """Carga inicial: soma por (fundo, data, grupinho) de todo o balancete já importado."""
+    BalanceteItem = apps.get_model("df", "BalanceteItem")
+    BalanceteAgregado = apps.get_model("df", "BalanceteAgregado")
+    somas = (
+        BalanceteItem.objects
+        .filter(data_referencia__isnull=False, conta_corrente__grupo_pequeno__isnull=False)
+        .values("fundo_id", "data_referencia", "conta_corrente__grupo_pequeno_id")
+        .annotate(total=Sum("saldo_final"))
+        .order_by()
+    )
+    BalanceteAgregado.objects.bulk_create(
+        [
+            BalanceteAgregado(
+                fundo_id=row["fundo_id"],
+                data_referencia=row["data_referencia"],
+                grupo_pequeno_id=row["conta_corrente__grupo_pequeno_id"],
+                saldo_final=row["total"] or Decimal("0.00"),
+            )
+            for row in somas
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('df', '0013_importjob_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceteAgregado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_referencia', models.DateField()),
+                ('saldo_final', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=22)),
+                ('fundo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balancete_agregado', to='df.fundo')),
+                ('grupo_pequeno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agregados', to='df.grupopequeno')),
+            ],
+            options={
+                'verbose_name': 'Balancete Agregado',
+                'verbose_name_plural': 'Balancetes Agregados',
+                'ordering': ['fundo', 'data_referencia', 'grupo_pequeno'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='balanceteagregado',
+            constraint=models.UniqueConstraint(fields=('fundo', 'data_referencia', 'grupo_pequeno'), name='uq_balagregado_fundo_data_grupo'),
+        ),
+        migrations.RunPython(preencher_agregados, migrations.RunPython.noop),
+    ]
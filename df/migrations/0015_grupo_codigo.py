@@ -0,0 +1,72 @@
+# Generated by Django 4.2.23 on 2026-10-17 03:10
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+def _codigo_do_nome(nome):
+    s = unicodedata.normalize("NFKD", nome or "").encode("ascii", "ignore").decode().lower()
+    return re.sub(r"[^a-z0-9]+", "_", s).strip("_")[:90] or "grupo"
+
+
+def _atribuir(objs):
+    usados = set()
+    for obj in objs:
+        base = _codigo_do_nome(obj.nome)
+        codigo, n = base, 2
+        while codigo in usados:
+            codigo, n = f"{base}_{n}", n + 1
+        usados.add(codigo)
+        obj.codigo = codigo
+        obj.save(update_fields=["codigo"])
+
+
+def _chave_grupao(g):
+    # ordem dos demonstrativos (tipo, ordem, nome): em nomes repetidos, o primeiro
+    # grupo na DPF (Ativo → Passivo → PL → Resultado) fica com o código sem sufixo
+    return (g.tipo is None, g.tipo or 0, g.ordem is not None, g.ordem or 0, g.nome, g.pk)
+
+
+def preencher_codigos(apps, schema_editor):
+    GrupoGrande = apps.get_model("df", "GrupoGrande")
+    GrupoPequeno = apps.get_model("df", "GrupoPequeno")
+
+    grupoes = sorted(GrupoGrande.objects.all(), key=_chave_grupao)
+    _atribuir(grupoes)
+
+    posicao = {g.pk: i for i, g in enumerate(grupoes)}
+    grupinhos = sorted(GrupoPequeno.objects.all(), key=lambda g: (posicao[g.grupao_id], g.nome, g.pk))
+    _atribuir(grupinhos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('df', '0014_balanceteagregado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grupogrande',
+            name='codigo',
+            field=models.SlugField(blank=True, max_length=100, null=True, verbose_name='código'),
+        ),
+        migrations.AddField(
+            model_name='grupopequeno',
+            name='codigo',
+            field=models.SlugField(blank=True, max_length=100, null=True, verbose_name='código'),
+        ),
+        migrations.RunPython(preencher_codigos, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='grupogrande',
+            name='codigo',
+            field=models.SlugField(blank=True, help_text='Identificador estável usado pelos demonstrativos (ex.: DFC). Gerado a partir do nome na criação e mantido ao renomear o grupo.', max_length=100, unique=True, verbose_name='código'),
+        ),
+        migrations.AlterField(
+            model_name='grupopequeno',
+            name='codigo',
+            field=models.SlugField(blank=True, help_text='Identificador estável usado pelos demonstrativos (ex.: DFC). Gerado a partir do nome na criação e mantido ao renomear o grupo.', max_length=100, unique=True, verbose_name='código'),
+        ),
+    ]
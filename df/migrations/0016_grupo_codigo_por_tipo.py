@@ -0,0 +1,80 @@
+# Generated by Django 4.2.23 on 2026-10-17 04:05
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+def _codigo_do_nome(nome):
+    s = unicodedata.normalize("NFKD", nome or "").encode("ascii", "ignore").decode().lower()
+    return re.sub(r"[^a-z0-9]+", "_", s).strip("_")[:90] or "grupo"
+
+
+def _atribuir(objs, tipo_de):
+    # códigos únicos dentro de cada demonstração (tipo): "Taxa de Administração"
+    # na DPF e na DRE ficam ambos com "taxa_de_administracao"
+    usados = set()
+    for obj in objs:
+        base = _codigo_do_nome(obj.nome)
+        codigo, n = base, 2
+        while (tipo_de(obj), codigo) in usados:
+            codigo, n = f"{base}_{n}", n + 1
+        usados.add((tipo_de(obj), codigo))
+        obj.codigo = codigo
+        obj.save(update_fields=["codigo"])
+
+
+def _chave_grupao(g):
+    # ordem dos demonstrativos (tipo, ordem, nome): em nomes repetidos no mesmo
+    # tipo, o primeiro grupo fica com o código sem sufixo
+    return (g.tipo is None, g.tipo or 0, g.ordem is not None, g.ordem or 0, g.nome, g.pk)
+
+
+def _realocar(apps, tipo_do_grupao):
+    GrupoGrande = apps.get_model("df", "GrupoGrande")
+    GrupoPequeno = apps.get_model("df", "GrupoPequeno")
+
+    grupoes = sorted(GrupoGrande.objects.all(), key=_chave_grupao)
+    _atribuir(grupoes, lambda g: tipo_do_grupao(g.tipo))
+
+    posicao = {g.pk: i for i, g in enumerate(grupoes)}
+    tipos = {g.pk: g.tipo for g in grupoes}
+    grupinhos = sorted(GrupoPequeno.objects.all(), key=lambda g: (posicao[g.grupao_id], g.nome, g.pk))
+    _atribuir(grupinhos, lambda g: tipo_do_grupao(tipos[g.grupao_id]))
+
+
+def codigos_por_tipo(apps, schema_editor):
+    # a 0015 alocou os códigos no plano inteiro: um grupo da DRE com o mesmo
+    # nome de um da DPF ficou com sufixo (_2) e o DFC lia a linha da DPF
+    _realocar(apps, lambda tipo: tipo)
+
+
+def codigos_globais(apps, schema_editor):
+    # volta à alocação da 0015 (um escopo só), exigida pelo unique=True
+    _realocar(apps, lambda tipo: None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('df', '0015_grupo_codigo'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='grupogrande',
+            name='codigo',
+            field=models.SlugField(blank=True, help_text='Identificador estável usado pelos demonstrativos (ex.: DFC), único dentro de cada demonstração (tipo do grupão). Gerado a partir do nome na criação e mantido ao renomear o grupo.', max_length=100, verbose_name='código'),
+        ),
+        migrations.AlterField(
+            model_name='grupopequeno',
+            name='codigo',
+            field=models.SlugField(blank=True, help_text='Identificador estável usado pelos demonstrativos (ex.: DFC), único dentro de cada demonstração (tipo do grupão). Gerado a partir do nome na criação e mantido ao renomear o grupo.', max_length=100, verbose_name='código'),
+        ),
+        migrations.RunPython(codigos_por_tipo, codigos_globais),
+        migrations.AddConstraint(
+            model_name='grupogrande',
+            constraint=models.UniqueConstraint(fields=('tipo', 'codigo'), name='uq_grupogrande_tipo_codigo'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.23 on 2026-10-17 02:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('df', '0016_grupo_codigo_por_tipo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='fundos_permitidos',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='importjob',
+            name='fundo',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to='df.fundo'),
+        ),
+        migrations.AlterField(
+            model_name='importjob',
+            name='tipo',
+            field=models.CharField(choices=[('balancete', 'Balancete'), ('mec', 'MEC'), ('lote', 'Lote (ZIP/consolidada)')], max_length=20),
+        ),
+    ]
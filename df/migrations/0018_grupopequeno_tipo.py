@@ -0,0 +1,43 @@
+# Generated by Django 4.2.23 on 2026-10-17 02:32
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copiar_tipo_do_grupao(apps, schema_editor):
+    GrupoGrande = apps.get_model("df", "GrupoGrande")
+    GrupoPequeno = apps.get_model("df", "GrupoPequeno")
+    GrupoPequeno.objects.update(
+        tipo=Subquery(GrupoGrande.objects.filter(pk=OuterRef("grupao_id")).values("tipo")[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('df', '0017_importjob_lote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grupopequeno',
+            name='tipo',
+            field=models.IntegerField(blank=True, choices=[(1, 'Ativo'), (2, 'Passivo'), (3, 'Patrimônio Líquido'), (4, 'Resultado')], editable=False, null=True),
+        ),
+        # a 0016 já alocou os códigos por tipo: a constraint vale para os dados existentes
+        migrations.RunPython(copiar_tipo_do_grupao, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='grupogrande',
+            name='codigo',
+            field=models.SlugField(help_text='Identificador estável usado pelos demonstrativos (ex.: DFC), único dentro de cada demonstração (tipo do grupão). Gerado a partir do nome na criação e mantido ao renomear o grupo.', max_length=100, verbose_name='código'),
+        ),
+        migrations.AlterField(
+            model_name='grupopequeno',
+            name='codigo',
+            field=models.SlugField(help_text='Identificador estável usado pelos demonstrativos (ex.: DFC), único dentro de cada demonstração (tipo do grupão). Gerado a partir do nome na criação e mantido ao renomear o grupo.', max_length=100, verbose_name='código'),
+        ),
+        migrations.AddConstraint(
+            model_name='grupopequeno',
+            constraint=models.UniqueConstraint(fields=('tipo', 'codigo'), name='uq_grupopequeno_tipo_codigo'),
+        ),
+    ]
@@ -1,8 +1,42 @@
+import re
+import unicodedata
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
 from decimal import Decimal
 from usuarios.models import Empresa
 
 
+def codigo_do_nome(nome: str) -> str:
+    """'(-) Provisão para operações de crédito' → 'provisao_para_operacoes_de_credito'"""
+    s = unicodedata.normalize("NFKD", nome or "").encode("ascii", "ignore").decode().lower()
+    return re.sub(r"[^a-z0-9]+", "_", s).strip("_")[:90] or "grupo"
+
+
+def _codigo_livre(escopo, nome: str, pk=None) -> str:
+    """Código a partir do nome, com sufixo _2, _3... se já usado no `escopo` (queryset)."""
+    base = codigo_do_nome(nome)
+    codigo, n = base, 2
+    while escopo.filter(codigo=codigo).exclude(pk=pk).exists():
+        codigo, n = f"{base}_{n}", n + 1
+    return codigo
+
+
+def _codigo_gravado(instancia) -> str:
+    """Código já gravado no banco (vazio se a instância ainda não existe)."""
+    if instancia.pk is None:
+        return ""
+    return type(instancia).objects.filter(pk=instancia.pk).values_list("codigo", flat=True).first() or ""
+
+
+CODIGO_HELP = (
+    "Identificador estável usado pelos demonstrativos (ex.: DFC), único dentro de cada "
+    "demonstração (tipo do grupão). Gerado a partir do nome na criação e mantido ao "
+    "renomear o grupo."
+)
+
+
 # =========================
 # FUNDOS (escopo por empresa)
 # =========================
@@ -39,6 +73,7 @@ class Fundo(models.Model):
 # =========================
 class GrupoGrande(models.Model):
     nome = models.CharField(max_length=255)
+    codigo = models.SlugField("código", max_length=100, help_text=CODIGO_HELP)
     ordem = models.IntegerField(null=True, blank=True, default=None)
 
     TIPO_CHOICES = [
@@ -54,35 +89,77 @@ class GrupoGrande(models.Model):
         verbose_name_plural = "Grupões de Contas"
         ordering = ["nome"]
         constraints = [
-            models.UniqueConstraint(fields=["nome", "tipo"], name="uq_grupogrande_nome_tipo")
+            models.UniqueConstraint(fields=["nome", "tipo"], name="uq_grupogrande_nome_tipo"),
+            models.UniqueConstraint(fields=["tipo", "codigo"], name="uq_grupogrande_tipo_codigo"),
         ]
 
     def __str__(self):
         return f"{self.nome} ({self.get_tipo_display()})"
 
+    def clean(self):
+        # os grupinhos mudam de demonstração junto com o grupão: seus códigos não podem colidir lá
+        if self.pk is not None and (
+            GrupoPequeno.objects
+            .filter(tipo=self.tipo, codigo__in=self.grupinhos.values("codigo"))
+            .exclude(grupao=self)
+            .exists()
+        ):
+            raise ValidationError({"tipo": "Um grupinho deste grupão tem o mesmo código de outro grupinho nesta demonstração."})
+
+    def save(self, *args, **kwargs):
+        novo = self._state.adding
+        if not self.codigo:
+            # código apagado não é regenerado: o DFC procura as linhas por ele
+            self.codigo = _codigo_gravado(self) or _codigo_livre(GrupoGrande.objects.filter(tipo=self.tipo), self.nome, self.pk)
+        super().save(*args, **kwargs)
+        if not novo:
+            self.grupinhos.exclude(tipo=self.tipo).update(tipo=self.tipo)
+
 
 # =========================
 # GRUPINHOS (nível 2)
 # =========================
 class GrupoPequeno(models.Model):
     nome = models.CharField(max_length=255)
+    codigo = models.SlugField("código", max_length=100, help_text=CODIGO_HELP)
     grupao = models.ForeignKey(
         GrupoGrande,
         on_delete=models.CASCADE,
         related_name="grupinhos"
     )
+    # cópia de grupao.tipo (mantida em save() aqui e no GrupoGrande): o banco
+    # não consegue garantir código único por demonstração através da FK
+    tipo = models.IntegerField(choices=GrupoGrande.TIPO_CHOICES, null=True, blank=True, editable=False)
 
     class Meta:
         verbose_name = "Grupinho de Contas"
         verbose_name_plural = "Grupinhos de Contas"
         ordering = ["grupao", "nome"]
         constraints = [
-            models.UniqueConstraint(fields=["nome", "grupao"], name="uq_grupopequeno_nome_grupao")
+            models.UniqueConstraint(fields=["nome", "grupao"], name="uq_grupopequeno_nome_grupao"),
+            models.UniqueConstraint(fields=["tipo", "codigo"], name="uq_grupopequeno_tipo_codigo"),
         ]
 
     def __str__(self):
         return f"{self.nome} (→ {self.grupao.nome})"
 
+    def _mesma_demonstracao(self):
+        return GrupoPequeno.objects.filter(tipo=self.grupao.tipo)
+
+    def clean(self):
+        # `tipo` não está no form, então a constraint não é validada pelo ModelForm
+        if self.codigo and self.grupao_id and (
+            self._mesma_demonstracao().filter(codigo=self.codigo).exclude(pk=self.pk).exists()
+        ):
+            raise ValidationError({"codigo": "Já existe um grupinho com este código nesta demonstração."})
+
+    def save(self, *args, **kwargs):
+        self.tipo = self.grupao.tipo
+        if not self.codigo:
+            # código apagado não é regenerado: o DFC procura as linhas por ele
+            self.codigo = _codigo_gravado(self) or _codigo_livre(self._mesma_demonstracao(), self.nome, self.pk)
+        super().save(*args, **kwargs)
+
 
 # =========================
 # MAPA DE CONTAS
@@ -148,6 +225,44 @@ class BalanceteItem(models.Model):
         return f"[{self.data_referencia}] {self.fundo.nome} | {conta} | Saldo: R$ {saldo}"
 
 
+# =================================================
+# BALANCETE AGREGADO (soma por grupinho; mantido pela importação)
+# =================================================
+class BalanceteAgregado(models.Model):
+    """
+    Soma de saldo_final do balancete por (fundo, data, grupinho). É derivado
+    de BalanceteItem + MapeamentoContas e recalculado por df.agregados
+    (importação, edição no admin e mudança de grupinho de uma conta); DRE e
+    DPF leem daqui.
+    """
+    fundo = models.ForeignKey(
+        Fundo,
+        on_delete=models.CASCADE,
+        related_name="balancete_agregado",
+    )
+    data_referencia = models.DateField()
+    grupo_pequeno = models.ForeignKey(
+        GrupoPequeno,
+        on_delete=models.CASCADE,
+        related_name="agregados",
+    )
+    saldo_final = models.DecimalField(max_digits=22, decimal_places=2, default=Decimal("0.00"))
+
+    class Meta:
+        verbose_name = "Balancete Agregado"
+        verbose_name_plural = "Balancetes Agregados"
+        ordering = ["fundo", "data_referencia", "grupo_pequeno"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["fundo", "data_referencia", "grupo_pequeno"],
+                name="uq_balagregado_fundo_data_grupo",
+            )
+        ]
+
+    def __str__(self):
+        return f"[{self.data_referencia}] {self.fundo.nome} | {self.grupo_pequeno.nome} | R$ {self.saldo_final:.2f}"
+
+
 # =================================================
 # MEC (por fundo, e Data da posição)
 # =================================================
@@ -188,3 +303,149 @@ class MecItem(models.Model):
 
     def __str__(self):
         return f"[{self.data_posicao:%d/%m/%Y}] {self.fundo.nome} | PL R$ {self.pl} | Cotas {self.qtd_cotas} | Cota {self.cota}"
+
+
+# =================================================
+# LOTES DE IMPORTAÇÃO (auditoria + deduplicação)
+# =================================================
+class ImportBatch(models.Model):
+    """
+    Registro de cada arquivo importado: o que (tipo/data), quando, de qual
+    arquivo (SHA-256 do conteúdo) e com que resultado. O id crescente por
+    fundo também serve de versão dos dados importados.
+    """
+    TIPO_BALANCETE = "balancete"
+    TIPO_MEC = "mec"
+    TIPO_CHOICES = [
+        (TIPO_BALANCETE, "Balancete"),
+        (TIPO_MEC, "MEC"),
+    ]
+
+    fundo = models.ForeignKey(
+        Fundo,
+        on_delete=models.CASCADE,
+        related_name="import_batches",
+    )
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    data_referencia = models.DateField(null=True, blank=True)  # só balancete
+    sha256 = models.CharField(max_length=64, db_index=True)
+    nome_arquivo = models.CharField(max_length=255, blank=True, default="")
+    tamanho_bytes = models.BigIntegerField(default=0)
+
+    importados = models.PositiveIntegerField(default=0)
+    atualizados = models.PositiveIntegerField(default=0)
+    ignorados = models.PositiveIntegerField(default=0)
+    erros = models.PositiveIntegerField(default=0)
+    removidos = models.PositiveIntegerField(default=0)  # contas da carga anterior ausentes no snapshot
+    substituicao = models.BooleanField(default=False)    # balancete importado como snapshot completo
+
+    duracao_leitura_ms = models.PositiveIntegerField(default=0)
+    duracao_gravacao_ms = models.PositiveIntegerField(default=0)
+
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name="import_batches",
+    )
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Lote de Importação"
+        verbose_name_plural = "Lotes de Importação"
+        ordering = ["-criado_em"]
+        indexes = [
+            models.Index(fields=["fundo", "tipo", "data_referencia"], name="idx_impbatch_fundo_tipo_data"),
+        ]
+
+    def __str__(self):
+        data = f" {self.data_referencia:%d/%m/%Y}" if self.data_referencia else ""
+        return f"[{self.get_tipo_display()}{data}] {self.fundo.nome} | {self.nome_arquivo or self.sha256[:12]}"
+
+
+# =================================================
+# JOBS DE IMPORTAÇÃO (fila no banco, processada pelo worker)
+# =================================================
+class ImportJob(models.Model):
+    """
+    Importação enfileirada pelo upload e executada fora do request pelo
+    worker (manage.py import_worker). O arquivo fica no storage até o fim do
+    processamento.
+    """
+    class Status(models.TextChoices):
+        PENDENTE = "pendente", "Pendente"
+        PROCESSANDO = "processando", "Processando"
+        CONCLUIDO = "concluido", "Concluído"
+        ERRO = "erro", "Erro"
+
+    # além dos tipos de ImportBatch: ZIP/planilha consolidada com vários fundos
+    TIPO_LOTE = "lote"
+    TIPO_CHOICES = ImportBatch.TIPO_CHOICES + [(TIPO_LOTE, "Lote (ZIP/consolidada)")]
+
+    fundo = models.ForeignKey(
+        Fundo,
+        on_delete=models.CASCADE,
+        null=True, blank=True,  # lote: cada arquivo vai para o fundo do seu CNPJ
+        related_name="import_jobs",
+    )
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    data_referencia = models.DateField(null=True, blank=True)  # só balancete
+    fundos_permitidos = models.JSONField(null=True, blank=True)  # lote: ids dos fundos do usuário no envio
+    arquivo = models.FileField(upload_to="importacoes/%Y/%m/", blank=True)
+    nome_arquivo = models.CharField(max_length=255, blank=True, default="")
+    substituir = models.BooleanField(default=False)  # balancete: substitui o snapshot de fundo/data
+
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDENTE)
+    linhas_processadas = models.PositiveIntegerField(default=0)
+    report = models.JSONField(null=True, blank=True)  # ImportReport serializado ao concluir
+    checkpoint = models.JSONField(null=True, blank=True)  # lotes já commitados (ver import_service.ImportCheckpoint)
+    erro = models.TextField(blank=True, default="")
+    import_batch = models.ForeignKey(
+        ImportBatch,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name="jobs",
+    )
+
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name="import_jobs",
+    )
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Job de Importação"
+        verbose_name_plural = "Jobs de Importação"
+        ordering = ["-criado_em"]
+        indexes = [
+            models.Index(fields=["status", "criado_em"], name="idx_importjob_status_criado"),
+        ]
+
+    def __str__(self):
+        destino = self.fundo.nome if self.fundo_id else self.nome_arquivo
+        return f"#{self.pk} [{self.get_tipo_display()}] {destino} | {self.get_status_display()}"
+
+
+# =================================================
+# CARIMBOS DE VERSÃO (invalidação de caches entre processos)
+# =================================================
+class VersaoDados(models.Model):
+    """
+    Contador por chave (ex.: "plano_contas"), avançado na mesma transação
+    que altera os dados (ver df.versoes). Fica no banco para valer em todos
+    os processos — workers do gunicorn, import_worker — mesmo com cache
+    local por processo.
+    """
+    chave = models.CharField(max_length=50, primary_key=True)
+    versao = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Versão dos Dados"
+        verbose_name_plural = "Versões dos Dados"
+
+    def __str__(self):
+        return f"{self.chave} v{self.versao}"
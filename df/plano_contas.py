@@ -0,0 +1,173 @@
+# df/plano_contas.py
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from threading import Lock
+from time import monotonic
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from df.models import GrupoGrande, GrupoPequeno, MapeamentoContas
+from df.versoes import CHAVE_PLANO_CONTAS, avancar_versao, ler_versao
+
+
+# =========================
+# Snapshot imutável do plano de contas
+# =========================
+@dataclass(frozen=True)
+class GrupaoInfo:
+    id: int
+    nome: str
+    codigo: str
+    tipo: Optional[int]
+    ordem: Optional[int]
+
+
+@dataclass(frozen=True)
+class GrupinhoInfo:
+    id: int
+    nome: str
+    codigo: str
+    grupao_id: int
+
+
+@dataclass(frozen=True)
+class PlanoContas:
+    """
+    Mapa completo conta → grupinho → grupão, carregado em 3 consultas.
+    As ordenações usadas pelos demonstrativos (grupões por tipo, grupinhos
+    por grupão) são montadas uma vez, no carregamento; montar DRE/DPF/DFC
+    não faz nenhuma consulta ao plano. Não deve ser alterado: o mesmo
+    objeto é compartilhado entre requests.
+    """
+
+    versao: int
+    conta_ids: Dict[str, int]                        # código da conta -> id de MapeamentoContas
+    grupinho_por_conta: Dict[int, Optional[int]]     # id de MapeamentoContas -> id de GrupoPequeno
+    grupinhos: Dict[int, GrupinhoInfo]
+    grupoes: Dict[int, GrupaoInfo]
+    _grupinhos_por_grupao: Dict[int, Tuple[GrupinhoInfo, ...]] = field(repr=False, compare=False)
+    _grupoes_por_tipo: Dict[Optional[int], Tuple[GrupaoInfo, ...]] = field(repr=False, compare=False)
+    _grupao_por_grupinho: Dict[int, GrupaoInfo] = field(repr=False, compare=False)
+    # códigos são únicos dentro de cada tipo (demonstração): chave (tipo, código)
+    _grupao_por_codigo: Dict[Tuple[Optional[int], str], GrupaoInfo] = field(repr=False, compare=False)
+    _grupinho_por_codigo: Dict[Tuple[Optional[int], str], GrupinhoInfo] = field(repr=False, compare=False)
+
+    @classmethod
+    def carregar(cls, versao: int) -> "PlanoContas":
+        grupoes = {
+            g["id"]: GrupaoInfo(**g)
+            for g in GrupoGrande.objects.values("id", "nome", "codigo", "tipo", "ordem")
+        }
+        grupinhos = {
+            g["id"]: GrupinhoInfo(**g)
+            for g in GrupoPequeno.objects.values("id", "nome", "codigo", "grupao_id")
+        }
+        conta_ids: Dict[str, int] = {}
+        grupinho_por_conta: Dict[int, Optional[int]] = {}
+        for conta_id, conta, grupinho_id in MapeamentoContas.objects.values_list("id", "conta", "grupo_pequeno_id"):
+            conta_ids[conta] = conta_id
+            grupinho_por_conta[conta_id] = grupinho_id
+
+        por_grupao: Dict[int, List[GrupinhoInfo]] = {}
+        for g in grupinhos.values():
+            por_grupao.setdefault(g.grupao_id, []).append(g)
+        por_tipo: Dict[Optional[int], List[GrupaoInfo]] = {}
+        for g in grupoes.values():
+            por_tipo.setdefault(g.tipo, []).append(g)
+
+        return cls(
+            versao=versao,
+            conta_ids=conta_ids,
+            grupinho_por_conta=grupinho_por_conta,
+            grupinhos=grupinhos,
+            grupoes=grupoes,
+            _grupinhos_por_grupao={
+                gid: tuple(sorted(gs, key=lambda g: g.nome)) for gid, gs in por_grupao.items()
+            },
+            # ordem nula primeiro, como o ORDER BY ordem ASC do MySQL/SQLite
+            _grupoes_por_tipo={
+                tipo: tuple(sorted(gs, key=lambda g: (g.ordem is not None, g.ordem or 0, g.nome)))
+                for tipo, gs in por_tipo.items()
+            },
+            _grupao_por_grupinho={g.id: grupoes[g.grupao_id] for g in grupinhos.values()},
+            _grupao_por_codigo={(g.tipo, g.codigo): g for g in grupoes.values()},
+            _grupinho_por_codigo={(grupoes[g.grupao_id].tipo, g.codigo): g for g in grupinhos.values()},
+        )
+
+    # ----- consultas -----
+    def conta_id(self, conta: str) -> Optional[int]:
+        return self.conta_ids.get(conta)
+
+    def grupao_da_conta(self, conta_id: int) -> Optional[GrupaoInfo]:
+        return self._grupao_por_grupinho.get(self.grupinho_por_conta.get(conta_id))
+
+    def grupoes_do_tipo(self, tipo: int) -> Tuple[GrupaoInfo, ...]:
+        """Grupões do tipo na ordem dos demonstrativos (ordem, nome), como order_by("ordem", "nome")."""
+        return self._grupoes_por_tipo.get(tipo, ())
+
+    def grupinhos_do_grupao(self, grupao_id: int) -> Tuple[GrupinhoInfo, ...]:
+        """Grupinhos do grupão ordenados por nome."""
+        return self._grupinhos_por_grupao.get(grupao_id, ())
+
+    def grupao_por_codigo(self, tipo: int, codigo: str) -> Optional[GrupaoInfo]:
+        return self._grupao_por_codigo.get((tipo, codigo))
+
+    def grupinho_por_codigo(self, tipo: int, codigo: str) -> Optional[GrupinhoInfo]:
+        """Grupinho de um grupão do `tipo` com o código."""
+        return self._grupinho_por_codigo.get((tipo, codigo))
+
+    def grupinhos_dos_tipos(self, tipos: Iterable[int]) -> Dict[int, GrupaoInfo]:
+        """id de grupinho -> grupão, só para grupões de um dos `tipos`."""
+        return {
+            grupinho.id: grupao
+            for tipo in set(tipos)
+            for grupao in self._grupoes_por_tipo.get(tipo, ())
+            for grupinho in self._grupinhos_por_grupao.get(grupao.id, ())
+        }
+
+
+# =========================
+# Cache por processo
+# =========================
+_lock = Lock()
+_plano: Optional[PlanoContas] = None
+_carregado_em = 0.0
+
+
+def versao_atual() -> int:
+    return ler_versao(CHAVE_PLANO_CONTAS)
+
+
+def get_plano_contas() -> PlanoContas:
+    """
+    Plano de contas em memória. Confere a versão no banco a cada chamada
+    (uma consulta pela PK) e recarrega quando ela muda (sinais de
+    df.signals, em qualquer processo) ou depois de PLANO_CONTAS_CACHE_TTL
+    segundos, para alterações que não avançaram a versão.
+    """
+    global _plano, _carregado_em
+    versao = versao_atual()
+    plano = _plano
+    ttl = getattr(settings, "PLANO_CONTAS_CACHE_TTL", 300)
+    if plano is not None and plano.versao == versao and monotonic() - _carregado_em < ttl:
+        return plano
+
+    with _lock:
+        plano = _plano
+        if plano is None or plano.versao != versao or monotonic() - _carregado_em >= ttl:
+            plano = PlanoContas.carregar(versao)
+            _plano, _carregado_em = plano, monotonic()
+    return plano
+
+
+def invalidar_plano_contas() -> None:
+    """
+    Avança a versão do plano no banco (na transação corrente). Chamado pelos
+    sinais de save/delete; quem alterar o plano por queryset.update()/
+    bulk_create() (que não disparam sinais) deve chamar diretamente.
+    """
+    global _plano
+    avancar_versao(CHAVE_PLANO_CONTAS)
+    _plano = None
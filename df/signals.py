@@ -0,0 +1,42 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from df.agregados import marcar_fundo_alterado, recalcular_agregados_da_conta
+from df.models import GrupoGrande, GrupoPequeno, MapeamentoContas, MecItem
+from df.plano_contas import invalidar_plano_contas
+
+
+@receiver(post_save, sender=GrupoGrande)
+@receiver(post_delete, sender=GrupoGrande)
+@receiver(post_save, sender=GrupoPequeno)
+@receiver(post_delete, sender=GrupoPequeno)
+@receiver(post_save, sender=MapeamentoContas)
+@receiver(post_delete, sender=MapeamentoContas)
+def plano_contas_alterado(sender, **kwargs):
+    invalidar_plano_contas()
+
+
+@receiver(pre_save, sender=MapeamentoContas)
+def guardar_grupinho_anterior(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    instance._grupo_pequeno_anterior = (
+        MapeamentoContas.objects.filter(pk=instance.pk).values_list("grupo_pequeno_id", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=MapeamentoContas)
+def conta_mudou_de_grupinho(sender, instance, created=False, raw=False, **kwargs):
+    # conta nova ainda não tem itens no balancete; sem mudança de grupinho, o agregado não muda
+    if raw or created:
+        return
+    if getattr(instance, "_grupo_pequeno_anterior", instance.grupo_pequeno_id) != instance.grupo_pequeno_id:
+        recalcular_agregados_da_conta(instance.pk)
+
+
+@receiver(post_save, sender=MecItem)
+@receiver(post_delete, sender=MecItem)
+def mec_alterado(sender, instance, raw=False, **kwargs):
+    # edição avulsa (admin); a importação usa bulk_create e marca o fundo em import_service
+    if not raw:
+        marcar_fundo_alterado(instance.fundo_id)
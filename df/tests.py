@@ -1,3 +1,122 @@
+from django.contrib import admin
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F
 from django.test import TestCase
 
-# Create your tests here.
+from df.models import GrupoGrande, GrupoPequeno, MapeamentoContas, VersaoDados
+from df.plano_contas import get_plano_contas
+from df.versoes import CHAVE_PLANO_CONTAS
+
+
+# =========================
+# Plano de contas em memória
+# =========================
+class PlanoContasVersaoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        grupao = GrupoGrande.objects.create(nome="Disponibilidades", tipo=1, ordem=1)
+        cls.grupinho = GrupoPequeno.objects.create(nome="Bancos", grupao=grupao)
+
+    def test_sinal_avanca_versao_e_recarrega(self):
+        antes = get_plano_contas()
+        MapeamentoContas.objects.create(conta="1.1.1", grupo_pequeno=self.grupinho)
+        depois = get_plano_contas()
+        self.assertGreater(depois.versao, antes.versao)
+        self.assertIsNotNone(depois.conta_id("1.1.1"))
+
+    def test_versao_avancada_por_outro_processo_recarrega(self):
+        plano = get_plano_contas()
+        self.assertIs(get_plano_contas(), plano)
+
+        # outro processo: grava sem sinais e avança só a linha de versão no banco
+        MapeamentoContas.objects.bulk_create([MapeamentoContas(conta="9.9", grupo_pequeno=self.grupinho)])
+        VersaoDados.objects.filter(chave=CHAVE_PLANO_CONTAS).update(versao=F("versao") + 1)
+
+        recarregado = get_plano_contas()
+        self.assertIsNot(recarregado, plano)
+        self.assertIsNotNone(recarregado.conta_id("9.9"))
+
+
+class PlanoContasOrdenacaoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sem_ordem = GrupoGrande.objects.create(nome="Outros", tipo=1, ordem=None)
+        cls.segundo = GrupoGrande.objects.create(nome="B Aplicações", tipo=1, ordem=2)
+        cls.primeiro = GrupoGrande.objects.create(nome="A Disponibilidades", tipo=1, ordem=1)
+        cls.empate = GrupoGrande.objects.create(nome="A Caixa", tipo=1, ordem=2)
+        cls.passivo = GrupoGrande.objects.create(nome="Passivo Circulante", tipo=2, ordem=1)
+        for nome in ("Poupança", "Bancos", "Caixa"):
+            GrupoPequeno.objects.create(nome=nome, grupao=cls.primeiro)
+        cls.taxas = GrupoPequeno.objects.create(nome="Taxas", grupao=cls.passivo)
+        cls.conta = MapeamentoContas.objects.create(conta="2.1", grupo_pequeno=cls.taxas)
+
+    def test_ordem_igual_a_do_banco_sem_consultas(self):
+        plano = get_plano_contas()
+        with self.assertNumQueries(0):
+            grupoes = [g.nome for g in plano.grupoes_do_tipo(1)]
+            grupinhos = [g.nome for g in plano.grupinhos_do_grupao(self.primeiro.id)]
+        self.assertEqual(grupoes, ["Outros", "A Disponibilidades", "A Caixa", "B Aplicações"])
+        banco = GrupoGrande.objects.filter(tipo=1).order_by("ordem", "nome").values_list("nome", flat=True)
+        self.assertEqual(grupoes, list(banco))
+        self.assertEqual(grupinhos, ["Bancos", "Caixa", "Poupança"])
+        self.assertEqual(plano.grupoes_do_tipo(9), ())
+
+    def test_grupao_por_grupinho_e_por_conta(self):
+        plano = get_plano_contas()
+        self.assertEqual(plano.grupao_da_conta(self.conta.id).id, self.passivo.id)
+        self.assertEqual(set(plano.grupinhos_dos_tipos([2])), {self.taxas.id})
+        self.assertEqual(len(plano.grupinhos_dos_tipos([1, 2])), 4)
+
+
+# =========================
+# Códigos estáveis dos grupos
+# =========================
+class GrupoCodigoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.passivo = GrupoGrande.objects.create(nome="Passivo Circulante", tipo=2, ordem=1)
+        cls.despesas = GrupoGrande.objects.create(nome="Despesas", tipo=4, ordem=1)
+        cls.taxa_dpf = GrupoPequeno.objects.create(nome="Taxa de Administração", grupao=cls.passivo)
+        cls.taxa_dre = GrupoPequeno.objects.create(nome="Taxa de Administração", grupao=cls.despesas)
+
+    def test_codigo_unico_por_demonstracao_no_banco(self):
+        self.assertEqual((self.taxa_dpf.tipo, self.taxa_dre.tipo), (2, 4))
+        self.assertEqual(self.taxa_dpf.codigo, self.taxa_dre.codigo)
+        outro = GrupoGrande.objects.create(nome="Passivo Não Circulante", tipo=2, ordem=2)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            GrupoPequeno.objects.bulk_create([
+                GrupoPequeno(nome="Taxa", grupao=outro, tipo=2, codigo=self.taxa_dpf.codigo),
+            ])
+
+    def test_tipo_acompanha_o_grupao(self):
+        outro = GrupoGrande.objects.create(nome="Outras Despesas", tipo=4, ordem=2)
+        grupinho = GrupoPequeno.objects.create(nome="Tarifas", grupao=outro)
+        outro.tipo = 2
+        outro.save()
+        grupinho.refresh_from_db()
+        self.assertEqual(grupinho.tipo, 2)
+
+        # levar a taxa da DRE para a DPF colidiria com a taxa que já está lá
+        self.despesas.tipo = 2
+        with self.assertRaises(ValidationError):
+            self.despesas.full_clean()
+
+    def test_codigo_apagado_nao_e_regenerado(self):
+        self.taxa_dpf.nome = "Taxa de administração a pagar"
+        self.taxa_dpf.codigo = ""
+        self.taxa_dpf.save()
+        self.taxa_dpf.refresh_from_db()
+        self.assertEqual(self.taxa_dpf.codigo, "taxa_de_administracao")
+
+    def test_admin_trava_os_codigos_lidos_pelo_dfc(self):
+        grupinhos = admin.site._registry[GrupoPequeno]
+        self.assertIn("codigo", grupinhos.get_readonly_fields(None, self.taxa_dpf))
+        # mesmo código na DRE: o DFC não lê a taxa de administração de lá
+        self.assertNotIn("codigo", grupinhos.get_readonly_fields(None, self.taxa_dre))
+        self.assertEqual(grupinhos.get_prepopulated_fields(None), {"codigo": ("nome",)})
+        self.assertEqual(grupinhos.get_prepopulated_fields(None, self.taxa_dre), {})
+
+        grupoes = admin.site._registry[GrupoGrande]
+        self.assertIn("codigo", grupoes.get_readonly_fields(None, self.passivo))
+        self.assertNotIn("codigo", grupoes.get_readonly_fields(None, self.despesas))
@@ -0,0 +1,43 @@
+# df/versoes.py
+from __future__ import annotations
+
+from typing import Dict, Iterable
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from df.models import VersaoDados
+
+CHAVE_PLANO_CONTAS = "plano_contas"
+
+
+def chave_fundo(fundo_id: int) -> str:
+    """Dados do fundo (balancete, agregados, MEC)."""
+    return f"fundo:{fundo_id}"
+
+
+def ler_versao(chave: str) -> int:
+    """Versão atual da chave (0 se nunca foi avançada). Uma consulta pela PK."""
+    return VersaoDados.objects.filter(chave=chave).values_list("versao", flat=True).first() or 0
+
+
+def ler_versoes(chaves: Iterable[str]) -> Dict[str, int]:
+    """Várias chaves numa consulta só: {chave: versão}, 0 para as que não existem."""
+    chaves = list(chaves)
+    versoes = dict(VersaoDados.objects.filter(chave__in=chaves).values_list("chave", "versao"))
+    return {chave: versoes.get(chave, 0) for chave in chaves}
+
+
+def avancar_versao(chave: str) -> None:
+    """
+    Incrementa a versão no banco, dentro da transação corrente: os outros
+    processos só enxergam a versão nova junto com os dados confirmados.
+    """
+    if VersaoDados.objects.filter(chave=chave).update(versao=F("versao") + 1):
+        return
+    try:
+        with transaction.atomic():
+            VersaoDados.objects.create(chave=chave, versao=1)
+    except IntegrityError:
+        # outro processo criou a linha entre o UPDATE e o INSERT
+        VersaoDados.objects.filter(chave=chave).update(versao=F("versao") + 1)